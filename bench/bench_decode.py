@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: per-cycle decode time, generated decoder vs the table interpreter.
+
+The interpreter below is the per-field loop growatt.monitor used before the decoder
+was generated from the field table; it is kept here as the baseline and as a
+cross-check that the generated decoder's JSON output is byte-identical. A second
+result times read_inverter_holding_registers / read_inverter_input_registers end to
+end (request generator, response validation, decode) against canned registers.
+
+    python bench/bench_decode.py [--cycles N]
+"""
+
+import sys
+import json
+import argparse
+
+from common import CannedClient, canned_blocks, emit, per_call_us
+
+from growatt import monitor
+
+
+def interpret(layout, blocks):
+    """The previous table-driven decode: one dispatch per field per cycle."""
+    values = {}
+    for field, index, offset in layout:
+        registers = blocks[index]
+        if field.kind == "u32":
+            value = registers[offset] << 16 | registers[offset + 1]
+        elif field.kind == "bits16":
+            values[field.name] = format(registers[offset], '016b')
+            continue
+        else:
+            value = registers[offset]
+        if field.scale is not None:
+            value = value * field.scale
+        if field.divide is not None:
+            value = value / field.divide
+        if field.digits is not None:
+            value = round(value, field.digits)
+        values[field.name] = value
+    return values
+
+
+def run(cycles=20000):
+    holding = canned_blocks(monitor.HOLDING_PLAN, 1)
+    inputs = canned_blocks(monitor.INPUT_PLAN, 2)
+
+    for seed in range(50):
+        h = canned_blocks(monitor.HOLDING_PLAN, seed)
+        i = canned_blocks(monitor.INPUT_PLAN, seed + 1000)
+        want = json.dumps({**interpret(monitor._HOLDING_LAYOUT, h),
+                           **interpret(monitor._INPUT_LAYOUT, i)})
+        got = json.dumps({**monitor.decode_holding(h), **monitor.decode_input(i)})
+        if got != want:
+            sys.exit("generated decoder output differs from the interpreter (seed %d)" % seed)
+
+    baseline = per_call_us(lambda: (interpret(monitor._HOLDING_LAYOUT, holding),
+                                    interpret(monitor._INPUT_LAYOUT, inputs)), cycles)
+    generated = per_call_us(lambda: (monitor.decode_holding(holding),
+                                     monitor.decode_input(inputs)), cycles)
+    client = CannedClient()
+    holding_us = per_call_us(lambda: monitor.read_inverter_holding_registers(client),
+                             cycles // 4)
+    input_us = per_call_us(lambda: monitor.read_inverter_input_registers(client), cycles // 4)
+    return [{
+        "benchmark": "decode",
+        "fields": len(monitor._HOLDING_LAYOUT) + len(monitor._INPUT_LAYOUT),
+        "interpreted_us_per_cycle": round(baseline, 2),
+        "generated_us_per_cycle": round(generated, 2),
+        "speedup": round(baseline / generated, 2),
+        "output_identical": True,
+    }, {
+        "benchmark": "read_decode",
+        "blocks": len(monitor.HOLDING_PLAN) + len(monitor.INPUT_PLAN),
+        "holding_us_per_cycle": round(holding_us, 2),
+        "input_us_per_cycle": round(input_us, 2),
+    }]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=20000)
+    args = parser.parse_args()
+    emit(run(args.cycles))
+
+
+if __name__ == "__main__":
+    main()
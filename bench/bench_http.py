@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""HTTP API benchmark: /health, /state and /slots throughput on the ThreadingHTTPServer.
+
+Serves the real make_http_server against one simulated inverter (polled once so
+/health has a last good read and /state a snapshot), then hammers each endpoint from
+client threads, one connection per request as Home Assistant's rest_commands make
+them. /state is run twice: plain, and conditional (If-None-Match with the current
+ETag, answered 304). /slots?fresh=1 runs a control session on the simulator per
+request, so it includes the bridge lock and the slot reads.
+
+    python bench/bench_http.py [--requests N] [--concurrency 1,8]
+"""
+
+import time
+import argparse
+import threading
+import http.client
+
+from common import NullMqtt, bench_config, emit, latency_summary, start_simulators
+
+import growatt_modbus
+from growatt.discovery import Discovery
+from growatt.pool import make_pool
+from growatt.http_api import make_http_server
+
+
+def hammer(port, path, requests, concurrency, headers=None, expect=200):
+    """Issue requests GETs from concurrency threads; return (elapsed, latencies, errors)."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def worker(count):
+        mine, failed = [], 0
+        for _ in range(count):
+            started = time.perf_counter()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            try:
+                conn.request("GET", path, headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                failed += response.status != expect
+            except OSError:
+                failed += 1
+            finally:
+                conn.close()
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(requests // concurrency,))
+               for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, errors[0]
+
+
+def run(requests=500, concurrency=(1, 8)):
+    servers = start_simulators(1)
+    config = bench_config(servers)
+    pool = make_pool(config)
+    stats = {}
+    growatt_modbus.poll_device(config["devices"][0], config, NullMqtt(),
+                               Discovery(config["mqtt"]), stats, pool)
+    server = make_http_server(config, NullMqtt(), stats, pool)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_address[1]
+    results = []
+    try:
+        etag = stats[config["devices"][0]["host"]]["snapshot"].etag()
+        cases = [("/health", None), ("/state", None), ("/state", {"If-None-Match": etag}),
+                 ("/slots?fresh=1", None)]
+        for path, headers in cases:
+            for threads in concurrency:
+                elapsed, latencies, errors = hammer(port, path, requests, threads, headers,
+                                                    304 if headers else 200)
+                results.append({
+                    "benchmark": "http",
+                    "path": path,
+                    "conditional": bool(headers),
+                    "concurrency": threads,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "requests_per_second": round(len(latencies) / elapsed, 1),
+                    **latency_summary(latencies),
+                })
+    finally:
+        server.shutdown()
+        pool.close_all()
+        servers[0].stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="requests per run")
+    parser.add_argument("--concurrency", default="1,8",
+                        help="comma-separated client thread counts")
+    args = parser.parse_args()
+    emit(run(args.requests, [int(n) for n in args.concurrency.split(",")]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Poll-cycle benchmark: full poll_device cycles against simulated inverters.
+
+Starts one growatt_sim inverter per device (each on its own bridge), then times
+poll_device - session, tiered reads, decode, merge and the queued publishes - for
+every device, round after round, with a null MQTT client. Run with several device
+counts for the scaling curve; --latency adds simulated link latency per response.
+
+    python bench/bench_poll.py [--devices 1,10,50] [--rounds N] [--framer rtu]
+                               [--latency S] [--workers N]
+"""
+
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from common import NullMqtt, bench_config, emit, latency_summary, start_simulators
+
+import growatt_modbus
+from growatt.discovery import Discovery
+from growatt.pool import make_pool
+
+
+def run_devices(count, rounds=20, framer="socket", latency=0.0, workers=1):
+    servers = start_simulators(count, framer, latency)
+    config = bench_config(servers, framer)
+    pool = make_pool(config)
+    mqtt = NullMqtt()
+    stats, discovery = {}, Discovery(config["mqtt"])
+    cycles = []
+
+    def cycle(dev):
+        started = time.perf_counter()
+        growatt_modbus.poll_device(dev, config, mqtt, discovery, stats, pool)
+        return time.perf_counter() - started
+
+    executor = ThreadPoolExecutor(workers) if workers > 1 else None
+    try:
+        for dev in config["devices"]:  # warm-up: connect, discovery, first static read
+            cycle(dev)
+        round_times = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            if executor is None:
+                cycles += [cycle(dev) for dev in config["devices"]]
+            else:
+                cycles += list(executor.map(cycle, config["devices"]))
+            round_times.append(time.perf_counter() - started)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        pool.close_all()
+        for server in servers:
+            server.stop()
+    ok = sum(st["pollOkTotal"] for st in stats.values())
+    return {
+        "benchmark": "poll_cycle",
+        "devices": count,
+        "framer": framer,
+        "latency_ms": round(1000 * latency, 3),
+        "workers": workers,
+        "rounds": rounds,
+        "cycles_ok": ok,
+        "cycles_skipped": sum(st["pollSkippedTotal"] for st in stats.values()),
+        "cycles_per_second": round(len(cycles) / sum(round_times), 1),
+        "mqtt_messages": mqtt.messages,
+        **latency_summary(cycles, "cycle_"),
+        **latency_summary(round_times, "round_"),
+    }
+
+
+def run(devices=(1, 10, 50), rounds=20, framer="socket", latency=0.0, workers=1):
+    return [run_devices(count, rounds, framer, latency, workers) for count in devices]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", default="1,10,50",
+                        help="comma-separated device counts for the scaling run")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--framer", choices=("socket", "rtu"), default="socket")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated link latency per response, seconds")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="poll devices in parallel with this many threads")
+    args = parser.parse_args()
+    emit(run([int(n) for n in args.devices.split(",")], args.rounds, args.framer,
+             args.latency, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Publish-path benchmark: HA discovery, state serialisation and the publish queue.
+
+Times a first Discovery.publish for one serial (every sensor + diagnostic config,
+built and sent in full), the per-cycle Discovery.publish once a serial is up to date, json.dumps
+of a full merged state, publish_diagnostics, and Publisher.publish (the enqueue the
+poll loop pays; the queue is drained by its own thread into a null client).
+
+Then, per payload encoder (growatt.serialize: json, orjson, msgpack; those not
+installed are reported as unavailable), the bytes and encode time of one state and
+one diagnostics payload.
+
+    python bench/bench_publish.py [--calls N]
+"""
+
+import json
+import argparse
+
+from common import NullMqtt, canned_blocks, emit, per_call_us
+
+import growatt_modbus
+from growatt import monitor
+from growatt.config import DEFAULT_CONFIG
+from growatt.discovery import Discovery
+from growatt.publisher import Publisher
+from growatt import serialize
+
+
+def sample_state(seed=1):
+    state = monitor.value_cache()
+    state.update(monitor.decode_holding(canned_blocks(monitor.HOLDING_PLAN, seed)))
+    state.update(monitor.decode_input(canned_blocks(monitor.INPUT_PLAN, seed + 1)))
+    state["serialNumber"] = "BENCH00000"
+    return state
+
+
+def sample_diagnostics(state):
+    st = growatt_modbus.device_stats({}, "bench")
+    st["serial"] = state["serialNumber"]
+    client = NullMqtt()
+    client.publish = lambda topic, payload, retain=False: setattr(client, "payload", payload)
+    growatt_modbus.publish_diagnostics(client, {"topic_prefix": "growatt"}, st,
+                                       {"connectionReuses": 1, "connectionReconnects": 0})
+    return json.loads(client.payload)
+
+
+def encoders():
+    """(format, encoder or None if its package is missing) for every backend."""
+    return [
+        ("json", serialize._json_bytes),
+        ("orjson", serialize._orjson_bytes if serialize.orjson is not None else None),
+        ("msgpack", serialize._msgpack_bytes if serialize.msgpack is not None else None),
+    ]
+
+
+def run_serializers(calls=2000):
+    state = sample_state()
+    payloads = {"state": state, "diagnostics": sample_diagnostics(state)}
+    results = []
+    for fmt, encode in encoders():
+        for name, obj in payloads.items():
+            result = {"benchmark": "serialize", "format": fmt, "payload": name}
+            if encode is None:
+                result["available"] = False
+            else:
+                result.update(available=True, bytes=len(encode(obj)),
+                              encode_us=round(per_call_us(lambda: encode(obj), calls), 2))
+            results.append(result)
+    return results
+
+
+def run(calls=2000):
+    mqtt_cfg = DEFAULT_CONFIG["mqtt"]
+    client = NullMqtt()
+    # A fresh Discovery without a source client builds and sends every config.
+    Discovery(mqtt_cfg).publish(client, "BENCH00000", "bench")
+    discovery_messages, discovery_bytes = client.messages, client.bytes
+    discovery_us = per_call_us(
+        lambda: Discovery(mqtt_cfg).publish(client, "BENCH00000", "bench"),
+        max(1, calls // 20))
+    discovery = Discovery(mqtt_cfg)
+    discovery.publish(client, "BENCH00000", "bench")
+    cached_us = per_call_us(lambda: discovery.publish(client, "BENCH00000", "bench"), calls)
+
+    state = sample_state()
+    state_bytes = len(json.dumps(state))
+    state_us = per_call_us(lambda: json.dumps(state), calls)
+
+    st = growatt_modbus.device_stats({}, "bench")
+    st["serial"] = "BENCH00000"
+    diagnostics_us = per_call_us(
+        lambda: growatt_modbus.publish_diagnostics(client, mqtt_cfg, st), calls)
+
+    publisher = Publisher(NullMqtt())
+    payload = json.dumps(state)
+    enqueue_us = per_call_us(lambda: publisher.publish("growatt/BENCH00000/state", payload),
+                             calls)
+    publisher.close()
+    return [{
+        "benchmark": "publish",
+        "discovery_messages": discovery_messages,
+        "discovery_bytes": discovery_bytes,
+        "discovery_us": round(discovery_us, 2),
+        "discovery_cached_us": round(cached_us, 2),
+        "state_fields": len(state),
+        "state_bytes": state_bytes,
+        "state_json_us": round(state_us, 2),
+        "diagnostics_us": round(diagnostics_us, 2),
+        "publisher_enqueue_us": round(enqueue_us, 2),
+    }] + run_serializers(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+    emit(run(args.calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Shared helpers for the bench/ scripts: timing, fake clients and the simulator.
+
+Every benchmark returns a list of flat result dicts, each with a "benchmark" key;
+run as a script it prints them one JSON object per line, and bench/run.py collects
+them into one document that can be compared against a previous run.
+"""
+
+import os
+import sys
+import json
+import random
+import timeit
+import logging
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Keep the poller's per-cycle INFO logging out of the timings.
+for _name in ("growatt", "growatt_sim"):
+    logging.getLogger(_name).setLevel(logging.WARNING)
+
+
+def per_call_us(fn, calls, repeat=5):
+    """Best-of-repeat mean time per call of fn(), in microseconds."""
+    return min(timeit.repeat(fn, number=calls, repeat=repeat)) / calls * 1e6
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latency_summary(seconds, prefix=""):
+    """Mean / p50 / p95 / max of a list of durations, in milliseconds."""
+    return {
+        prefix + "mean_ms": round(1000 * sum(seconds) / len(seconds), 3),
+        prefix + "p50_ms": round(1000 * percentile(seconds, 0.5), 3),
+        prefix + "p95_ms": round(1000 * percentile(seconds, 0.95), 3),
+        prefix + "max_ms": round(1000 * max(seconds), 3),
+    }
+
+
+def canned_blocks(plan, seed):
+    """Deterministic pseudo-random register blocks shaped like a plan's reads."""
+    rnd = random.Random(seed)
+    return [[rnd.randrange(0, 65536) for _ in range(block.count)] for block in plan]
+
+
+def emit(results):
+    for result in results:
+        sys.stdout.write(json.dumps(result) + "\n")
+
+
+class NullMqtt:
+    """Stands in for the paho client: counts publishes and payload bytes."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def publish(self, topic, payload=None, retain=False, qos=0):
+        self.messages += 1
+        self.bytes += len(payload or b"")
+
+    def subscribe(self, *args, **kwargs):
+        return 0, 1
+
+    def message_callback_add(self, *args):
+        pass
+
+
+class _Response:
+    __slots__ = ("registers",)
+
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return False
+
+
+class CannedClient:
+    """A blocking Modbus client answering reads from canned registers, with no I/O."""
+
+    def __init__(self, seed=1, size=1200):
+        rnd = random.Random(seed)
+        self.tables = {table: [rnd.randrange(0, 65536) for _ in range(size)]
+                       for table in ("holding", "input")}
+
+    def read_holding_registers(self, address, count, device_id=None):
+        return _Response(self.tables["holding"][address:address + count])
+
+    def read_input_registers(self, address, count, device_id=None):
+        return _Response(self.tables["input"][address:address + count])
+
+
+def simulator_host(n):
+    # The poller keys device state by host, so each simulated bridge gets its own
+    # loopback address (all of 127/8 reaches lo on Linux).
+    return "127.0.%d.%d" % (n // 250, n % 250 + 1)
+
+
+def start_simulators(count, framer="socket", latency=0.0, seed=1):
+    """Start count simulated inverters, one per bridge; returns the servers."""
+    from growatt_sim import Faults, Inverter, SimServer
+    servers = []
+    for n in range(count):
+        server = SimServer({1: Inverter("BENCH%05d" % n, seed=seed + n)}, framer,
+                           Faults(latency=latency, seed=seed + n))
+        server.start(simulator_host(n))
+        servers.append(server)
+    return servers
+
+
+def bench_config(servers, framer="socket", **overrides):
+    """A full poller config with one device per simulator, defaults for the rest."""
+    from growatt.config import DEFAULT_CONFIG, _deep_merge
+    devices = []
+    for n, server in enumerate(servers):
+        dev = {"name": "bench%d" % n, "host": simulator_host(n), "port": server.port, "unit": 1}
+        if framer == "rtu":
+            dev["framer"] = "rtu"
+        devices.append(dev)
+    base = {"devices": devices, "control": {"device": "bench0"},
+            "time_sync": {"enabled": False}, "http": {"port": 0}}
+    return _deep_merge(_deep_merge(DEFAULT_CONFIG, base), overrides)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Run the whole benchmark suite and write one JSON document, optionally comparing it
+against an earlier run (e.g. from the previous commit).
+
+    python bench/run.py [--quick] [--output results.json] [--baseline old.json]
+
+The document records the git commit and Python version next to every result. With
+--baseline, each timing is printed as a ratio to the matching baseline result
+(> 1 is slower for times, faster for throughputs) and results regressing by more
+than --threshold are flagged; the exit status is 1 if any were.
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+from common import ROOT
+
+import bench_decode
+import bench_http
+import bench_poll
+import bench_publish
+
+# Keys that identify a result (the rest are measurements).
+_IDENTITY = ("benchmark", "devices", "framer", "latency_ms", "workers", "path", "conditional",
+             "concurrency", "format", "payload")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(quick=False):
+    scale = 10 if quick else 1
+    return (bench_decode.run(20000 // scale)
+            + bench_publish.run(2000 // scale)
+            + bench_poll.run((1, 10, 50), rounds=3 if quick else 20)
+            + bench_http.run(500 // scale))
+
+
+def _key(result):
+    return tuple(result.get(name) for name in _IDENTITY)
+
+
+def compare(results, baseline, threshold):
+    """Print ratios against the baseline; return the number of regressions."""
+    old = {_key(result): result for result in baseline["results"]}
+    regressions = 0
+    for result in results:
+        before = old.get(_key(result))
+        if before is None:
+            continue
+        label = "/".join(str(v) for v in _key(result) if v is not None)
+        for name, value in result.items():
+            previous = before.get(name)
+            timing = name.endswith(("_us", "_ms", "_us_per_cycle"))
+            if "max" in name:
+                continue  # a single sample: too noisy to gate on
+            if not (timing or name.endswith("per_second")) or not previous or not value:
+                continue
+            ratio = value / previous
+            worse = ratio > 1 + threshold if timing else ratio < 1 / (1 + threshold)
+            regressions += worse
+            sys.stdout.write("%-40s %-28s %10.3f -> %10.3f  x%.2f%s\n" % (
+                label, name, previous, value, ratio, "  REGRESSION" if worse else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="fewer iterations (for CI)")
+    parser.add_argument("--output", help="write the results document here (default stdout)")
+    parser.add_argument("--baseline", help="a previous results document to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change flagged as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    document = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": round(time.time()),
+        "quick": args.quick,
+        "results": run_all(args.quick),
+    }
+    text = json.dumps(document, indent=1)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    elif not args.baseline:
+        sys.stdout.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(document["results"], baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
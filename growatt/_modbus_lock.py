@@ -1,16 +1,91 @@
-"""The single process-wide Modbus serialiser.
+"""Per-bridge Modbus serialisers.
 
-The poller and the HTTP control endpoint now live in one process and both talk to
-the same inverter through a dumb RTU-over-TCP WiFi dongle, which bridges every TCP
-connection onto one serial line with no request/response correlation. Two concurrent
-sessions therefore garble each other's frames. Acquiring this lock around a *whole*
-Modbus session (connect -> reads/writes -> close) guarantees the dongle only ever
-sees one connection at a time.
+The poller and the HTTP control endpoint live in one process and talk to the
+inverters through dumb RTU-over-TCP WiFi dongles (or EW11s), each of which bridges
+every TCP connection onto one serial line with no request/response correlation. Two
+concurrent sessions on the *same* bridge therefore garble each other's frames.
+Acquiring that bridge's lock around a whole Modbus session (connect -> reads/writes
+-> close) guarantees the bridge only ever sees one connection at a time.
+
+Different bridges are separate serial lines, so they get separate locks: inverters
+behind different dongles can be polled in parallel. Locks are keyed by (host, port)
+and created on first use.
+
+Waiters are not served in arrival order but by priority: a control session (the HTTP
+API changing the inverter's mode) goes ahead of every poll cycle already queued for
+the same bridge, so a write is never stuck behind a backlog of reads.
 
 It lives in its own tiny module so both growatt_modbus.py (poll loop) and
 growatt/control.py (control ops) can import it without a circular dependency.
 """
 
 import threading
+from contextlib import contextmanager
+
+# Session priorities, most urgent first.
+CONTROL, POLL = 0, 1
+PRIORITY_NAMES = ("control", "poll")
+
+_LOCKS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def bridge_key(dev):
+    """The (host, port) a device config is reached through; devices sharing it share a bus."""
+    return dev["host"], int(dev.get("port", 502))
+
+
+def bridge_lock(host, port=502):
+    """Return the process-wide lock serialising every Modbus session on one bridge."""
+    key = (host, int(port))
+    with _REGISTRY_LOCK:
+        lock = _LOCKS.get(key)
+        if lock is None:
+            lock = _LOCKS[key] = PriorityLock()
+        return lock
+
+
+class PriorityLock:
+    """A mutex whose waiters are woken by priority (CONTROL before POLL).
+
+    Used as a plain lock (``with lock:``) it takes POLL priority; ``hold(priority)``
+    picks one. Waiters of equal priority are not ordered among themselves.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._held = False
+        self._waiting = [0] * len(PRIORITY_NAMES)
+
+    def acquire(self, priority=POLL):
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while self._held or any(self._waiting[:priority]):
+                    self._cond.wait()
+            finally:
+                self._waiting[priority] -= 1
+            self._held = True
+        return True
+
+    def release(self):
+        with self._cond:
+            self._held = False
+            self._cond.notify_all()
+
+    def locked(self):
+        return self._held
+
+    @contextmanager
+    def hold(self, priority=POLL):
+        self.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def __enter__(self):
+        return self.acquire()
 
-MODBUS_LOCK = threading.Lock()
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,123 @@
+"""Adaptive Modbus timeouts and failure backoff, per device.
+
+A fixed 5 s timeout with 3 retries suits neither end of the range: a healthy EW11
+answers in tens of milliseconds, while an inverter that is off at night (or a dongle
+that has fallen off WiFi) burns 15+ seconds of its bridge's lock every cycle.
+
+``LinkHealth`` tracks each device's request round-trip times (an RFC 6298-style
+smoothed mean and deviation, plus percentiles over a recent window) and derives the
+timeout from them, clamped to [min_timeout, timeout]. A failed cycle doubles the
+timeout (up to the ceiling) so a slow link is not starved by its own history. After
+``backoff_after_failures`` failed cycles in a row the device is backed off
+exponentially, with jitter; when the backoff expires one probe cycle (no pymodbus
+retries) decides whether it has recovered or backs off for longer.
+"""
+
+import random
+import logging
+from collections import deque
+
+log = logging.getLogger("growatt")
+
+# RFC 6298 smoothing factors for the mean and the mean deviation.
+_ALPHA = 0.125
+_BETA = 0.25
+
+
+class LinkHealth:
+    """Latency statistics, the derived timeout and the backoff state for one device."""
+
+    def __init__(self, timeout=5.0, retries=3, adaptive=True, min_timeout=0.5,
+                 backoff_after_failures=3, backoff_base_seconds=15.0,
+                 backoff_max_seconds=600.0, window=100):
+        self.max_timeout = float(timeout)
+        self.retries = retries
+        self.adaptive = adaptive
+        self.min_timeout = float(min_timeout)
+        self.backoff_after_failures = backoff_after_failures
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.samples = deque(maxlen=window)
+        self.srtt = None
+        self.rttvar = 0.0
+        self.scale = 1
+        self.failures = 0
+        self.backoff_seconds = 0.0
+        self.backoff_until = 0.0
+
+    def observe(self, _op, _address, seconds, ok):
+        """Record one request's round trip (a client.run_requests observer)."""
+        if not ok:
+            return
+        self.samples.append(seconds)
+        if self.srtt is None:
+            self.srtt, self.rttvar = seconds, seconds / 2
+        else:
+            self.rttvar = (1 - _BETA) * self.rttvar + _BETA * abs(self.srtt - seconds)
+            self.srtt = (1 - _ALPHA) * self.srtt + _ALPHA * seconds
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self):
+        """The per-request timeout to use now, in seconds."""
+        if not self.adaptive or self.srtt is None:
+            return self.max_timeout
+        base = max(self.srtt + 4 * self.rttvar, 2 * self.percentile(0.99))
+        return min(self.max_timeout, max(self.min_timeout, base * self.scale))
+
+    def backing_off(self, now):
+        """True while the device is in backoff and this cycle should be skipped."""
+        return self.adaptive and now < self.backoff_until
+
+    def probing(self):
+        """True if the next cycle is a recovery probe (the device was backed off)."""
+        return self.adaptive and self.failures >= self.backoff_after_failures
+
+    def record(self, ok, now):
+        """Update the failure streak and backoff after a cycle."""
+        if ok:
+            if self.probing():
+                log.info("Device recovered after %d failed cycle(s)", self.failures)
+            self.failures = 0
+            self.scale = 1
+            self.backoff_seconds = 0.0
+            self.backoff_until = 0.0
+            return
+        self.failures += 1
+        self.scale = min(self.scale * 2, 16)
+        if self.probing():
+            exponent = self.failures - self.backoff_after_failures
+            self.backoff_seconds = min(self.backoff_max_seconds,
+                                       self.backoff_base_seconds * 2 ** exponent)
+            # Jitter: spread the probes of devices that failed together.
+            self.backoff_until = now + self.backoff_seconds * random.uniform(0.5, 1.0)
+
+    def stats(self, now):
+        """Timeout and backoff state for the diagnostics payload."""
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "timeoutSeconds": round(self.timeout(), 3),
+            "latencyEwmaMs": round(1000 * self.srtt, 1) if self.srtt is not None else None,
+            "latencyP50Ms": round(1000 * p50, 1) if p50 is not None else None,
+            "latencyP95Ms": round(1000 * p95, 1) if p95 is not None else None,
+            "consecutiveFailures": self.failures,
+            "backoffRemainingSeconds": round(max(0.0, self.backoff_until - now), 1),
+        }
+
+
+def make_link_health(config):
+    """A LinkHealth configured from the `modbus` config section."""
+    cfg = config.get("modbus") or {}
+    return LinkHealth(
+        timeout=cfg.get("timeout", 5),
+        retries=cfg.get("retries", 3),
+        adaptive=cfg.get("adaptive_timeout", True),
+        min_timeout=cfg.get("min_timeout", 0.5),
+        backoff_after_failures=cfg.get("backoff_after_failures", 3),
+        backoff_base_seconds=float(cfg.get("backoff_base_seconds", 15)),
+        backoff_max_seconds=cfg.get("backoff_max_seconds", 600),
+    )
@@ -0,0 +1,286 @@
+"""Plumbing for the optional asyncio polling engine (config ``engine: async``).
+
+The threaded engine spends a thread per bridge in flight (the poll worker pool),
+plus paho's network thread and one thread per HTTP request. The asyncio engine runs
+every device cycle as a task on one event loop instead:
+
+- ``AsyncBridge`` keeps one persistent ``AsyncModbusTcpClient`` per bridge, handed
+  out under an ``AsyncPriorityLock`` so the bridge still only ever sees one session
+  at a time, control sessions first (the asyncio twin of growatt.pool +
+  growatt._modbus_lock). Like the pool, it reconnects rather than reuse a connection
+  the bridge has closed or sent bytes on between sessions. Poll cycles drive
+  it through the shared request generators (growatt.client.arun_requests).
+- Control requests, whose logic (growatt.control) is blocking, run in a worker
+  thread against a ``_BlockingClient`` facade whose calls hop back onto the loop,
+  inside the same bridge session, so they still serialise against polls.
+- ``attach_mqtt`` drives paho's socket from the event loop (add_reader/add_writer)
+  rather than paho's own network thread.
+"""
+
+import asyncio
+import time
+import logging
+from contextlib import asynccontextmanager
+
+import paho.mqtt.client as mqtt
+from pymodbus.client import AsyncModbusTcpClient
+
+from . import metrics
+from .pool import apply_timeout
+from ._modbus_lock import CONTROL, POLL, PRIORITY_NAMES
+
+log = logging.getLogger("growatt")
+
+
+class AsyncPriorityLock:
+    """growatt._modbus_lock.PriorityLock for coroutines: CONTROL waiters go first."""
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._held = False
+        self._waiting = [0] * len(PRIORITY_NAMES)
+
+    @asynccontextmanager
+    async def hold(self, priority=POLL):
+        async with self._cond:
+            self._waiting[priority] += 1
+            try:
+                await self._cond.wait_for(
+                    lambda: not self._held and not any(self._waiting[:priority]))
+            finally:
+                self._waiting[priority] -= 1
+            self._held = True
+        try:
+            yield self
+        finally:
+            async with self._cond:
+                self._held = False
+                self._cond.notify_all()
+
+
+class AsyncBridge:
+    """One persistent asyncio Modbus connection to a bridge, one session at a time."""
+
+    def __init__(self, host, port=502, framer=None, persistent=True, max_idle_seconds=60,
+                 timeout=5, retries=3):
+        self.host = host
+        self.port = int(port)
+        self.framer = framer
+        self.persistent = persistent
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+        self.retries = retries
+        self.lock = AsyncPriorityLock()
+        self.client = None
+        self.last_used = 0.0
+        self.connects = 0
+        self.reuses = 0
+        self._in_session = False
+        self._stray = False
+
+    def _watch(self, client):
+        # The loop reads the socket as soon as bytes arrive, so unlike growatt.pool's
+        # select() check there is never anything left to see between sessions: note
+        # instead any data received while no session holds the bridge. That is a late
+        # reply to a timed-out request, which would be taken as the answer to the next
+        # request on an RTU dongle (no transaction ids to tell them apart).
+        manager = client.ctx
+        received = manager.data_received
+
+        def data_received(data):
+            if not self._in_session:
+                self._stray = True
+            received(data)
+
+        manager.data_received = data_received
+
+    async def _checkout(self, timeout, retries):
+        client = self.client
+        if client is not None:
+            idle = time.monotonic() - self.last_used
+            # A closed socket (EOF from the bridge) shows as not connected.
+            if idle <= self.max_idle_seconds and client.connected and not self._stray:
+                self.reuses += 1
+                return client
+            log.debug("Dropping pooled connection to %s:%s (idle %.0fs%s)", self.host,
+                      self.port, idle, ", stray bytes" if self._stray else "")
+            self._discard()
+        kwargs = {"framer": self.framer} if self.framer is not None else {}
+        # reconnect_delay=0: we reconnect on the next session ourselves, rather than
+        # letting pymodbus retry in the background while the bridge is unlocked.
+        client = AsyncModbusTcpClient(self.host, port=self.port, timeout=timeout,
+                                      retries=retries, reconnect_delay=0, **kwargs)
+        if not await client.connect():
+            client.close()
+            return None
+        self.connects += 1
+        self.client = client
+        self._stray = False
+        self._watch(client)
+        return client
+
+    def _discard(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    @asynccontextmanager
+    async def session(self, timeout=None, retries=None, priority=POLL):
+        """Hold the bridge and yield a connected client, or None if connect failed.
+
+        timeout/retries override the bridge's defaults for this session only; priority
+        orders it against other sessions waiting for the bridge.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        waited = time.monotonic()
+        async with self.lock.hold(priority):
+            acquired = time.monotonic()
+            if metrics.ENABLED:
+                metrics.LOCK_WAIT.observe(acquired - waited, "%s:%d" % (self.host, self.port),
+                                          PRIORITY_NAMES[priority])
+            client = await self._checkout(timeout, retries)
+            if client is not None:
+                apply_timeout(client, timeout, retries)
+            self._in_session = True
+            try:
+                yield client
+            except BaseException:
+                self._discard()
+                raise
+            finally:
+                self._in_session = False
+                if self.client is not None:
+                    self.last_used = time.monotonic()
+                    if not self.persistent:
+                        self._discard()
+                if metrics.ENABLED:
+                    metrics.LOCK_HOLD.observe(time.monotonic() - acquired,
+                                              "%s:%d" % (self.host, self.port))
+
+    def stats(self):
+        """Reuse/reconnect counters, same keys as ConnectionPool.stats()."""
+        return {
+            "connectionReuses": self.reuses,
+            "connectionReconnects": max(0, self.connects - 1),
+        }
+
+    def close(self):
+        self._discard()
+
+
+class _BlockingClient:
+    """Blocking client interface over an AsyncModbusTcpClient, for a worker thread.
+
+    Each call is scheduled on the event loop that owns the client and waited for, so
+    the synchronous helpers in growatt.client/growatt.control work unchanged.
+    """
+
+    def __init__(self, client, loop):
+        self._client = client
+        self._loop = loop
+
+    @property
+    def connected(self):
+        return self._client.connected
+
+    @property
+    def comm_params(self):
+        return self._client.comm_params
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def read_holding_registers(self, **kwargs):
+        return self._call(self._client.read_holding_registers(**kwargs))
+
+    def read_input_registers(self, **kwargs):
+        return self._call(self._client.read_input_registers(**kwargs))
+
+    def write_registers(self, **kwargs):
+        return self._call(self._client.write_registers(**kwargs))
+
+    def close(self):
+        pass  # owned by the AsyncBridge
+
+
+class AsyncEngine:
+    """The asyncio engine's bridges, plus the control-session runner for the HTTP API."""
+
+    def __init__(self, config, loop):
+        self.config = config
+        self.loop = loop
+        self.bridges = {}
+
+    def bridge(self, host, port=502, framer=None):
+        key = (host, int(port))
+        bridge = self.bridges.get(key)
+        if bridge is None:
+            cfg = self.config.get("modbus") or {}
+            bridge = self.bridges[key] = AsyncBridge(
+                host, port, framer,
+                persistent=cfg.get("persistent", True),
+                max_idle_seconds=cfg.get("max_idle_seconds", 60),
+                timeout=cfg.get("timeout", 5),
+                retries=cfg.get("retries", 3),
+            )
+        return bridge
+
+    async def control(self, fn):
+        """Run blocking fn(inv) against the control inverter inside its bridge session."""
+        from .config import control_target
+        from .control import InverterControl
+        host, port, device_id, framer = control_target(self.config)
+        async with self.bridge(host, port, framer).session(priority=CONTROL) as client:
+            if client is None:
+                raise ConnectionError("could not connect to %s:%s" % (host, port))
+            inv = InverterControl(host, port, device_id,
+                                  client=_BlockingClient(client, self.loop))
+            return await asyncio.to_thread(fn, inv)
+
+    def control_blocking(self, fn):
+        """control(fn) for a caller on a worker thread (the HTTP routes)."""
+        return asyncio.run_coroutine_threadsafe(self.control(fn), self.loop).result()
+
+    def close(self):
+        for bridge in self.bridges.values():
+            bridge.close()
+
+
+def attach_mqtt(client, loop):
+    """Drive a paho client's network I/O from an asyncio loop instead of loop_start().
+
+    Call before connect(). paho reports its socket through the on_socket_* callbacks;
+    reads and writes are then serviced by the loop, and a small task runs paho's
+    keepalive housekeeping (loop_misc) and reconnects if the broker drops us.
+    Returns the housekeeping task.
+    """
+    def on_socket_open(client, _userdata, sock):
+        loop.add_reader(sock, client.loop_read)
+
+    def on_socket_close(_client, _userdata, sock):
+        loop.remove_reader(sock)
+
+    def on_socket_register_write(client, _userdata, sock):
+        loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(_client, _userdata, sock):
+        loop.remove_writer(sock)
+
+    client.on_socket_open = on_socket_open
+    client.on_socket_close = on_socket_close
+    client.on_socket_register_write = on_socket_register_write
+    client.on_socket_unregister_write = on_socket_unregister_write
+
+    async def housekeeping():
+        while True:
+            await asyncio.sleep(1)
+            if client.loop_misc() == mqtt.MQTT_ERR_NO_CONN:
+                try:
+                    # A brief blocking connect; on_socket_open re-registers the reader.
+                    client.reconnect()
+                except OSError as e:
+                    log.warning("MQTT reconnect failed: %s", e)
+                    await asyncio.sleep(5)
+
+    return loop.create_task(housekeeping())
@@ -2,14 +2,71 @@
 
 These wrap a ``pymodbus`` ``ModbusTcpClient`` and are shared by the poller and
 the control side. They log warnings and return ``None``/``False`` on error
-rather than raising, so callers can degrade gracefully.
+rather than raising, so callers can degrade gracefully. The ``a``-prefixed twins
+do the same for an ``AsyncModbusTcpClient`` (the asyncio engine).
+
+Multi-step exchanges (a poll cycle) can be written once as a generator of
+requests and driven by either ``run_requests`` (blocking client) or
+``arun_requests`` (asyncio client); see growatt_modbus.poll_cycle.
 """
 
+import time
 import datetime
+import functools
 import logging
 
 log = logging.getLogger("growatt")
 
+# A multi-step exchange is written as a generator that yields requests and is sent
+# each result: ("holding" | "input", start_address, count) -> registers or None, and
+# ("write", start_address, values) -> bool. The generator's return value is the
+# exchange's result. This keeps the logic free of I/O, so one copy serves both the
+# blocking and the asyncio client (run_requests / arun_requests below).
+READ_HOLDING = "holding"
+READ_INPUT = "input"
+WRITE = "write"
+
+# Instrumentation hooks: each is called as hook(client, op, start_address, seconds, ok)
+# after every request made through the wrappers below. Empty by default (growatt.metrics
+# adds one on the first /metrics scrape), so an unobserved request pays one list check.
+REQUEST_HOOKS = []
+
+
+def _notify(client, op, start_address, seconds, result):
+    ok = result is not None and result is not False
+    for hook in REQUEST_HOOKS:
+        hook(client, op, start_address, seconds, ok)
+
+
+def _instrumented(op):
+    """Decorate a blocking request wrapper so REQUEST_HOOKS see each call."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(client, start_address, arg, device_id=None):
+            if not REQUEST_HOOKS:
+                return fn(client, start_address, arg, device_id)
+            started = time.monotonic()
+            result = fn(client, start_address, arg, device_id)
+            _notify(client, op, start_address, time.monotonic() - started, result)
+            return result
+        return wrapper
+    return decorate
+
+
+def _ainstrumented(op):
+    """_instrumented for the asyncio request wrappers."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(client, start_address, arg, device_id=None):
+            if not REQUEST_HOOKS:
+                return await fn(client, start_address, arg, device_id)
+            started = time.monotonic()
+            result = await fn(client, start_address, arg, device_id)
+            _notify(client, op, start_address, time.monotonic() - started, result)
+            return result
+        return wrapper
+    return decorate
+
 
 def read_double_reg(r1, r2, multiplier=1):
     """Combine two 16-bit registers into a 32-bit value (high << 16 | low)."""
@@ -18,54 +75,49 @@ def read_double_reg(r1, r2, multiplier=1):
     return value
 
 
+def _checked_registers(response, kind, start_address, count):
+    """Validate a read response, returning its registers or None (logged)."""
+    if response.isError():
+        log.warning("Error reading %s registers %s-%s",
+                    kind, start_address, start_address + count)
+        return None
+    registers = response.registers
+    # A garbled/truncated RTU-over-TCP frame can parse as a non-error response with
+    # fewer registers than requested. Reject it here so callers get a clean None
+    # instead of indexing out of range on a short list.
+    if registers is None or len(registers) != count:
+        log.warning("Short %s-register read %s-%s: got %s of %s",
+                    kind, start_address, start_address + count - 1,
+                    0 if registers is None else len(registers), count)
+        return None
+    return registers
+
+
+@_instrumented(READ_HOLDING)
 def read_holding_registers(client, start_address, count, device_id=None):
     """Read holding registers from Modbus. Returns None on error."""
     kwargs = {} if device_id is None else {"device_id": device_id}
     try:
         response = client.read_holding_registers(address=start_address, count=count, **kwargs)
-        if response.isError():
-            log.warning("Error reading holding registers %s-%s",
-                        start_address, start_address + count)
-            return None
-        registers = response.registers
-        # A garbled/truncated RTU-over-TCP frame can parse as a non-error response with
-        # fewer registers than requested. Reject it here so callers get a clean None
-        # instead of indexing out of range on a short list.
-        if registers is None or len(registers) != count:
-            log.warning("Short holding-register read %s-%s: got %s of %s",
-                        start_address, start_address + count - 1,
-                        0 if registers is None else len(registers), count)
-            return None
-        return registers
+        return _checked_registers(response, "holding", start_address, count)
     except Exception as e:
         log.warning("Modbus error reading holding registers: %s", e)
         return None
 
 
+@_instrumented(READ_INPUT)
 def read_input_registers(client, start_address, count, device_id=None):
     """Read input registers from Modbus. Returns None on error."""
     kwargs = {} if device_id is None else {"device_id": device_id}
     try:
         response = client.read_input_registers(address=start_address, count=count, **kwargs)
-        if response.isError():
-            log.warning("Error reading input registers %s-%s",
-                        start_address, start_address + count)
-            return None
-        registers = response.registers
-        # A garbled/truncated RTU-over-TCP frame can parse as a non-error response with
-        # fewer registers than requested. Reject it here so callers get a clean None
-        # instead of indexing out of range on a short list.
-        if registers is None or len(registers) != count:
-            log.warning("Short input-register read %s-%s: got %s of %s",
-                        start_address, start_address + count - 1,
-                        0 if registers is None else len(registers), count)
-            return None
-        return registers
+        return _checked_registers(response, "input", start_address, count)
     except Exception as e:
         log.warning("Modbus error reading input registers: %s", e)
         return None
 
 
+@_instrumented(WRITE)
 def write_registers(client, start_address, values, device_id=None):
     """Write holding registers to Modbus. Returns True on success."""
     kwargs = {} if device_id is None else {"device_id": device_id}
@@ -81,9 +133,8 @@ def write_registers(client, start_address, values, device_id=None):
         return False
 
 
-def get_inverter_serial_number(client):
-    """Read inverter serial number from Modbus."""
-    registers = read_holding_registers(client, 23, 5)
+def decode_serial_number(registers):
+    """Decode the five serial-number registers (holding 23-27) to a string."""
     if registers:
         try:
             return ''.join(chr((i >> 8) & 0xFF) + chr(i & 0xFF) for i in registers)
@@ -92,9 +143,13 @@ def get_inverter_serial_number(client):
     return "unknown_serial"
 
 
-def get_inverter_time(client):
-    """Read the inverter's RTC. Returns a tz-aware UTC datetime, or None."""
-    registers = read_holding_registers(client, 45, 7)
+def get_inverter_serial_number(client):
+    """Read inverter serial number from Modbus."""
+    return decode_serial_number(read_holding_registers(client, 23, 5))
+
+
+def decode_inverter_time(registers):
+    """Decode the seven RTC registers (holding 45-51) to a tz-aware UTC datetime, or None."""
     if not registers:
         return None
     year, month, day, hour, minute, second, _dow = registers
@@ -109,27 +164,56 @@ def get_inverter_time(client):
         return None
 
 
-def sync_inverter_time(client, max_drift_seconds):
-    """Compare the inverter clock to UTC and correct it if it has drifted."""
-    inverter_time = get_inverter_time(client)
-    if inverter_time is None:
-        return
+def get_inverter_time(client):
+    """Read the inverter's RTC. Returns a tz-aware UTC datetime, or None."""
+    return decode_inverter_time(read_holding_registers(client, 45, 7))
+
+
+def time_registers(now_utc):
+    """The six RTC values to write (via FC16 at register 45) to set the clock to now_utc.
+
+    Asymmetric year: the inverter reports a 4-digit year on read but expects a
+    2-digit year (year - 2000) on write. The weekday register is left for the
+    inverter to derive (matches the known-good octopus_agile_battery_scheduler).
+    """
+    return [now_utc.year - 2000, now_utc.month, now_utc.day,
+            now_utc.hour, now_utc.minute, now_utc.second]
+
+
+def clock_correction(inverter_time, max_drift_seconds):
+    """Compare a decoded inverter clock to UTC; return the RTC registers to write, or None."""
     now_utc = datetime.datetime.now(datetime.timezone.utc)
     delta = abs((now_utc - inverter_time).total_seconds())
     log.info("Inverter time %s, drift %.0fs from UTC", inverter_time.isoformat(), delta)
     if delta > max_drift_seconds:
         log.warning("Inverter clock drifted %.0fs, correcting to %s",
                     delta, now_utc.isoformat())
-        # Asymmetric year: the inverter reports a 4-digit year on read but
-        # expects a 2-digit year (year - 2000) on write. Write the six time
-        # fields via FC16; the weekday register is left for the inverter to
-        # derive (matches the known-good octopus_agile_battery_scheduler).
-        time_list = [now_utc.year - 2000, now_utc.month, now_utc.day,
-                     now_utc.hour, now_utc.minute, now_utc.second]
-        if not write_registers(client, 45, time_list):
-            log.warning("Failed to update inverter time")
-        else:
-            log.info("Inverter time updated to %s", now_utc.isoformat())
+        return time_registers(now_utc)
+    return None
+
+
+def sync_time_requests(max_drift_seconds):
+    """Request generator: read the RTC and correct it if it has drifted (see below).
+
+    Returns None if no write was needed (or the RTC could not be read), else whether
+    the correcting write succeeded.
+    """
+    inverter_time = decode_inverter_time((yield (READ_HOLDING, 45, 7)))
+    if inverter_time is None:
+        return None
+    time_list = clock_correction(inverter_time, max_drift_seconds)
+    if time_list is None:
+        return None
+    if not (yield (WRITE, 45, time_list)):
+        log.warning("Failed to update inverter time")
+        return False
+    log.info("Inverter time updated")
+    return True
+
+
+def sync_inverter_time(client, max_drift_seconds):
+    """Compare the inverter clock to UTC and correct it if it has drifted."""
+    run_requests(sync_time_requests(max_drift_seconds), client)
 
 
 def set_inverter_time(client, device_id=None):
@@ -140,9 +224,99 @@ def set_inverter_time(client, device_id=None):
     write as sync_inverter_time.
     """
     now_utc = datetime.datetime.now(datetime.timezone.utc)
-    time_list = [now_utc.year - 2000, now_utc.month, now_utc.day,
-                 now_utc.hour, now_utc.minute, now_utc.second]
-    if write_registers(client, 45, time_list, device_id=device_id):
+    if write_registers(client, 45, time_registers(now_utc), device_id=device_id):
         log.info("Inverter time set to %s", now_utc.isoformat())
     else:
         log.warning("Failed to set inverter time")
+
+
+# ---------------------------------------------------------------------------
+# asyncio twins of the wrappers above (same validation, same None/False on error)
+# ---------------------------------------------------------------------------
+@_ainstrumented(READ_HOLDING)
+async def aread_holding_registers(client, start_address, count, device_id=None):
+    """Read holding registers via an AsyncModbusTcpClient. Returns None on error."""
+    kwargs = {} if device_id is None else {"device_id": device_id}
+    try:
+        response = await client.read_holding_registers(address=start_address, count=count,
+                                                        **kwargs)
+        return _checked_registers(response, "holding", start_address, count)
+    except Exception as e:
+        log.warning("Modbus error reading holding registers: %s", e)
+        return None
+
+
+@_ainstrumented(READ_INPUT)
+async def aread_input_registers(client, start_address, count, device_id=None):
+    """Read input registers via an AsyncModbusTcpClient. Returns None on error."""
+    kwargs = {} if device_id is None else {"device_id": device_id}
+    try:
+        response = await client.read_input_registers(address=start_address, count=count,
+                                                      **kwargs)
+        return _checked_registers(response, "input", start_address, count)
+    except Exception as e:
+        log.warning("Modbus error reading input registers: %s", e)
+        return None
+
+
+@_ainstrumented(WRITE)
+async def awrite_registers(client, start_address, values, device_id=None):
+    """Write holding registers via an AsyncModbusTcpClient. Returns True on success."""
+    kwargs = {} if device_id is None else {"device_id": device_id}
+    try:
+        response = await client.write_registers(address=start_address, values=values, **kwargs)
+        if response.isError():
+            log.warning("Error writing registers %s-%s",
+                        start_address, start_address + len(values) - 1)
+            return False
+        return True
+    except Exception as e:
+        log.warning("Modbus write error: %s", e)
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Request generator drivers
+# ---------------------------------------------------------------------------
+def run_requests(gen, client, device_id=None, observe=None):
+    """Drive a request generator against a blocking client; return its result.
+
+    observe, if given, is called as observe(op, address, seconds, ok) after each
+    request, e.g. to feed a device's latency statistics (growatt.adaptive).
+    """
+    result = None
+    try:
+        while True:
+            op, address, arg = gen.send(result)
+            started = time.monotonic()
+            if op == READ_HOLDING:
+                result = read_holding_registers(client, address, arg, device_id=device_id)
+            elif op == READ_INPUT:
+                result = read_input_registers(client, address, arg, device_id=device_id)
+            else:
+                result = write_registers(client, address, arg, device_id=device_id)
+            if observe is not None:
+                observe(op, address, time.monotonic() - started,
+                        result is not None and result is not False)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def arun_requests(gen, client, device_id=None, observe=None):
+    """Drive a request generator against an asyncio client; return its result."""
+    result = None
+    try:
+        while True:
+            op, address, arg = gen.send(result)
+            started = time.monotonic()
+            if op == READ_HOLDING:
+                result = await aread_holding_registers(client, address, arg, device_id=device_id)
+            elif op == READ_INPUT:
+                result = await aread_input_registers(client, address, arg, device_id=device_id)
+            else:
+                result = await awrite_registers(client, address, arg, device_id=device_id)
+            if observe is not None:
+                observe(op, address, time.monotonic() - started,
+                        result is not None and result is not False)
+    except StopIteration as stop:
+        return stop.value
@@ -0,0 +1,137 @@
+"""MQTT command topics: inverter control without the HTTP round trip.
+
+With ``mqtt.commands`` the poller subscribes to ``<prefix>/<serial>/cmd/mode`` and
+takes the same JSON payloads as POST /mode (growatt.http_api), e.g.
+
+    {"action": "switch_inverter_to_batt_first_mode", "duration": 30, "id": "ha-1234"}
+
+Commands are queued as control jobs next to the HTTP ones (growatt.jobs): the same
+locked control session, the same priority over polls and the same coalescing. When
+the job has finished, the outcome - the POST /mode response body, plus the command's
+"id" if it had one - is published (not retained) to ``<prefix>/<serial>/cmd/mode/result``.
+
+A command is acted on at most once:
+
+- retained messages are ignored: the broker replays them on every subscribe, so a
+  retained command would otherwise run again after each restart or reconnect;
+- a command whose "id" was among the last few hundred seen is dropped (a QoS 1
+  redelivery, or a client retrying after a lost acknowledgement);
+- a command identical to one still queued or running joins that job.
+
+Only the control inverter (control.device) can be commanded; its serial is the one
+in the topic.
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from .config import control_target
+from .http_api import job_outcome, submit_mode
+
+log = logging.getLogger("growatt")
+
+
+class CommandHandler:
+    """Subscribes to the mode command topic and runs its commands as control jobs.
+
+    ctx is a routes context (growatt.http_api.attach_state). client is the paho client
+    to subscribe through; results go out through publisher (default: client), via
+    call(fn) if publishing must hop threads (the asyncio engine's loop).
+    """
+
+    def __init__(self, ctx, client, publisher=None, call=None, seen_size=256):
+        self.ctx = ctx
+        self.client = client
+        self.publisher = publisher or client
+        self.call = call
+        self.seen_size = seen_size
+        self.prefix = ctx.gw_config["mqtt"]["topic_prefix"]
+        self.topic = f"{self.prefix}/+/cmd/mode"
+        self.stats = {"received": 0, "duplicates": 0, "retainedIgnored": 0, "rejected": 0}
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Route the command topic here and subscribe, now and after every reconnect."""
+        self.client.message_callback_add(self.topic, self._on_message)
+        previous = self.client.on_connect
+
+        def on_connect(client, userdata, flags, reason_code, properties=None):
+            if previous is not None:
+                previous(client, userdata, flags, reason_code, properties)
+            self._subscribe()
+
+        self.client.on_connect = on_connect
+        if self.client.is_connected():
+            self._subscribe()
+        log.info("Accepting MQTT control commands on %s", self.topic)
+
+    def _subscribe(self):
+        # QoS 1: a command is not lost if the link drops; redeliveries are de-duplicated.
+        self.client.subscribe(self.topic, qos=1)
+
+    def _control_serial(self):
+        host = control_target(self.ctx.gw_config)[0]
+        st = self.ctx.gw_stats.get(host) or {}
+        if st.get("serial"):
+            return st["serial"]
+        for dev in self.ctx.gw_config.get("devices") or []:
+            if dev.get("host") == host and dev.get("serial"):
+                return dev["serial"]
+        return None
+
+    def _on_message(self, _client, _userdata, message):
+        serial = message.topic.split("/")[-3]
+        if message.retain:
+            self.stats["retainedIgnored"] += 1
+            log.info("Ignoring retained MQTT command on %s", message.topic)
+            return
+        try:
+            body = json.loads(message.payload or b"{}")
+        except (ValueError, TypeError):
+            body = None
+        if not isinstance(body, dict):
+            self._reject(serial, None, "invalid JSON body")
+            return
+        command_id = body.pop("id", None)
+        if command_id is not None and self._seen_before(command_id):
+            self.stats["duplicates"] += 1
+            log.info("Ignoring repeated MQTT command %s", command_id)
+            return
+        self.stats["received"] += 1
+        if serial != self._control_serial():
+            self._reject(serial, command_id, "%s is not the control inverter" % serial)
+            return
+        try:
+            submit_mode(self.ctx, body,
+                        callback=lambda job: self._respond(serial, command_id,
+                                                           job_outcome(job)[1]))
+        except ValueError as e:
+            self._reject(serial, command_id, str(e))
+
+    def _seen_before(self, command_id):
+        key = json.dumps(command_id)
+        with self._lock:
+            if key in self._seen:
+                return True
+            self._seen[key] = None
+            while len(self._seen) > self.seen_size:
+                self._seen.popitem(last=False)
+        return False
+
+    def _reject(self, serial, command_id, message):
+        self.stats["rejected"] += 1
+        log.warning("Rejected MQTT command for %s: %s", serial, message)
+        self._respond(serial, command_id, {"status": "error", "message": message})
+
+    def _respond(self, serial, command_id, payload):
+        if command_id is not None:
+            payload = {"id": command_id, **payload}
+        topic = f"{self.prefix}/{serial}/cmd/mode/result"
+        data = json.dumps(payload).encode()
+        if self.call is None:
+            self.publisher.publish(topic, data, retain=False)
+        else:
+            self.call(lambda: self.publisher.publish(topic, data, retain=False))
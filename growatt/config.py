@@ -14,11 +14,57 @@ import yaml
 log = logging.getLogger("growatt")
 
 DEFAULT_CONFIG = {
+    # "threaded" (default): blocking Modbus clients, a poll worker pool and a threaded
+    # HTTP server. "async": one asyncio event loop runs every device cycle as a task.
+    "engine": "threaded",
     "poll_interval": 10,
     # How many times to re-read an inverter within a single poll cycle before giving up,
     # to ride out the occasional garbled/short frame from a raw RTU-over-TCP dongle.
     "read_retries": 3,
+    # Concurrent poll mode: size of the worker pool that polls devices behind different
+    # bridges in parallel. 1 (the default) polls every device sequentially.
+    "poll_workers": 1,
+    # Poll tiers (see growatt.registers): fast values are read every cycle, the energy
+    # counters every energy_every_cycles successful cycles, and the static identity/config
+    # registers every static_every_seconds (and after a control write).
+    "poll_tiers": {
+        "energy_every_cycles": 6,
+        "static_every_seconds": 900,
+    },
+    # In-memory history of each device's numeric fields for GET /history: a fixed-size
+    # ring buffer holding `hours` of samples at the device's poll interval (~5 MB per
+    # device for 24 h of 10 s polls, so off unless enabled).
+    "history": {
+        "enabled": False,
+        "hours": 24,
+    },
+    # Raw-block recorder: append every successful cycle's register blocks to rotated
+    # binary files in `directory` for later replay (python -m growatt.recorder).
+    "recorder": {
+        "enabled": False,
+        "directory": "recordings",
+        "rotate_mb": 64,
+        "keep_files": 48,
+    },
     "devices": [],
+    # Modbus connections: keep one connection per bridge open across poll cycles and
+    # control calls (persistent), reconnecting after max_idle_seconds without use.
+    "modbus": {
+        "persistent": True,
+        "max_idle_seconds": 60,
+        # Per-request timeout (seconds) and pymodbus retries. With adaptive_timeout the
+        # timeout is derived from each device's observed latency, between min_timeout
+        # and timeout, and a device failing backoff_after_failures cycles in a row is
+        # backed off exponentially (from backoff_base_seconds, doubling per further
+        # failure up to backoff_max_seconds) with recovery probes.
+        "timeout": 5,
+        "retries": 3,
+        "adaptive_timeout": True,
+        "min_timeout": 0.5,
+        "backoff_after_failures": 3,
+        "backoff_base_seconds": 15,
+        "backoff_max_seconds": 600,
+    },
     "mqtt": {
         "broker": "localhost",
         "port": 1883,
@@ -28,6 +74,24 @@ DEFAULT_CONFIG = {
         "retain": True,
         "discovery_prefix": "homeassistant",
         "discovery": True,
+        # State/diagnostics payload encoder: json (stdlib) or orjson (compact, faster;
+        # needs the orjson package). msgpack: also publish each state as MessagePack
+        # on <topic_prefix>/<serial>/state/msgpack (needs the msgpack package).
+        "serializer": "json",
+        "msgpack": False,
+        # Accept control commands on <topic_prefix>/<serial>/cmd/mode (growatt.commands).
+        "commands": False,
+        # Bound on messages waiting for the background publisher (threaded engine). A
+        # newer message replaces a queued one on the same topic; when full, the oldest
+        # queued topic is dropped.
+        "publish_queue_size": 1000,
+        # Change-only publishing: skip a device's state while every field is within its
+        # deadband (growatt.registers.sensor_deadbands, overridden per field by
+        # deadbands) of the last published state, re-publishing in full at least every
+        # heartbeat_seconds.
+        "change_only": False,
+        "heartbeat_seconds": 300,
+        "deadbands": {},
     },
     "time_sync": {
         "enabled": True,
@@ -36,6 +100,11 @@ DEFAULT_CONFIG = {
     # In-process HTTP endpoint for control + health (replaces the old lighttpd/CGI).
     "http": {
         "port": 8085,
+        # GET /stream (growatt.stream): events buffered per client before its oldest
+        # are dropped, concurrent clients allowed, and the idle keepalive interval.
+        "stream_buffer": 32,
+        "stream_max_clients": 16,
+        "stream_keepalive_seconds": 15,
     },
     # /health reports stale (503) if the control inverter has not been read successfully
     # within this many seconds; otherwise ok (200).
@@ -51,6 +120,14 @@ DEFAULT_CONFIG = {
         # the grid-first endpoint into the register-1070 discharge-rate percent.
         # Leave null to require rate_percent instead.
         "rated_power_w": None,
+        # Before each control action the inverter clock is read and only rewritten if
+        # it is more than this far off UTC (the slots are UTC).
+        "max_clock_drift_seconds": 5,
+        # POST /mode and PUT /schedule queue a control job and wait this long for it
+        # to finish (answering 202 + a job id if it has not); ?wait=N overrides.
+        "sync_wait_seconds": 30,
+        # Finished control jobs kept for GET /jobs/<id>.
+        "job_history": 100,
     },
 }
 
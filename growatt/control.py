@@ -5,6 +5,12 @@ Faithful port of the original switch_inverter_mode.py CGI logic. Register addres
 the slot map (with the 1018 off-by-one vs the PDF) and the AC-charge values are kept
 exactly as the proven script; only the inverter host/unit now come from config.
 Times are UTC (Octopus Agile prices are UTC) and encoded as hour << 8 | minute.
+
+Every action goes through a ``WritePlan``: the registers it may touch are read in as
+few blocks as the read-plan compiler allows, diffed against the wanted values, and
+only the registers that differ are written, contiguous ones in a single FC16 write.
+An action that changes nothing costs one read instead of a string of writes, and
+the executed plan is returned to the HTTP caller.
 """
 
 import datetime
@@ -12,25 +18,37 @@ import logging
 
 from pymodbus.client import ModbusTcpClient
 
-from .client import read_holding_registers, write_registers, set_inverter_time
-from ._modbus_lock import MODBUS_LOCK
+from .client import (read_holding_registers, write_registers, set_inverter_time,
+                     run_requests, sync_time_requests)
+from .registers import compile_read_plan
+from ._modbus_lock import CONTROL, bridge_lock
 
 log = logging.getLogger("growatt")
 
 UTC = datetime.timezone.utc
 
 
-def with_control_session(config, fn):
-    """Run fn(inv) against the control inverter inside the global Modbus lock.
+def with_control_session(config, fn, pool=None):
+    """Run fn(inv) against the control inverter inside its bridge's Modbus lock.
 
-    Opens a short-lived InverterControl (one connection), calls fn, and always closes
-    it. Holding MODBUS_LOCK for the whole session means it can never overlap a poll
-    cycle's session, so the dongle never sees two concurrent connections.
+    With a ConnectionPool (growatt.pool) the session borrows the bridge's persistent
+    connection, shared with the poller; without one it opens a short-lived
+    InverterControl and always closes it. Either way the bridge lock is held for the
+    whole session, so it can never overlap a poll cycle's session on the same dongle
+    and polls of inverters on other bridges carry on undisturbed. The lock is taken
+    at CONTROL priority: the session goes ahead of any poll cycles waiting for it.
     """
     from .config import control_target
     host, port, device_id, framer = control_target(config)
-    with MODBUS_LOCK:
-        inv = InverterControl(host, port, device_id, framer=framer)
+    if pool is not None:
+        with pool.session(host, port, framer, priority=CONTROL) as client:
+            if client is None:
+                raise ConnectionError("could not connect to %s:%s" % (host, port))
+            return fn(InverterControl(host, port, device_id, client=client))
+    modbus = config.get("modbus") or {}
+    with bridge_lock(host, port).hold(CONTROL):
+        inv = InverterControl(host, port, device_id, framer=framer,
+                              timeout=modbus.get("timeout", 5), retries=modbus.get("retries", 3))
         try:
             return fn(inv)
         finally:
@@ -65,6 +83,35 @@ GRID_FIRST_SLOTS = [
 ]
 
 
+# The four three-slot register blocks, in /slots order: (mode, first slot, address).
+_SLOT_BLOCKS = (
+    ("battery_first", 1, BATT_FIRST_SLOTS[0][0]),
+    ("battery_first", 4, BATT_FIRST_SLOTS[3][0]),
+    ("grid_first", 1, GRID_FIRST_SLOTS[0][0]),
+    ("grid_first", 4, GRID_FIRST_SLOTS[3][0]),  # extended block, PDF-derived
+)
+
+
+def decode_slots(read):
+    """Every Battery-First / Grid-First slot as {"<mode>_slot_<n>": {start, end, enabled}}.
+
+    read(address, count) returns the holding registers, or None if unavailable (that
+    block's slots are then left out): a live read on the inverter, or a slice of the
+    poller's last cycle (GET /slots).
+    """
+    slots = {}
+    for mode, first, address in _SLOT_BLOCKS:
+        registers = read(address, 9)
+        if registers:
+            for i in range(3):
+                slots["%s_slot_%d" % (mode, first + i)] = {
+                    "start": decode_time(registers[i * 3]),
+                    "end": decode_time(registers[i * 3 + 1]),
+                    "enabled": bool(registers[i * 3 + 2]),
+                }
+    return slots
+
+
 def decode_time(encoded_time):
     """Decode the inverter time format (hour << 8 | minute) to 'HH:MM'."""
     return "%02d:%02d" % (encoded_time >> 8, encoded_time & 255)
@@ -84,18 +131,201 @@ def encode_time(value):
     return hh << 8 | mm
 
 
+def export_rate_percent(export_watts=None, rate_percent=None, rated_power_w=None):
+    """The grid-first discharge rate (register 1070) as 1-100% of rated power, from a
+    wattage (needs rated_power_w) or a percent; None if neither was given."""
+    if export_watts is not None:
+        if not rated_power_w:
+            raise ValueError(
+                "export_watts needs rated_power_w to convert to a percent "
+                "(set control.rated_power_w in config)"
+            )
+        rate = round(100 * float(export_watts) / float(rated_power_w))
+    elif rate_percent is not None:
+        rate = int(rate_percent)
+    else:
+        return None
+    return max(1, min(100, rate))
+
+
+def schedule_registers(battery_first=(), grid_first=(), rate_percent=None, stop_soc=None):
+    """The holding-register values for a whole schedule: {address: [values]}.
+
+    battery_first / grid_first are lists of up to six windows, each {"start": "HH:MM",
+    "end": "HH:MM"} (UTC) with an optional "slot" (1-6, default: its position) and
+    "enabled" (default true). Every slot not given is cleared, so the result is the
+    complete slot table. With any battery-first window the AC-charge registers
+    1090-1092 get the same hard-coded values battery_first() writes. rate_percent /
+    stop_soc set 1070 / 1071 and are left alone when None. Raises ValueError.
+
+    The settings come first and the slot tables after them (in address order), so
+    apply_schedule writes 1070/1071 and 1090-1092 before any slot they apply to.
+    """
+    registers = {}
+    if rate_percent is not None:
+        registers[1070] = [max(1, min(100, int(rate_percent)))]
+    if stop_soc is not None:
+        registers[1071] = [max(0, min(100, int(stop_soc)))]
+    if battery_first:
+        registers[1090] = [100, 100, 1]  # max charge rate, stop-SOC, AC charge enable
+    tables = {}
+    for mode, slots, windows in (("battery_first", BATT_FIRST_SLOTS, battery_first),
+                                 ("grid_first", GRID_FIRST_SLOTS, grid_first)):
+        if len(windows) > len(slots):
+            raise ValueError("at most %d %s windows" % (len(slots), mode))
+        table = {slot[0]: [0, 0, 0] for slot in slots}
+        seen = set()
+        for position, window in enumerate(windows, 1):
+            slot_num = int(window.get("slot", position))
+            if not 1 <= slot_num <= len(slots) or slot_num in seen:
+                raise ValueError("invalid or repeated %s slot %s" % (mode, slot_num))
+            seen.add(slot_num)
+            table[slots[slot_num - 1][0]] = [encode_time(window["start"]),
+                                             encode_time(window["end"]),
+                                             1 if window.get("enabled", True) else 0]
+        tables.update(table)
+    registers.update(sorted(tables.items()))
+    return registers
+
+
+# Registers per FC16 write (the Modbus limit).
+MAX_WRITE_REGISTERS = 123
+
+
+class WritePlan:
+    """The holding registers one control action wants, written with the fewest round trips.
+
+    Construct with the (address, count) ranges the action may touch; they are read
+    on first use (current(), or execute()) in the blocks compile_read_plan picks.
+    want() records target values; execute() writes only the registers whose read-back
+    differs (or could not be read), merging each contiguous run of wanted registers
+    into one write from its first to its last change.
+
+    Writes go out in the order of the want() calls, as the unplanned actions wrote
+    them: the settings a slot runs on (rate, SOC floor, AC charge) are wanted, and so
+    written, before the slot that enables it, so a write that fails part way never
+    leaves an enabled slot on stale settings. Only consecutive wants that continue
+    one another's addresses are merged; a repeated want keeps its first position.
+    """
+
+    def __init__(self, inv, ranges):
+        self.inv = inv
+        self.reads = compile_read_plan((), [("holding", address, count)
+                                            for address, count in ranges])
+        self.values = None
+        self.desired = {}  # address -> value, in want() order
+        self.writes = []
+        self.unchanged = 0
+
+    def _read(self):
+        if self.values is None:
+            self.values = {}
+            for block in self.reads:
+                registers = self.inv._read(block.start, block.count)
+                if registers is None:
+                    log.warning("Could not read %d-%d before writing; writing blind",
+                                block.start, block.start + block.count - 1)
+                    continue
+                self.values.update(zip(range(block.start, block.start + block.count),
+                                       registers))
+        return self.values
+
+    def current(self, address, count=1):
+        """The registers' present values, or None if they could not be read."""
+        values = self._read()
+        registers = [values.get(a) for a in range(address, address + count)]
+        return None if None in registers else registers
+
+    def want(self, address, values):
+        for offset, value in enumerate(values):
+            self.desired[address + offset] = value
+
+    def _runs(self):
+        """[(address, values)] to write: changed registers, coalesced as described above."""
+        values = self._read()
+        runs, run = [], []
+        for address in self.desired:
+            if run and address != run[-1] + 1:
+                runs.append(run)
+                run = []
+            run.append(address)
+        if run:
+            runs.append(run)
+        writes = []
+        for run in runs:
+            changed = [a for a in run if values.get(a) != self.desired[a]]
+            self.unchanged += len(run) - len(changed)
+            if not changed:
+                continue
+            start = changed[0]
+            while start <= changed[-1]:
+                end = min(changed[-1], start + MAX_WRITE_REGISTERS - 1)
+                writes.append((start, [self.desired[a] for a in range(start, end + 1)]))
+                # Resume at the next changed register after this write.
+                start = next((a for a in changed if a > end), end + 1)
+        return writes
+
+    def execute(self):
+        """Write what differs; returns True if every write succeeded."""
+        ok = True
+        for address, values in self._runs():
+            log.info("Writing %d register(s) at %d: %s", len(values), address, values)
+            written = self.inv._write(address, values)
+            self.writes.append((address, len(values), written))
+            ok = ok and written
+        self.desired = {}
+        return ok
+
+    def report(self):
+        return {
+            "reads": [{"address": b.start, "count": b.count} for b in self.reads],
+            "writes": [{"address": address, "count": count, "ok": ok}
+                       for address, count, ok in self.writes],
+            "unchanged": self.unchanged,
+        }
+
+
 class InverterControl:
     """Connect to one inverter and issue control commands."""
 
-    def __init__(self, host, port=502, device_id=1, framer=None, timeout=5):
+    def __init__(self, host, port=502, device_id=1, framer=None, timeout=5, client=None,
+                 retries=3):
         self.device_id = device_id
-        # retries: raw RTU-over-TCP dongles occasionally drop/garble a frame.
-        kwargs = {"framer": framer} if framer is not None else {}
-        self.client = ModbusTcpClient(host, port=port, timeout=timeout, retries=3, **kwargs)
-        self.connected = self.client.connect()
+        # A borrowed (pooled) client is owned by the pool, so close() leaves it open.
+        self._owns_client = client is None
+        if client is None:
+            # retries: raw RTU-over-TCP dongles occasionally drop/garble a frame.
+            kwargs = {"framer": framer} if framer is not None else {}
+            client = ModbusTcpClient(host, port=port, timeout=timeout, retries=retries, **kwargs)
+            self.connected = client.connect()
+        else:
+            self.connected = client.connected
+        self.client = client
+        self.plans = []
+        self.clock = None
+
+    def plan(self, *ranges):
+        """A WritePlan over the given (address, count) ranges, kept for plan_report()."""
+        plan = WritePlan(self, ranges)
+        self.plans.append(plan)
+        return plan
+
+    def plan_report(self):
+        """What this session did on the bus: the clock check, reads, writes, no-ops."""
+        reads = [read for plan in self.plans for read in plan.report()["reads"]]
+        writes = [write for plan in self.plans for write in plan.report()["writes"]]
+        report = {"reads": reads, "writes": writes,
+                  "unchanged": sum(plan.unchanged for plan in self.plans)}
+        round_trips = len(reads) + len(writes)
+        if self.clock is not None:
+            report["clock"] = {"corrected": self.clock["corrected"]}
+            round_trips += 1 + self.clock["written"]
+        report["round_trips"] = round_trips
+        return report
 
     def close(self):
-        self.client.close()
+        if self._owns_client:
+            self.client.close()
 
     # -- low-level (via the shared wrappers, scoped to this device) --
     def _read(self, address, count):
@@ -108,42 +338,16 @@ class InverterControl:
     def set_time(self):
         set_inverter_time(self.client, device_id=self.device_id)
 
+    def sync_time(self, max_drift_seconds):
+        """Read the RTC and set it only if it is more than max_drift_seconds off UTC."""
+        written = run_requests(sync_time_requests(max_drift_seconds), self.client,
+                               device_id=self.device_id)
+        self.clock = {"corrected": written is True, "written": written is not None}
+        return written
+
     # -- read all slots --
     def get_all_slots(self):
-        slots = {}
-        bf_1_3 = self._read(1100, 9)
-        if bf_1_3:
-            for i in range(3):
-                slots["battery_first_slot_%d" % (i + 1)] = {
-                    "start": decode_time(bf_1_3[i * 3]),
-                    "end": decode_time(bf_1_3[i * 3 + 1]),
-                    "enabled": bool(bf_1_3[i * 3 + 2]),
-                }
-        bf_4_6 = self._read(1018, 9)
-        if bf_4_6:
-            for i in range(3):
-                slots["battery_first_slot_%d" % (i + 4)] = {
-                    "start": decode_time(bf_4_6[i * 3]),
-                    "end": decode_time(bf_4_6[i * 3 + 1]),
-                    "enabled": bool(bf_4_6[i * 3 + 2]),
-                }
-        gf_1_3 = self._read(1080, 9)
-        if gf_1_3:
-            for i in range(3):
-                slots["grid_first_slot_%d" % (i + 1)] = {
-                    "start": decode_time(gf_1_3[i * 3]),
-                    "end": decode_time(gf_1_3[i * 3 + 1]),
-                    "enabled": bool(gf_1_3[i * 3 + 2]),
-                }
-        gf_4_6 = self._read(1027, 9)  # extended block, PDF-derived (see GRID_FIRST_SLOTS)
-        if gf_4_6:
-            for i in range(3):
-                slots["grid_first_slot_%d" % (i + 4)] = {
-                    "start": decode_time(gf_4_6[i * 3]),
-                    "end": decode_time(gf_4_6[i * 3 + 1]),
-                    "enabled": bool(gf_4_6[i * 3 + 2]),
-                }
-        return slots
+        return decode_slots(self._read)
 
     # -- mode switches --
     def battery_first(self, duration=30, slot_num=6):
@@ -159,7 +363,8 @@ class InverterControl:
 
         slot = BATT_FIRST_SLOTS[slot_num - 1]
         slot_start_reg = slot[0]
-        current = self._read(slot_start_reg, 3)
+        plan = self.plan((slot_start_reg, 3), (1090, 3))
+        current = plan.current(slot_start_reg, 3)
         if current and current[2] == 1:
             # A slot is already enabled; do not shorten an existing charge window.
             start_h, start_m = current[0] >> 8, current[0] & 255
@@ -177,26 +382,25 @@ class InverterControl:
             log.info("[BF] existing slot ends before requested, reprogramming")
 
         # Max charge level + enable AC charging (values intentionally hard-coded).
-        self._write(1090, [100])
-        self._write(1091, [100])
-        self._write(1092, [1])
+        plan.want(1090, [100, 100, 1])
         encoded_start = system_now.hour << 8 | system_now.minute
         encoded_end = new_end_time.hour << 8 | new_end_time.minute
         log.info("[BF] writing slot %s start=%s end=%s", slot_num, encoded_start, encoded_end)
-        self._write(slot_start_reg, [encoded_start, encoded_end, 1])
+        plan.want(slot_start_reg, [encoded_start, encoded_end, 1])
+        plan.execute()
 
     def load_first(self):
         """Load First: clear the Battery-First slot 6 enable and all Grid-First enables."""
         slot_6_enable_reg = BATT_FIRST_SLOTS[5][2]  # 1026
-        r = self._read(slot_6_enable_reg, 1)
-        if r and r[0] == 1:
-            log.info("Clearing batt first slot 6 enable")
-            self._write(slot_6_enable_reg, [0])
-        for i, slot in enumerate(GRID_FIRST_SLOTS, 1):
-            r = self._read(slot[2], 1)
-            if r and r[0] == 1:
-                log.info("Clearing grid first slot %d enable", i)
-                self._write(slot[2], [0])
+        enables = [slot_6_enable_reg] + [slot[2] for slot in GRID_FIRST_SLOTS]
+        plan = self.plan(*[(reg, 1) for reg in enables])
+        for reg in enables:
+            # Only an enable that reads back as 1 is cleared (as the per-register
+            # checks this replaces did); unreadable ones are left alone.
+            if plan.current(reg) == [1]:
+                log.info("Clearing slot enable register %d", reg)
+                plan.want(reg, [0])
+        plan.execute()
 
     def grid_first(self, duration=30, start=None, end=None, slot_num=1,
                    export_watts=None, rate_percent=None, stop_soc=None, rated_power_w=None):
@@ -228,18 +432,9 @@ class InverterControl:
                              % (slot_num, len(GRID_FIRST_SLOTS)))
 
         # Resolve the discharge/export rate as a percent of rated power.
-        if export_watts is not None:
-            if not rated_power_w:
-                raise ValueError(
-                    "export_watts needs rated_power_w to convert to a percent "
-                    "(set control.rated_power_w in config)"
-                )
-            rate = round(100 * float(export_watts) / float(rated_power_w))
-        elif rate_percent is not None:
-            rate = int(rate_percent)
-        else:
+        rate = export_rate_percent(export_watts, rate_percent, rated_power_w)
+        if rate is None:
             rate = 100  # original default: discharge at full power
-        rate = max(1, min(100, rate))
 
         floor = 25 if stop_soc is None else int(stop_soc)
         floor = max(0, min(100, floor))
@@ -262,45 +457,51 @@ class InverterControl:
         log.info("[GF] slot=%s start=%s end=%s rate=%s%% stop_soc=%s%%",
                  slot_num, decode_time(encoded_start), decode_time(encoded_end), rate, floor)
         # Clear batt-first slot 6 enable, set discharge rate + stop SOC, program the slot.
-        self._write(BATT_FIRST_SLOTS[5][2], [0])  # 1026
-        self._write(1071, [floor])
-        self._write(1070, [rate])
-        self._write(slot[0], [encoded_start, encoded_end, 1])
+        plan = self.plan((BATT_FIRST_SLOTS[5][2], 1), (1070, 2), (slot[0], 3))
+        plan.want(BATT_FIRST_SLOTS[5][2], [0])  # 1026
+        plan.want(1070, [rate, floor])
+        plan.want(slot[0], [encoded_start, encoded_end, 1])
+        plan.execute()
         return {"slot_num": slot_num, "start": decode_time(encoded_start),
                 "end": decode_time(encoded_end), "rate_percent": rate, "stop_soc": floor}
 
+    def apply_schedule(self, registers):
+        """Program a whole schedule (see schedule_registers) in one plan: a single read
+        of 1018-1108, then a write per contiguous run that differs, settings before
+        slots. Re-applying the same schedule reads and writes nothing else."""
+        plan = self.plan(*[(address, len(values)) for address, values in registers.items()])
+        for address, values in registers.items():
+            plan.want(address, values)
+        return plan.execute()
+
+    def _disable(self, enable_reg, label):
+        plan = self.plan((enable_reg, 1))
+        if plan.current(enable_reg) == [0]:
+            log.info("%s already disabled", label)
+            return
+        log.info("Disabling %s (register %d = 0)", label, enable_reg)
+        plan.want(enable_reg, [0])
+        plan.execute()
+
     def disable_batt_first_slot(self, slot_num):
         slot_num = int(slot_num)
         if not (1 <= slot_num <= len(BATT_FIRST_SLOTS)):
             log.warning("disable: invalid slot number %s", slot_num)
             return
-        enable_reg = BATT_FIRST_SLOTS[slot_num - 1][2]
-        r = self._read(enable_reg, 1)
-        if r and r[0] == 0:
-            log.info("Slot %d already disabled", slot_num)
-            return
-        log.info("Disabling slot %d (register %d = 0)", slot_num, enable_reg)
-        self._write(enable_reg, [0])
+        self._disable(BATT_FIRST_SLOTS[slot_num - 1][2], "slot %d" % slot_num)
 
     def disable_grid_first_slot(self, slot_num):
         slot_num = int(slot_num)
         if not (1 <= slot_num <= len(GRID_FIRST_SLOTS)):
             log.warning("disable grid-first: invalid slot number %s", slot_num)
             return
-        enable_reg = GRID_FIRST_SLOTS[slot_num - 1][2]
-        r = self._read(enable_reg, 1)
-        if r and r[0] == 0:
-            log.info("Grid-first slot %d already disabled", slot_num)
-            return
-        log.info("Disabling grid-first slot %d (register %d = 0)", slot_num, enable_reg)
-        self._write(enable_reg, [0])
+        self._disable(GRID_FIRST_SLOTS[slot_num - 1][2], "grid-first slot %d" % slot_num)
 
     def clear_all_slots(self):
-        log.info("Clearing all battery first slots (1100-1108)")
-        self._write(1100, [0] * 9)
-        log.info("Clearing all battery first slots (1018-1026)")
-        self._write(1018, [0] * 9)
-        log.info("Clearing grid first slots 1-3 (1080-1088)")
-        self._write(1080, [0] * 9)
-        log.info("Clearing grid first slots 4-6 (1027-1035)")
-        self._write(1027, [0] * 9)
+        log.info("Clearing all battery first and grid first slots")
+        blocks = [slots[0][0] for slots in (BATT_FIRST_SLOTS[:3], BATT_FIRST_SLOTS[3:],
+                                            GRID_FIRST_SLOTS[:3], GRID_FIRST_SLOTS[3:])]
+        plan = self.plan(*[(address, 9) for address in blocks])
+        for address in blocks:
+            plan.want(address, [0] * 9)
+        plan.execute()
@@ -0,0 +1,215 @@
+"""Home Assistant MQTT discovery, built once per serial and published only on change.
+
+Each inverter's discovery configs (one per SENSOR_META field plus the read-health
+diagnostics) are serialised once, when its serial is first seen, and fingerprinted.
+The configs are retained, so after a restart the broker already holds them: before
+publishing, ``Discovery`` subscribes to that serial's config topics, lets the broker
+replay its retained copies, and then publishes only the topics whose fingerprint
+differs (a new sensor, a renamed device, a changed unit). Unchanged entities are not
+re-sent, so a restart no longer floods the broker or makes HA re-process every one.
+
+A config counts as held by the broker only once it has actually gone out: through
+the background Publisher that is its on_sent report, through paho the publish
+result. A config the Publisher dropped (its queue full) or paho refused (while
+disconnected) sends its serial back through the retained check on the next cycle,
+so it is re-sent rather than assumed delivered.
+
+What the broker holds is remembered for the rest of the run. ``refresh()`` forgets
+it, so the next cycle republishes every config in full (POST /discovery/refresh).
+Without a client to subscribe through, the first publish for a serial sends all of
+its configs, as before.
+"""
+
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from .publisher import Publisher
+from .registers import SENSOR_META
+
+log = logging.getLogger("growatt")
+
+# Read-health counters published to a separate per-device diagnostics topic (every cycle,
+# including failed ones). Lets us watch how often / when a dongle garbles or drops frames,
+# so we can decide whether to swap it back for the (very reliable) EW11.
+# key -> (HA name, state_class). Totals are monotonic counters; HA handles restarts.
+DIAGNOSTIC_SENSORS = {
+    "readErrorsTotal":  ("Garbled reads", "total_increasing"),
+    "pollSkippedTotal": ("Skipped polls", "total_increasing"),
+    "pollOkTotal":      ("Successful polls", "total_increasing"),
+    "lastCycleRetries": ("Last poll retries", "measurement"),
+    "pollOverrunsTotal": ("Poll overruns", "total_increasing"),
+    "statePublishSkippedTotal": ("Unchanged states skipped", "total_increasing"),
+    "connectionReuses": ("Connection reuses", "total_increasing"),
+    "connectionReconnects": ("Connection reconnects", "total_increasing"),
+}
+
+# Seconds to let the broker replay retained configs after subscribing.
+_SETTLE_SECONDS = 1.0
+
+
+def diagnostics_topic(mqtt_cfg, serial):
+    return f"{mqtt_cfg['topic_prefix']}/{serial}/diagnostics"
+
+
+def fingerprint(payload):
+    return hashlib.sha1(payload).hexdigest()
+
+
+def discovery_payloads(mqtt_cfg, serial, device_name):
+    """Every discovery config for one serial, as {topic: JSON payload bytes}."""
+    prefix = mqtt_cfg["discovery_prefix"]
+    state_topic = f"{mqtt_cfg['topic_prefix']}/{serial}/state"
+    device = {
+        "identifiers": [serial],
+        "manufacturer": "Growatt",
+        "name": f"Growatt {device_name or serial}",
+    }
+    payloads = {}
+    for key, (name, device_class, unit, state_class) in SENSOR_META.items():
+        config = {
+            "name": name,
+            "unique_id": f"{serial}_{key}",
+            "object_id": f"growatt_{serial}_{key}",
+            "state_topic": state_topic,
+            "value_template": f"{{{{ value_json.{key} }}}}",
+            "state_class": state_class,
+            "device": device,
+        }
+        if device_class:
+            config["device_class"] = device_class
+        if unit:
+            config["unit_of_measurement"] = unit
+        payloads[f"{prefix}/sensor/{serial}_{key}/config"] = json.dumps(config).encode()
+    # Read-health diagnostics: separate state topic, marked as diagnostic entities.
+    diag_topic = diagnostics_topic(mqtt_cfg, serial)
+    for key, (name, state_class) in DIAGNOSTIC_SENSORS.items():
+        config = {
+            "name": name,
+            "unique_id": f"{serial}_{key}",
+            "object_id": f"growatt_{serial}_{key}",
+            "state_topic": diag_topic,
+            "value_template": f"{{{{ value_json.{key} }}}}",
+            "state_class": state_class,
+            "entity_category": "diagnostic",
+            "device": device,
+        }
+        payloads[f"{prefix}/sensor/{serial}_{key}/config"] = json.dumps(config).encode()
+    return payloads
+
+
+class _Serial:
+    """One serial's precomputed configs and how far its publish has got."""
+
+    __slots__ = ("device_name", "payloads", "digests", "subscribed", "force", "done")
+
+    def __init__(self, mqtt_cfg, serial, device_name):
+        self.device_name = device_name
+        self.payloads = discovery_payloads(mqtt_cfg, serial, device_name)
+        self.digests = {topic: fingerprint(p) for topic, p in self.payloads.items()}
+        self.subscribed = None  # monotonic time of the retained-config subscription
+        self.force = False
+        self.done = False
+
+
+class Discovery:
+    """Publishes each serial's discovery configs where the broker's copy differs.
+
+    source is the paho client to subscribe through (None: no retained check); the
+    configs themselves go out through whatever client publish() is handed, e.g. the
+    background Publisher.
+    """
+
+    def __init__(self, mqtt_cfg, source=None):
+        self.mqtt_cfg = mqtt_cfg
+        self.source = source
+        self.stats = {"published": 0, "unchanged": 0}
+        self._serials = {}
+        self._retained = {}  # topic -> fingerprint of the config the broker holds
+        # Re-entrant: a client may deliver retained messages from inside subscribe().
+        self._lock = threading.RLock()
+        if source is not None:
+            source.message_callback_add(f"{mqtt_cfg['discovery_prefix']}/sensor/+/config",
+                                        self._on_retained)
+
+    def _on_retained(self, _client, _userdata, message):
+        if message.retain:
+            with self._lock:
+                self._retained[message.topic] = (fingerprint(message.payload)
+                                                 if message.payload else None)
+
+    def publish(self, client, serial, device_name=None):
+        """Bring serial's configs up to date on the broker; returns how many were sent.
+
+        Cheap once done: a dict lookup per cycle. The first call for a serial only
+        subscribes to its topics; a call at least _SETTLE_SECONDS later publishes.
+        """
+        with self._lock:
+            entry = self._serials.get(serial)
+            if entry is None or entry.device_name != device_name:
+                entry = self._serials[serial] = _Serial(self.mqtt_cfg, serial, device_name)
+            if entry.done:
+                return 0
+            if self.source is not None and not entry.force:
+                if entry.subscribed is None and self._subscribe(list(entry.payloads)):
+                    entry.subscribed = time.monotonic()
+                    return 0
+                if (entry.subscribed is not None
+                        and time.monotonic() - entry.subscribed < _SETTLE_SECONDS):
+                    return 0
+            changed = [topic for topic, digest in entry.digests.items()
+                       if self._retained.get(topic) != digest]
+            subscribed, entry.subscribed = entry.subscribed, None
+            entry.force = False
+            entry.done = True
+            self.stats["published"] += len(changed)
+            self.stats["unchanged"] += len(entry.payloads) - len(changed)
+        if subscribed is not None:
+            self.source.unsubscribe(list(entry.payloads))
+        for topic in changed:
+            self._send(client, serial, entry, topic)
+        log.info("Published HA discovery for %s: %d of %d configs changed",
+                 serial, len(changed), len(entry.payloads))
+        return len(changed)
+
+    def _send(self, client, serial, entry, topic):
+        def sent(ok):
+            with self._lock:
+                if ok:
+                    self._retained[topic] = entry.digests[topic]
+                elif self._serials.get(serial) is entry:
+                    # Not delivered: check and publish this serial again next cycle.
+                    entry.done = False
+            if not ok:
+                log.warning("HA discovery config %s was not sent; retrying", topic)
+
+        payload = entry.payloads[topic]
+        if isinstance(client, Publisher):
+            client.publish(topic, payload, retain=True, on_sent=sent)
+            return
+        try:
+            info = client.publish(topic, payload, retain=True)
+        except Exception as e:
+            log.warning("MQTT publish to %s failed: %s", topic, e)
+            sent(False)
+            return
+        sent(getattr(info, "rc", 0) == 0)
+
+    def _subscribe(self, topics):
+        try:
+            rc, _mid = self.source.subscribe([(topic, 0) for topic in topics])
+        except Exception as e:
+            log.warning("Could not subscribe to retained discovery configs: %s", e)
+            return False
+        return rc == 0
+
+    def refresh(self):
+        """Forget what the broker holds: the next cycle republishes every config."""
+        with self._lock:
+            self._retained.clear()
+            for entry in self._serials.values():
+                entry.done = False
+                entry.force = True
+            return sorted(self._serials)
@@ -0,0 +1,119 @@
+"""Recent telemetry history per device, in fixed-size typed-array ring buffers.
+
+After each successful cycle the device's numeric fields are appended to a ring
+buffer holding the last ``history.hours`` at the device's poll interval. Storage is
+one ``array`` column per field allocated up front, so memory is fixed from the first
+cycle - about 5 MB for 24 h of 10 s polls - and an append is one store per column,
+with no per-sample dicts. Single-register fields are float32, which holds every u16
+exactly (and its scaled value to well within its printed digits); two-register
+fields, the energy counters among them, are float64 so values above 2^24 keep every
+digit. The raw 32-bit fault/warning bitmasks are not kept: a mean of one is
+meaningless, and float storage would round away its high bits. History is off unless
+``history.enabled`` is set. GET /history (growatt.http_api) serves slices of it, optionally
+downsampled to per-bucket means, so dashboards and the Agile scheduler can read
+recent trends without a separate TSDB.
+"""
+
+import threading
+from array import array
+
+from .registers import HOLDING_FIELDS, INPUT_FIELDS
+
+def _kept(field):
+    # bits16 fields decode to strings; an unscaled u32 is a raw bitmask (FaultBitCode).
+    return field.kind != "bits16" and not (field.kind == "u32" and field.scale is None
+                                           and field.divide is None)
+
+
+# Every decoded numeric field kept in history, and its array typecode.
+NUMERIC_FIELDS = tuple(field.name for field in HOLDING_FIELDS + INPUT_FIELDS
+                       if _kept(field))
+TYPECODES = {field.name: "d" if field.kind == "u32" else "f"
+             for field in HOLDING_FIELDS + INPUT_FIELDS if _kept(field)}
+
+
+class History:
+    """A ring buffer of (timestamp, numeric fields) samples for one device."""
+
+    def __init__(self, capacity, fields=NUMERIC_FIELDS):
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self.times = array("d", bytes(8 * capacity))
+        self.columns = {}
+        for name in self.fields:
+            column = array(TYPECODES.get(name, "d"))
+            column.frombytes(bytes(column.itemsize * capacity))
+            self.columns[name] = column
+        self.next = 0
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, state):
+        """Add one cycle's state (missing or non-numeric fields are stored as NaN)."""
+        with self._lock:
+            i = self.next
+            self.times[i] = timestamp
+            for name, column in self.columns.items():
+                value = state.get(name)
+                column[i] = value if isinstance(value, (int, float)) else float("nan")
+            self.next = (i + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def _indexes(self):
+        # Oldest to newest.
+        start = (self.next - self.size) % self.capacity
+        return [(start + k) % self.capacity for k in range(self.size)]
+
+    def query(self, fields=None, since=None, step=None):
+        """Samples newer than since (unix time), as {"t": [...], field: [...]}.
+
+        With step (seconds), samples are grouped into step-aligned buckets and each
+        bucket reports its mean, timestamped at the bucket start.
+        """
+        fields = [name for name in (fields or self.fields) if name in self.columns]
+        with self._lock:
+            rows = [i for i in self._indexes() if since is None or self.times[i] > since]
+            times = [self.times[i] for i in rows]
+            values = {name: [self.columns[name][i] for i in rows] for name in fields}
+        if step:
+            times, values = _downsample(times, values, step)
+        result = {"t": [round(t, 3) for t in times]}
+        for name, column in values.items():
+            result[name] = [None if v != v else round(v, 3) for v in column]
+        return result
+
+    def memory_bytes(self):
+        """Bytes held by the arrays (fixed once allocated)."""
+        return self.times.itemsize * self.capacity + sum(
+            column.itemsize * self.capacity for column in self.columns.values())
+
+
+def _downsample(times, values, step):
+    """Mean per step-aligned bucket, skipping NaNs (a bucket of only NaN stays NaN)."""
+    buckets = []
+    for k, t in enumerate(times):
+        bucket = t - t % step
+        if not buckets or buckets[-1][0] != bucket:
+            buckets.append((bucket, []))
+        buckets[-1][1].append(k)
+    out = {}
+    for name, column in values.items():
+        means = []
+        for _bucket, rows in buckets:
+            good = [column[k] for k in rows if column[k] == column[k]]
+            means.append(sum(good) / len(good) if good else float("nan"))
+        out[name] = means
+    return [bucket for bucket, _rows in buckets], out
+
+
+def device_history(st, config, dev):
+    """The device's History sized from the `history` config, or None if disabled."""
+    cfg = config.get("history") or {}
+    if not cfg.get("enabled", False):
+        return None
+    history = st.get("history")
+    if history is None:
+        interval = float(dev.get("poll_interval") or config["poll_interval"])
+        capacity = max(1, int(cfg.get("hours", 24) * 3600 / interval))
+        history = st["history"] = History(capacity)
+    return history
@@ -1,32 +1,111 @@
 """In-process HTTP endpoint for inverter control and health.
 
 Replaces the old standalone lighttpd + CGI control container: the poller now runs
-this small stdlib server in a daemon thread, so a single process owns the dongle and
-one lock (see growatt._modbus_lock) serialises every Modbus session.
+this small stdlib server in a daemon thread, so a single process owns the dongles and
+a per-bridge lock (see growatt._modbus_lock) serialises every Modbus session. Under
+the asyncio engine (engine: async) the same routes are served from the event loop by
+start_async_http_server instead.
 
 Endpoints (port from config["http"]["port"], default 8085):
 
   GET  /health  -> 200 {"status":"ok",...} | 503 {"status":"stale",...}
                    In-memory only: reflects how long since the control inverter was
                    last read successfully by the poll loop. Never touches Modbus.
-  GET  /slots   -> 200 {"status":"success","slots":{...}}   (reads under the lock)
-  POST /mode    -> {"action": "...", "duration": N, "slot_num": N}
+  GET  /slots[?fresh=1]
+                -> 200 {"status":"success","slots":{...},"source":...,"age_seconds":N}
+                   From the slot registers in the control inverter's last poll cycle
+                   (source "snapshot"); read live under the lock (source "live") with
+                   fresh=1, or when there is no snapshot newer than the last control
+                   write and within health.stale_after_seconds.
+  GET  /state[?device=&fields=]
+                -> 200 {"status":"success","device":...,"serial":...,"seq":N,
+                        "timestamp":...,"state":{...}} | 304 (If-None-Match)
+                   The device's merged state from its last successful cycle; never
+                   touches Modbus. device: name, host or serial (default: the control
+                   inverter); fields: comma-separated (default all). The ETag follows
+                   the cycle sequence number, and each cycle's body is encoded once.
+  GET  /stream[?device=&fields=&changes=1]
+                -> 200 text/event-stream: an "event: state" frame (the GET /state JSON)
+                   per device per successful cycle, starting with each device's current
+                   state. device: name, host or serial (default: every device); fields:
+                   comma-separated (default all); changes=1: after the first frame only
+                   "event: changes" with the fields that changed. Slow clients lose
+                   their oldest events (http.stream_buffer; see growatt.stream).
+  GET  /metrics -> Prometheus text format: Modbus request, poll cycle, bridge lock,
+                   MQTT publish and HTTP latency histograms plus per-device counters.
+                   Recording starts with the first scrape (see growatt.metrics).
+  GET  /history?device=&fields=&since=&step=
+                -> 200 {"status":"success","device":...,"history":{"t":[...],field:[...]}}
+                   Recent numeric fields from the in-memory ring buffer (growatt.history).
+                   device: name, host or serial (default: the control inverter); fields:
+                   comma-separated (default all); since: unix time; step: downsample to
+                   per-bucket means of this many seconds.
+  GET  /jobs[/<id>]
+                -> 200 {"status":"success","job":{"id":...,"status":...,"result":...}}
+                   A control job (see below); without an id, the recent ones.
+  POST /mode[?wait=N]
+                -> {"action": "...", "duration": N, "slot_num": N}
                    Action strings are unchanged from the old CGI so Home Assistant
                    payloads only needed their URL repointed.
+                   The response's "plan" lists the register reads and the writes the
+                   action took (only registers that differed are written; see
+                   growatt.control.WritePlan).
+  POST /discovery/refresh
+                -> 200 {"status":"success","serials":[...]}
+                   Forget which Home Assistant discovery configs the broker holds, so
+                   each device's next cycle republishes all of them (growatt.discovery).
+  PUT  /schedule[?wait=N]
+                -> {"battery_first": [{"start": "HH:MM", "end": "HH:MM"}, ...],
+                     "grid_first": [...], "rate_percent": N, "stop_soc": N}
+                   The complete slot table (unlisted slots are cleared; see
+                   growatt.control.schedule_registers) applied in one session:
+                   one read, then only the contiguous runs that differ are written.
+
+Control writes are queued as jobs (growatt.jobs) and run ahead of pending polls.
+The request waits up to wait (default control.sync_wait_seconds) seconds and answers
+as before, plus the "job" id; a job still pending by then answers 202 with its id
+and a Location to poll. The POST /mode actions are also accepted on an MQTT command
+topic (growatt.commands), through the same queue.
 """
 
 import json
 import time
+import types
+import asyncio
 import logging
+from http import HTTPStatus
+from urllib.parse import parse_qs
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from .config import control_target
-from .control import with_control_session
+from .control import (decode_slots, export_rate_percent, schedule_registers,
+                      with_control_session)
+from . import metrics, stream
+from .jobs import DONE, FAILED, SUPERSEDED, make_job_queue
+from .monitor import STATE_KEYS, block_registers, invalidate_tier
 
 log = logging.getLogger("growatt")
 
-# POST /mode actions, mapped to the InverterControl call. set_time() is run before
-# each (matching the old CGI) inside the locked session.
+# Seconds the asyncio front end waits on a slow client for each request line/header.
+_ASYNC_READ_TIMEOUT = 30
+
+# Paths the HTTP latency histogram labels by name; anything else is counted as "other".
+_ROUTES = {"/health", "/slots", "/state", "/metrics", "/history", "/jobs", "/mode",
+           "/schedule", "/discovery/refresh"}
+
+# GET /stream response headers; X-Accel-Buffering stops nginx holding back events.
+_STREAM_HEADERS = [("Content-Type", "text/event-stream"), ("Cache-Control", "no-cache"),
+                   ("X-Accel-Buffering", "no")]
+
+# Mode switches replace one another: a newer one supersedes an older still queued.
+_MODE_SWITCHES = {
+    "switch_inverter_to_batt_first_mode",
+    "switch_inverter_to_grid_first_mode",
+    "switch_inverter_to_load_first_mode",
+}
+
+# POST /mode actions, mapped to the InverterControl call. The clock is checked before
+# each (the old CGI set it unconditionally) inside the locked session.
 _WRITE_ACTIONS = {
     "switch_inverter_to_batt_first_mode",
     "switch_inverter_to_grid_first_mode",
@@ -38,8 +117,17 @@ _WRITE_ACTIONS = {
 
 
 def _apply_mode(inv, body, config=None):
-    """Run a control write on an open InverterControl. Returns the response dict."""
-    inv.set_time()  # keep the clock aligned to UTC before scheduling
+    """Run a control write on an open InverterControl. Returns the response dict,
+    with the register reads and writes it took under "plan"."""
+    result = _run_action(inv, body, config)
+    if isinstance(result, dict):
+        result["plan"] = inv.plan_report()
+    return result
+
+
+def _run_action(inv, body, config):
+    # Keep the clock aligned to UTC before scheduling; rewritten only if it has drifted.
+    inv.sync_time(((config or {}).get("control") or {}).get("max_clock_drift_seconds", 5))
     action = body.get("action")
     if action == "switch_inverter_to_batt_first_mode":
         duration = body.get("duration", 30)
@@ -80,6 +168,365 @@ def _apply_mode(inv, body, config=None):
     return {"status": "unknown action"}  # unreachable; validated before the session
 
 
+def _json(code, obj):
+    """A JSON response as (status, headers, body bytes)."""
+    return code, [("Content-Type", "application/json")], json.dumps(obj).encode()
+
+
+def _health(ctx):
+    config = ctx.gw_config
+    stats = ctx.gw_stats
+    try:
+        host = control_target(config)[0]
+    except Exception:
+        host = None
+    st = stats.get(host) if host else None
+    last = st.get("lastGoodReadMonotonic") if st else None
+    threshold = (config.get("health") or {}).get("stale_after_seconds", 600)
+    if last is None:
+        return _json(503, {"status": "stale", "age_seconds": None})
+    age = round(time.monotonic() - last)
+    payload = {"serial": st.get("serial"), "age_seconds": age}
+    if age <= threshold:
+        return _json(200, {"status": "ok", **payload})
+    return _json(503, {"status": "stale", **payload})
+
+
+def _invalidate_static(ctx):
+    # A control write may change configuration the poller only re-reads on its slow
+    # static tier; have the control inverter's next cycle read it again. Until that
+    # cycle the slots in its last snapshot may be out of date, too.
+    st = ctx.gw_stats.get(control_target(ctx.gw_config)[0])
+    if st is not None:
+        invalidate_tier(st, "static")
+        st["lastControlWriteMonotonic"] = time.monotonic()
+
+
+def _snapshot_slots(ctx):
+    """(slots, age in seconds) from the control inverter's last poll cycle, or None if
+    there is no usable snapshot (none yet, stale, or older than the last control write)."""
+    st = ctx.gw_stats.get(control_target(ctx.gw_config)[0])
+    snapshot = st.get("lastBlocks") if st else None
+    if snapshot is None:
+        return None
+    read_at = st["lastGoodReadMonotonic"]
+    age = time.monotonic() - read_at
+    threshold = (ctx.gw_config.get("health") or {}).get("stale_after_seconds", 600)
+    if age > threshold or read_at < st.get("lastControlWriteMonotonic", 0):
+        return None
+    plan, blocks = snapshot
+    slots = decode_slots(lambda address, count: block_registers(plan, blocks, "holding",
+                                                                address, count))
+    return (slots, age) if slots else None
+
+
+def _slots(ctx, query):
+    if (query.get("fresh") or ["0"])[0] not in ("1", "true"):
+        snapshot = _snapshot_slots(ctx)
+        if snapshot is not None:
+            slots, age = snapshot
+            return _json(200, {"status": "success", "slots": slots, "source": "snapshot",
+                               "age_seconds": round(age, 1)})
+    try:
+        slots = ctx.gw_control(lambda inv: inv.get_all_slots())
+        return _json(200, {"status": "success", "slots": slots, "source": "live",
+                           "age_seconds": 0})
+    except Exception as e:
+        log.warning("GET /slots failed: %s", e)
+        return _json(500, {"status": "error", "message": str(e)})
+
+
+def _device_stats(ctx, device):
+    """(host, stats) for a device given by name, host or serial; default the control one."""
+    if not device:
+        host = control_target(ctx.gw_config)[0]
+        return host, ctx.gw_stats.get(host)
+    for dev in ctx.gw_config.get("devices") or []:
+        if device in (dev.get("name"), dev.get("host")):
+            return dev["host"], ctx.gw_stats.get(dev["host"])
+    for host, st in list(ctx.gw_stats.items()):
+        if st.get("serial") == device:
+            return host, st
+    return None, None
+
+
+def _history(ctx, query):
+    try:
+        since = float(query["since"][0]) if "since" in query else None
+        step = float(query["step"][0]) if "step" in query else None
+    except ValueError:
+        return _json(400, {"status": "error", "message": "since/step must be numbers"})
+    if step is not None and step <= 0:
+        return _json(400, {"status": "error", "message": "step must be positive"})
+    host, st = _device_stats(ctx, (query.get("device") or [None])[0])
+    history = st.get("history") if st else None
+    if history is None:
+        return _json(404, {"status": "error", "message": "no history for that device"})
+    fields = None
+    if "fields" in query:
+        fields = [name for part in query["fields"] for name in part.split(",") if name]
+        unknown = [name for name in fields if name not in history.columns]
+        if unknown:
+            return _json(400, {"status": "error",
+                               "message": "unknown fields: %s" % ",".join(unknown)})
+    return _json(200, {"status": "success", "device": host, "serial": st.get("serial"),
+                       "history": history.query(fields, since, step)})
+
+
+def _state(ctx, query, headers):
+    host, st = _device_stats(ctx, (query.get("device") or [None])[0])
+    snapshot = st.get("snapshot") if st else None
+    if snapshot is None:
+        return _json(404, {"status": "error", "message": "no state for that device yet"})
+    fields = None
+    if "fields" in query:
+        fields = [name for part in query["fields"] for name in part.split(",") if name]
+        unknown = [name for name in fields if name not in snapshot.state]
+        if unknown:
+            return _json(400, {"status": "error",
+                               "message": "unknown fields: %s" % ",".join(unknown)})
+    etag = snapshot.etag(fields)
+    cache = [("ETag", etag), ("Cache-Control", "no-cache")]
+    match = headers.get("if-none-match") if headers is not None else None
+    if match and (match.strip() == "*" or etag in
+                  [tag.strip().removeprefix("W/") for tag in match.split(",")]):
+        return 304, cache, b""
+    return 200, [("Content-Type", "application/json")] + cache, snapshot.body(host, fields)
+
+
+def _open_stream(ctx, query, wake=None):
+    """Subscribe a GET /stream client, buffered with its devices' current state.
+
+    Returns (StreamClient, None), or (None, error response); the caller writes the
+    frames and unsubscribes it from stream.HUB when the connection ends.
+    """
+    devices = None
+    if query.get("device"):
+        host, _st = _device_stats(ctx, query["device"][0])
+        if host is None:
+            return None, _json(404, {"status": "error", "message": "no such device"})
+        devices = {host}
+    fields = None
+    if "fields" in query:
+        fields = [name for part in query["fields"] for name in part.split(",") if name]
+        unknown = [name for name in fields if name not in STATE_KEYS]
+        if unknown:
+            return None, _json(400, {"status": "error",
+                                     "message": "unknown fields: %s" % ",".join(unknown)})
+    http_cfg = ctx.gw_config.get("http") or {}
+    client = stream.HUB.subscribe(
+        max_clients=http_cfg.get("stream_max_clients", 16), devices=devices, fields=fields,
+        changes=(query.get("changes") or ["0"])[0] in ("1", "true"),
+        buffer=http_cfg.get("stream_buffer", 32), wake=wake)
+    if client is None:
+        return None, _json(503, {"status": "error", "message": "too many stream clients"})
+    for host, st in sorted(ctx.gw_stats.items()):
+        if st.get("snapshot") is not None:
+            client.push(host, st["snapshot"])
+    return client, None
+
+
+def _stream_target(method, target):
+    """The parsed query if this is a GET /stream request, else None."""
+    path, _, query = target.partition("?")
+    if method == "GET" and (path.rstrip("/") or "/") == "/stream":
+        return parse_qs(query)
+    return None
+
+
+def _keepalive_seconds(ctx):
+    return float((ctx.gw_config.get("http") or {}).get("stream_keepalive_seconds", 15))
+
+
+def _get(ctx, path, query, headers=None):
+    if path == "/health":
+        return _health(ctx)
+    if path == "/state":
+        return _state(ctx, query, headers)
+    if path == "/history":
+        return _history(ctx, query)
+    if path == "/metrics":
+        body = metrics.render(ctx.gw_stats).encode()
+        return 200, [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")], body
+    if path == "/slots":
+        return _slots(ctx, query)
+    if path == "/jobs" or path.startswith("/jobs/"):
+        return _jobs(ctx, path[len("/jobs/"):])
+    return _json(404, {"status": "error", "message": "not found: %s" % path})
+
+
+def _jobs(ctx, job_id):
+    if not job_id:
+        return _json(200, {"status": "success", "stats": ctx.gw_jobs.stats,
+                           "jobs": [job.describe() for job in ctx.gw_jobs.recent()]})
+    job = ctx.gw_jobs.get(job_id)
+    if job is None:
+        return _json(404, {"status": "error", "message": "no such job: %s" % job_id})
+    return _json(200, {"status": "success", "job": job.describe()})
+
+
+def _wait_seconds(ctx, query):
+    """How long a control request waits for its job (?wait=, else the config default);
+    None if the parameter is not a number."""
+    default = (ctx.gw_config.get("control") or {}).get("sync_wait_seconds", 30)
+    try:
+        return max(0.0, float((query.get("wait") or [default])[0]))
+    except ValueError:
+        return None
+
+
+def _submit_control(ctx, kind, key, body, fn, callback=None):
+    """Queue fn(inv) as a control job; returns the Job."""
+
+    def run():
+        try:
+            return ctx.gw_control(fn)
+        finally:
+            # Even a failed action may have written some registers.
+            _invalidate_static(ctx)
+
+    return ctx.gw_jobs.submit(kind, key, body, run, callback)
+
+
+def job_outcome(job):
+    """(HTTP status, payload) for a control job: its result once it has finished,
+    else 202 and where to poll for it. Shared with the MQTT command topics."""
+    if job.status == DONE:
+        code = 200 if job.result.get("status") == "success" else 502
+        return code, {**job.result, "job": job.id}
+    if job.status == FAILED:
+        return 500, {"status": "error", "message": job.error, "job": job.id}
+    if job.status == SUPERSEDED:
+        return 409, {"status": "superseded", "job": job.id,
+                     "superseded_by": job.superseded_by}
+    return 202, {"status": "accepted", "job": job.id, "state": job.status,
+                 "location": "/jobs/" + job.id}
+
+
+def _job_response(ctx, job, wait):
+    """Wait up to wait seconds for a job, then answer with its outcome."""
+    if wait:
+        job = ctx.gw_jobs.wait(job, wait)
+    code, payload = job_outcome(job)
+    code, headers, body = _json(code, payload)
+    if code == 202:
+        headers = headers + [("Location", payload["location"])]
+    return code, headers, body
+
+
+def submit_mode(ctx, body, callback=None):
+    """Queue a POST /mode action body as a control job; returns the Job.
+
+    Raises ValueError for an unknown action. A mode switch supersedes a queued one,
+    as does clear_all_slots a queued schedule; slot edits coalesce per slot.
+    """
+    action = body.get("action")
+    if action not in _WRITE_ACTIONS:
+        raise ValueError("unknown action: %s" % action)
+    if action in _MODE_SWITCHES:
+        key = "mode"
+    elif action == "clear_all_slots":
+        key = "slots"
+    else:
+        key = "%s:%s" % (action, body.get("slot_num"))
+    return _submit_control(ctx, "mode", key, body,
+                           lambda inv: _apply_mode(inv, body, ctx.gw_config), callback)
+
+
+def _refresh_discovery(ctx):
+    if ctx.gw_discovery is None or not (ctx.gw_config.get("mqtt") or {}).get("discovery"):
+        return _json(404, {"status": "error", "message": "discovery is not enabled"})
+    serials = ctx.gw_discovery.refresh()
+    log.info("HA discovery refresh requested; republishing for %s", serials or "none yet")
+    return _json(200, {"status": "success", "serials": serials})
+
+
+def _post(ctx, path, query, raw):
+    if path == "/discovery/refresh":
+        return _refresh_discovery(ctx)
+    if path != "/mode":
+        return _json(404, {"status": "error", "message": "not found: %s" % path})
+    try:
+        body = json.loads(raw or b"{}")
+    except (ValueError, TypeError):
+        return _json(400, {"status": "error", "message": "invalid JSON body"})
+    if not isinstance(body, dict):
+        return _json(400, {"status": "error", "message": "body must be a JSON object"})
+    wait = _wait_seconds(ctx, query)
+    if wait is None:
+        return _json(400, {"status": "error", "message": "wait must be a number"})
+    try:
+        job = submit_mode(ctx, body)
+    except ValueError as e:
+        return _json(400, {"status": "error", "message": str(e)})
+    return _job_response(ctx, job, wait)
+
+
+def _put(ctx, path, query, raw):
+    if path != "/schedule":
+        return _json(404, {"status": "error", "message": "not found: %s" % path})
+    try:
+        body = json.loads(raw or b"{}")
+        control = ctx.gw_config.get("control") or {}
+        registers = schedule_registers(
+            body.get("battery_first") or [],
+            body.get("grid_first") or [],
+            export_rate_percent(body.get("export_watts"), body.get("rate_percent"),
+                                control.get("rated_power_w")),
+            body.get("stop_soc"),
+        )
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        return _json(400, {"status": "error", "message": "invalid schedule: %s" % e})
+    wait = _wait_seconds(ctx, query)
+    if wait is None:
+        return _json(400, {"status": "error", "message": "wait must be a number"})
+
+    values = {address + i: value for address, block in registers.items()
+              for i, value in enumerate(block)}
+
+    def apply(inv):
+        inv.sync_time(control.get("max_clock_drift_seconds", 5))
+        ok = inv.apply_schedule(registers)
+        return {"status": "success" if ok else "error",
+                "slots": decode_slots(lambda address, count: [
+                    values[a] for a in range(address, address + count)]),
+                "plan": inv.plan_report()}
+
+    # Any schedule (or clear_all_slots) rewrites the whole table: the newest one wins.
+    return _job_response(ctx, _submit_control(ctx, "schedule", "slots", body, apply), wait)
+
+
+def _route_label(path):
+    if path.startswith("/jobs/"):
+        return "/jobs"
+    return path if path in _ROUTES else "other"
+
+
+def handle_request(ctx, method, target, headers, raw):
+    """Route one request; shared by the threaded and the asyncio front ends.
+
+    ctx carries the live poller state as gw_* attributes (see attach_state), headers
+    is any case-insensitive mapping. Returns (status, [(header, value)], body bytes).
+    """
+    started = time.monotonic()
+    path, _, query = target.partition("?")
+    path = path.rstrip("/") or "/"
+    query = parse_qs(query)
+    if method == "GET":
+        response = _get(ctx, path, query, headers)
+    elif method == "POST":
+        response = _post(ctx, path, query, raw)
+    elif method == "PUT":
+        response = _put(ctx, path, query, raw)
+    else:
+        response = _json(501, {"status": "error", "message": "unsupported method: %s" % method})
+    if metrics.ENABLED:
+        metrics.HTTP_REQUEST.observe(time.monotonic() - started,
+                                     method if method in ("GET", "POST", "PUT") else "other",
+                                     _route_label(path))
+    return response
+
+
 class _Handler(BaseHTTPRequestHandler):
     server_version = "growatt/1.0"
 
@@ -87,77 +534,158 @@ class _Handler(BaseHTTPRequestHandler):
     def log_message(self, fmt, *args):
         log.debug("http %s - %s", self.address_string(), fmt % args)
 
-    def _send(self, code, obj):
-        body = json.dumps(obj).encode()
+    def _handle(self, method):
+        query = _stream_target(method, self.path)
+        if query is not None:
+            self._stream(query)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        code, headers, body = handle_request(self.server, method, self.path, self.headers, raw)
         self.send_response(code)
-        self.send_header("Content-Type", "application/json")
+        for name, value in headers:
+            self.send_header(name, value)
         self.send_header("Content-Length", str(len(body)))
         self.end_headers()
         self.wfile.write(body)
 
-    def _health(self):
-        config = self.server.gw_config
-        stats = self.server.gw_stats
+    def _stream(self, query):
+        # Runs for the life of the connection in this request's own thread.
+        client, error = _open_stream(self.server, query)
+        if error is not None:
+            code, headers, body = error
+            self.send_response(code)
+            for name, value in headers + [("Content-Length", str(len(body)))]:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.close_connection = True
+        keepalive = _keepalive_seconds(self.server)
         try:
-            host = control_target(config)[0]
-        except Exception:
-            host = None
-        st = stats.get(host) if host else None
-        last = st.get("lastGoodReadMonotonic") if st else None
-        threshold = (config.get("health") or {}).get("stale_after_seconds", 600)
-        if last is None:
-            return self._send(503, {"status": "stale", "age_seconds": None})
-        age = round(time.monotonic() - last)
-        payload = {"serial": st.get("serial"), "age_seconds": age}
-        if age <= threshold:
-            return self._send(200, {"status": "ok", **payload})
-        return self._send(503, {"status": "stale", **payload})
+            self.send_response(200)
+            for name, value in _STREAM_HEADERS:
+                self.send_header(name, value)
+            self.end_headers()
+            while True:
+                self.wfile.write(client.take(keepalive) or stream.KEEPALIVE)
+        except OSError as e:
+            log.debug("http: stream client %s went away: %s", self.address_string(), e)
+        finally:
+            stream.HUB.unsubscribe(client)
 
     def do_GET(self):
-        path = self.path.split("?", 1)[0].rstrip("/") or "/"
-        if path == "/health":
-            return self._health()
-        if path == "/slots":
-            try:
-                slots = with_control_session(self.server.gw_config,
-                                             lambda inv: inv.get_all_slots())
-                return self._send(200, {"status": "success", "slots": slots})
-            except Exception as e:
-                log.warning("GET /slots failed: %s", e)
-                return self._send(500, {"status": "error", "message": str(e)})
-        return self._send(404, {"status": "error", "message": "not found: %s" % path})
+        self._handle("GET")
 
     def do_POST(self):
-        path = self.path.split("?", 1)[0].rstrip("/") or "/"
-        if path != "/mode":
-            return self._send(404, {"status": "error", "message": "not found: %s" % path})
-        length = int(self.headers.get("Content-Length") or 0)
-        raw = self.rfile.read(length) if length else b""
-        try:
-            body = json.loads(raw or b"{}")
-        except (ValueError, TypeError):
-            return self._send(400, {"status": "error", "message": "invalid JSON body"})
-        action = body.get("action")
-        if action not in _WRITE_ACTIONS:
-            return self._send(400, {"status": "error",
-                                    "message": "unknown action: %s" % action})
-        try:
-            result = with_control_session(self.server.gw_config,
-                                          lambda inv: _apply_mode(inv, body, self.server.gw_config))
-            return self._send(200, result)
-        except Exception as e:
-            log.warning("POST /mode (%s) failed: %s", action, e)
-            return self._send(500, {"status": "error", "message": str(e)})
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
 
+def attach_state(ctx, config, mqtt_client, stats, control, discovery=None, jobs=None):
+    """Hand the routes what they need as gw_* attributes of ctx: read-only access to
+    live poller state, plus the control-session runner for whichever engine owns the
+    Modbus connections and the queue its control jobs go through (pass jobs to share
+    one queue with the MQTT command topics). Returns ctx."""
+    ctx.gw_config = config
+    ctx.gw_mqtt = mqtt_client
+    ctx.gw_stats = stats
+    ctx.gw_control = control
+    ctx.gw_jobs = jobs if jobs is not None else make_job_queue(config)
+    ctx.gw_discovery = discovery
+    return ctx
 
-def make_http_server(config, mqtt_client, stats):
+
+def make_http_server(config, mqtt_client, stats, pool=None, discovery=None, jobs=None):
     """Build the control/health HTTP server. Caller runs serve_forever() in a thread."""
     port = (config.get("http") or {}).get("port", 8085)
     server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
-    # Hand the handler what it needs (read-only access to live poller state).
-    server.gw_config = config
-    server.gw_mqtt = mqtt_client
-    server.gw_stats = stats
+    attach_state(server, config, mqtt_client, stats,
+                 lambda fn: with_control_session(config, fn, pool=pool), discovery, jobs)
     server.daemon_threads = True
     log.info("Control/health HTTP server listening on :%d", port)
     return server
+
+
+def _response_head(code, headers):
+    head = ["HTTP/1.1 %d %s" % (code, HTTPStatus(code).phrase)]
+    head += ["%s: %s" % (name, value) for name, value in headers]
+    head += ["Connection: close", "", ""]
+    return "\r\n".join(head).encode("latin-1")
+
+
+async def _serve_stream(ctx, query, writer):
+    """GET /stream on the asyncio front end: the poll side wakes this task through the
+    loop, and only this task waits on the client's socket."""
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    client, error = _open_stream(ctx, query, wake=lambda: loop.call_soon_threadsafe(ready.set))
+    if error is not None:
+        code, extra, body = error
+        writer.write(_response_head(code, extra + [("Content-Length", len(body))]) + body)
+        await writer.drain()
+        return
+    keepalive = _keepalive_seconds(ctx)
+    try:
+        writer.write(_response_head(200, _STREAM_HEADERS))
+        while True:
+            ready.clear()
+            data = client.take()
+            if not data:
+                try:
+                    await asyncio.wait_for(ready.wait(), keepalive)
+                    continue
+                except asyncio.TimeoutError:
+                    data = stream.KEEPALIVE
+            writer.write(data)
+            await writer.drain()
+    finally:
+        stream.HUB.unsubscribe(client)
+
+
+async def start_async_http_server(config, mqtt_client, stats, control, discovery=None,
+                                  jobs=None):
+    """Serve the same endpoints from the asyncio engine's event loop.
+
+    A minimal HTTP/1.1 front end (one request per connection). Routing runs in the
+    default executor because control sessions block until the engine has run them on
+    the bus; control(fn) must therefore be callable from a worker thread.
+    Returns the asyncio.Server; close() it on shutdown.
+    """
+    ctx = attach_state(types.SimpleNamespace(), config, mqtt_client, stats, control,
+                       discovery, jobs)
+
+    async def serve(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), _ASYNC_READ_TIMEOUT)
+            method, target, _version = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), _ASYNC_READ_TIMEOUT)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            query = _stream_target(method, target)
+            if query is not None:
+                await _serve_stream(ctx, query, writer)
+                return
+            length = int(headers.get("content-length") or 0)
+            raw = await reader.readexactly(length) if length else b""
+            code, extra, body = await asyncio.to_thread(handle_request, ctx, method, target,
+                                                        headers, raw)
+            writer.write(_response_head(code, extra + [("Content-Length", len(body))])
+                         + body)
+            await writer.drain()
+        except (ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                ConnectionError) as e:
+            log.debug("http: dropped malformed/aborted request: %s", e)
+        finally:
+            writer.close()
+
+    port = (config.get("http") or {}).get("port", 8085)
+    server = await asyncio.start_server(serve, "0.0.0.0", port)
+    log.info("Control/health HTTP server (asyncio) listening on :%d", port)
+    return server
@@ -0,0 +1,209 @@
+"""Asynchronous queue of control jobs for the HTTP API.
+
+A control request (POST /mode, PUT /schedule) used to run inside the HTTP handler,
+holding the client for as long as the bridge took to come free and the writes took
+to land. Now the handler submits a ``Job`` and one worker thread runs the jobs in
+order through the engine's control-session runner, whose bridge lock is taken at
+CONTROL priority (see growatt._modbus_lock), so a job goes ahead of any poll cycles
+queued for the bridge. The caller can wait for the result or come back for it.
+
+Jobs carry a coalescing key: a new job with the same key and body as one still
+queued or running is the same request and returns that job; a new job with the same
+key but a different body supersedes a queued (not yet running) one, which is then
+never run. Every mode switch shares one key, so only the latest requested mode is
+applied; the whole-table slot writes (PUT /schedule, clear_all_slots) share another.
+"""
+
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from . import metrics
+
+log = logging.getLogger("growatt")
+
+QUEUED, RUNNING, DONE, FAILED, SUPERSEDED = "queued", "running", "done", "failed", "superseded"
+
+
+class Job:
+    """One control request: fn() run by the queue's worker; result or error when done."""
+
+    def __init__(self, kind, key, body, fn):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.body = body
+        self.fn = fn
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.superseded_by = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._submitted_monotonic = time.monotonic()
+        self._started_monotonic = None
+        self._done = threading.Event()
+        self._callbacks = []
+
+    def describe(self):
+        """The job as GET /jobs/<id> reports it."""
+        out = {"id": self.id, "kind": self.kind, "status": self.status,
+               "submitted": round(self.submitted, 3)}
+        if self.started is not None:
+            out["started"] = round(self.started, 3)
+            out["queue_seconds"] = round(self.started - self.submitted, 3)
+        if self.finished is not None:
+            out["finished"] = round(self.finished, 3)
+            if self.started is not None:
+                out["run_seconds"] = round(self.finished - self.started, 3)
+        if self.status == DONE:
+            out["result"] = self.result
+        elif self.status == FAILED:
+            out["error"] = self.error
+        elif self.status == SUPERSEDED:
+            out["superseded_by"] = self.superseded_by
+        return out
+
+
+class JobQueue:
+    """FIFO of control jobs run one at a time by a daemon worker thread.
+
+    Finished jobs are kept, newest history_size of them, for GET /jobs/<id>.
+    """
+
+    def __init__(self, history_size=100):
+        self.history_size = history_size
+        self.stats = {"submitted": 0, "coalesced": 0, "superseded": 0, "done": 0,
+                      "failed": 0}
+        self._pending = deque()
+        self._jobs = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def submit(self, kind, key, body, fn, callback=None):
+        """Queue fn() as a job (or return the identical one already queued/running).
+
+        callback(job), if given, is called from the worker thread once the job is
+        done, failed or superseded.
+        """
+        superseded = []
+        with self._cond:
+            for job in self._jobs.values():
+                if job.key == key and job.body == body and job.status in (QUEUED, RUNNING):
+                    self.stats["coalesced"] += 1
+                    if callback is not None:
+                        job._callbacks.append(callback)
+                    return job
+            job = Job(kind, key, body, fn)
+            if callback is not None:
+                job._callbacks.append(callback)
+            for old in self._pending:
+                if old.key == key:
+                    old.superseded_by = job.id
+                    self._finish(old, SUPERSEDED)
+                    superseded.append(old)
+                    self.stats["superseded"] += 1
+            self._pending = deque(j for j in self._pending if j.status == QUEUED)
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+            self._prune()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="growatt-control",
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        for old in superseded:
+            self._notify(old)
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def recent(self):
+        """All kept jobs, newest first."""
+        with self._cond:
+            return list(reversed(self._jobs.values()))
+
+    def wait(self, job, timeout):
+        """Wait up to timeout seconds for job to finish, following it to the job that
+        superseded it. Returns the job that finished, or the one still pending."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if not job._done.wait(max(0.0, deadline - time.monotonic())):
+                return job
+            successor = self.get(job.superseded_by) if job.status == SUPERSEDED else None
+            if successor is None:
+                return job
+            job = successor
+
+    def close(self):
+        """Stop the worker once the queue is empty."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _prune(self):
+        # Drop the oldest finished jobs beyond history_size (pending ones stay).
+        excess = len(self._jobs) - self.history_size
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]._done.is_set():
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        job.fn = None
+        job._done.set()
+
+    def _notify(self, job):
+        # Called without the queue lock held: callbacks may publish or log.
+        for callback in job._callbacks:
+            try:
+                callback(job)
+            except Exception as e:
+                log.warning("Control job %s callback failed: %s", job.id, e)
+        job._callbacks = []
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                job = self._pending.popleft()
+                job.status = RUNNING
+                job.started = time.time()
+                job._started_monotonic = time.monotonic()
+            if metrics.ENABLED:
+                metrics.CONTROL_QUEUE.observe(
+                    job._started_monotonic - job._submitted_monotonic, job.kind)
+            try:
+                job.result = job.fn()
+                status = DONE
+            except Exception as e:
+                log.warning("Control job %s (%s) failed: %s", job.id, job.kind, e)
+                job.error = str(e)
+                status = FAILED
+            if metrics.ENABLED:
+                metrics.CONTROL_JOB.observe(time.monotonic() - job._started_monotonic,
+                                            job.kind)
+            with self._cond:
+                self.stats[status] += 1
+                self._finish(job, status)
+            self._notify(job)
+
+
+def make_job_queue(config):
+    """Build the HTTP API's control job queue from the `control` config section."""
+    cfg = config.get("control") or {}
+    return JobQueue(history_size=cfg.get("job_history", 100))
@@ -0,0 +1,135 @@
+"""Prometheus metrics for GET /metrics (text exposition format, no client library).
+
+Histograms are fed by small hooks: the Modbus request wrappers in growatt.client
+(per-block latency by device, function code and start address), the bridge sessions
+in growatt.pool / growatt.aio (lock wait by priority, and hold time), the control
+job queue (queue and run time), the poll loop (cycle duration), the MQTT publisher
+and the HTTP router. Nothing is recorded until the
+first scrape calls enable(), so a poller nobody scrapes pays only a flag check per
+hook. Per-device counters (reads, skips, overruns) come straight from the poller's
+stats dict at scrape time.
+"""
+
+import threading
+
+from . import client as _client
+
+# Flipped on by the first scrape; every hook checks it before doing any work.
+ENABLED = False
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Modbus function code per request kind, for the request histogram's labels.
+_FUNCTION_CODES = {_client.READ_HOLDING: "3", _client.READ_INPUT: "4", _client.WRITE: "16"}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class Histogram:
+    """A labelled histogram: cumulative bucket counts, sum and count per label set."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, seconds, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s histogram" % self.name]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append("%s_bucket%s %d" % (
+                    self.name, _labels(self.labelnames, labels, 'le="%g"' % bound), count))
+            lines.append("%s_bucket%s %d" % (
+                self.name, _labels(self.labelnames, labels, 'le="+Inf"'), series[-1]))
+            lines.append("%s_sum%s %r" % (self.name, _labels(self.labelnames, labels),
+                                          series[-2]))
+            lines.append("%s_count%s %d" % (self.name, _labels(self.labelnames, labels),
+                                            series[-1]))
+        return lines
+
+
+REGISTRY = []
+
+MODBUS_REQUEST = Histogram(
+    "growatt_modbus_request_seconds", "Modbus request round trip per register block.",
+    ("device", "function_code", "start_address"))
+POLL_CYCLE = Histogram(
+    "growatt_poll_cycle_seconds", "Modbus half of a poll cycle (session start to decode).",
+    ("device",))
+LOCK_WAIT = Histogram(
+    "growatt_bridge_lock_wait_seconds", "Time spent waiting for a bridge's session lock.",
+    ("bridge", "priority"))
+LOCK_HOLD = Histogram(
+    "growatt_bridge_lock_hold_seconds", "Time a bridge's session lock was held.",
+    ("bridge",))
+CONTROL_QUEUE = Histogram(
+    "growatt_control_queue_seconds", "Control job wait in the queue, submitted to started.",
+    ("kind",))
+CONTROL_JOB = Histogram(
+    "growatt_control_job_seconds", "Control job run time, bridge lock wait included.",
+    ("kind",))
+MQTT_PUBLISH = Histogram(
+    "growatt_mqtt_publish_seconds", "Publish queue latency, enqueue to handed to paho.")
+HTTP_REQUEST = Histogram(
+    "growatt_http_request_seconds", "HTTP API handler latency.", ("method", "path"))
+
+# Per-device counters rendered from the poller's stats dict: stats key -> (metric, help).
+_COUNTERS = {
+    "pollOkTotal": ("growatt_poll_ok_total", "Successful poll cycles."),
+    "pollSkippedTotal": ("growatt_poll_skipped_total", "Skipped poll cycles."),
+    "readErrorsTotal": ("growatt_read_errors_total", "Incomplete read attempts."),
+    "pollOverrunsTotal": ("growatt_poll_overruns_total", "Cycles skipped for overrunning."),
+}
+
+
+def _on_request(client, op, address, seconds, _ok):
+    params = getattr(client, "comm_params", None)
+    MODBUS_REQUEST.observe(seconds, getattr(params, "host", "?"),
+                           _FUNCTION_CODES.get(op, op), str(address))
+
+
+def enable():
+    """Start recording (called on the first scrape)."""
+    global ENABLED
+    if not ENABLED:
+        ENABLED = True
+        _client.REQUEST_HOOKS.append(_on_request)
+
+
+def render(stats=None):
+    """The exposition text for every metric, plus the per-device counters in stats."""
+    enable()
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    for key, (name, help_text) in _COUNTERS.items():
+        lines += ["# HELP %s %s" % (name, help_text), "# TYPE %s counter" % name]
+        for host, st in sorted((stats or {}).items()):
+            lines.append("%s%s %d" % (name, _labels(("device",), (host,)), st.get(key, 0)))
+    return "\n".join(lines) + "\n"
@@ -1,162 +1,257 @@
 """Decode a Growatt SPH inverter's holding and input registers into dicts.
 
-These are read-only telemetry decoders shared by the poller. Scaling and
+These are read-only telemetry decoders shared by the poller. The fields themselves
+(address, width, scaling, rounding, name) are declared in growatt.registers, and the
+reads are compiled from them (``compile_read_plan``), so this module only fetches the
+planned blocks and runs a decoder generated from the table at import. Scaling and
 register choices are verified against a real SPH; see REGISTERS.md for the
 discrepancies that are deliberately left as-is.
 
+Fields are read in tiers (``Field.tier``): fast values every cycle, energy counters
+and static identity/config registers less often. ``ReadSet`` compiles the plan and
+decoder for each combination of due tiers. ``merge_state`` has that decoder write
+straight into the device's value cache (keyed in published order from the start), so
+the tiers not read this cycle keep their cached values and the published state - a
+copy of the cache - has the same keys in the same order whichever tiers were due.
+
 All-or-nothing: if any register read fails (e.g. a dropped/garbled RTU frame from
 a raw dongle bridge), the decoder returns None so the caller skips the cycle rather
 than publishing partial data.
 """
 
-from .client import read_double_reg, read_holding_registers, read_input_registers
+from .client import run_requests
+from .registers import (
+    HOLDING_FIELDS,
+    INPUT_FIELDS,
+    KIND_WIDTH,
+    POLL_TIERS,
+    SLOT_READS,
+    compile_read_plan,
+)
+
+# The reads covering every field (and the slot registers), compiled once at import.
+HOLDING_PLAN = compile_read_plan(HOLDING_FIELDS, SLOT_READS)
+INPUT_PLAN = compile_read_plan(INPUT_FIELDS)
+
+
+def _layout(fields, plan):
+    """Locate each field in the plan: [(field, block index, offset into that block)]."""
+    layout = []
+    for field in fields:
+        end = field.address + KIND_WIDTH[field.kind]
+        for index, block in enumerate(plan):
+            if (block.table == field.table and block.start <= field.address
+                    and end <= block.start + block.count):
+                layout.append((field, index, field.address - block.start))
+                break
+        else:
+            raise ValueError("field %s is not covered by the read plan" % field.name)
+    return layout
+
+
+_HOLDING_LAYOUT = _layout(HOLDING_FIELDS, HOLDING_PLAN)
+_INPUT_LAYOUT = _layout(INPUT_FIELDS, INPUT_PLAN)
+
+
+def _field_expr(field, offset, var):
+    """Python source for one field's decoded value, read from register list `var`."""
+    if field.kind == "bits16":
+        return "format(%s[%d], '016b')" % (var, offset)
+    if field.kind == "u32":
+        expr = "(%s[%d] << 16 | %s[%d])" % (var, offset, var, offset + 1)
+    else:
+        expr = "%s[%d]" % (var, offset)
+    if field.scale is not None:
+        expr = "%s * %r" % (expr, field.scale)
+    if field.divide is not None:
+        expr = "%s / %r" % (expr, field.divide)
+    if field.digits is not None:
+        expr = "round(%s, %d)" % (expr, field.digits)
+    return expr
+
+
+def compile_decoder(layout, name, count=None, into=False):
+    """Generate a decoder function for a field layout, once, at import time.
+
+    The table is turned into straight-line source - one dict literal with an
+    expression per field, in payload order - and exec'd, so a cycle's decode is a
+    single call with no per-field dispatch. The expressions are exactly the ones the
+    original hand-written decoders used (same operand order, same round()), so the
+    output is identical. The generated source is kept on the function as _source.
+    count is the number of blocks passed in (default: up to the last one used).
+
+    With into, the generated function is ``name(blocks, values)`` and stores each
+    field into the dict it is given (one item assignment per field) instead of
+    building a new one.
+    """
+    if count is None:
+        count = max(index for _field, index, _offset in layout) + 1
+    lines = [
+        "def %s(blocks%s):" % (name, ", values" if into else ""),
+        '    """Generated: decode %d fields from %d read-plan blocks."""' % (len(layout), count),
+        "    %s, = blocks" % ", ".join("b%d" % i for i in range(count)),
+    ]
+    if into:
+        for field, index, offset in layout:
+            lines.append("    values[%r] = %s" % (field.name,
+                                                 _field_expr(field, offset, "b%d" % index)))
+    else:
+        lines.append("    return {")
+        for field, index, offset in layout:
+            lines.append("        %r: %s," % (field.name,
+                                              _field_expr(field, offset, "b%d" % index)))
+        lines.append("    }")
+    source = "\n".join(lines) + "\n"
+    namespace = {}
+    exec(compile(source, "<growatt.monitor.%s>" % name, "exec"), namespace)
+    decoder = namespace[name]
+    decoder._source = source
+    return decoder
+
+
+# decode_holding(blocks) / decode_input(blocks): blocks is one register list per read
+# in HOLDING_PLAN / INPUT_PLAN, in plan order.
+decode_holding = compile_decoder(_HOLDING_LAYOUT, "decode_holding")
+decode_input = compile_decoder(_INPUT_LAYOUT, "decode_input")
+
+
+class ReadSet:
+    """The read plan and generated decoder for the fields of one set of poll tiers."""
+
+    def __init__(self, tiers):
+        self.tiers = tuple(tier for tier in POLL_TIERS if tier in tiers)
+        fields = [field for field in HOLDING_FIELDS + INPUT_FIELDS if field.tier in self.tiers]
+        self.plan = compile_read_plan(fields, SLOT_READS if "fast" in self.tiers else ())
+        # decode_into(blocks, values): store this set's fields into a value cache.
+        self.decode_into = compile_decoder(_layout(fields, self.plan),
+                                           "decode_" + "_".join(self.tiers), into=True)
+
+
+_READ_SETS = {}
+
+
+def read_set(tiers):
+    """The ReadSet for a combination of tiers, compiled on first use and then cached."""
+    key = frozenset(tiers)
+    reads = _READ_SETS.get(key)
+    if reads is None:
+        reads = _READ_SETS[key] = ReadSet(key)
+    return reads
+
+
+_PLAN_DECODERS = {}
+
+
+def decoder_for_plan(plan):
+    """A decoder for whatever fields a given plan covers, compiled once per plan.
+
+    For blocks read under an older or different plan (e.g. replaying recordings, see
+    growatt.recorder): fields the plan does not fully cover are left out.
+    """
+    plan = tuple(plan)
+    decoder = _PLAN_DECODERS.get(plan)
+    if decoder is None:
+        fields = []
+        for field in HOLDING_FIELDS + INPUT_FIELDS:
+            end = field.address + KIND_WIDTH[field.kind]
+            if any(block.table == field.table and block.start <= field.address
+                   and end <= block.start + block.count for block in plan):
+                fields.append(field)
+        if fields:
+            decoder = compile_decoder(_layout(fields, plan), "decode_recorded", len(plan))
+        else:
+            decoder = lambda _blocks: {}  # noqa: E731 - nothing decodable in this plan
+        _PLAN_DECODERS[plan] = decoder
+    return decoder
+
+
+def due_tiers(st, tier_cfg, now):
+    """The tiers to read this cycle, given a device's stats dict and `poll_tiers` config.
+
+    A tier that has never been read (first cycle, or invalidated) is always due, so
+    the cache is complete before anything is published.
+    """
+    last = st.get("tierLastRead") or {}
+    due = ["fast"]
+    energy = last.get("energy")
+    if energy is None or st["pollOkTotal"] - energy[0] >= tier_cfg.get("energy_every_cycles", 6):
+        due.append("energy")
+    static = last.get("static")
+    if static is None or now - static[1] >= tier_cfg.get("static_every_seconds", 900):
+        due.append("static")
+    return due
+
+
+def mark_tiers_read(st, tiers, now):
+    """Record a successful read of tiers: (pollOkTotal, monotonic time) per tier.
+
+    Call before counting the cycle in pollOkTotal.
+    """
+    last = st.setdefault("tierLastRead", {})
+    for tier in tiers:
+        last[tier] = (st["pollOkTotal"], now)
+
+
+def invalidate_tier(st, tier):
+    """Force a tier to be re-read on the device's next cycle (e.g. after a control write)."""
+    (st.get("tierLastRead") or {}).pop(tier, None)
+
+
+# Published state key order: holding fields, the serial, then input fields (the order
+# the original merged holding+input dicts produced).
+STATE_KEYS = (tuple(field.name for field in HOLDING_FIELDS) + ("serialNumber",)
+              + tuple(field.name for field in INPUT_FIELDS))
+
+
+def value_cache():
+    """An empty per-device value cache for merge_state, its keys already in STATE_KEYS
+    order (so a copy of it is in published order)."""
+    return dict.fromkeys(STATE_KEYS)
+
+
+def merge_state(cache, reads, blocks, serial):
+    """Decode a cycle's blocks (read under reads.plan) into a device's value cache;
+    return the full state.
+
+    The state is a copy: published states are kept after the cycle (the HTTP/stream
+    snapshot, change-only's last published state), so the cache cannot be handed out.
+    """
+    reads.decode_into(blocks, cache)
+    cache["serialNumber"] = serial
+    return cache.copy()
+
+
+def block_registers(plan, blocks, table, start, count):
+    """Registers [start, start + count) of a table out of one cycle's blocks, or None
+    if no single block covers them."""
+    for block, registers in zip(plan, blocks):
+        if (block.table == table and block.start <= start
+                and start + count <= block.start + block.count):
+            return registers[start - block.start:start - block.start + count]
+    return None
+
+
+def block_label(block):
+    """A read-plan block's name in diagnostics, e.g. 'input_1108'."""
+    return "%s_%d" % (block.table, block.start)
+
+
+def read_plan_requests(plan):
+    """Request generator: read every block of a plan; return the register lists, or None."""
+    blocks = []
+    for block in plan:
+        registers = yield block
+        if registers is None:
+            return None
+        blocks.append(registers)
+    return blocks
 
 
 def read_inverter_holding_registers(client):
-    holding_registers = {}
-    registers = read_holding_registers(client, 0, 16)
-    if not registers:
-        return None
-    holding_registers['safetyFunctionsBitMap']      = registers[1]
-    holding_registers['maxOutputActivePower']        = registers[3]
-    holding_registers['maxOutputReactivePower']      = registers[4]
-    holding_registers['inverterPowerFactor']         = registers[5]
-    normal_power                                     = read_double_reg(registers[6], registers[7], 0.1)
-    holding_registers['NormalPower']                 = round(normal_power, 2)
-    holding_registers['inverterNormalVoltage']       = registers[8]
-    holding_registers['firmwareVersionH']            = registers[9]
-    holding_registers['firmwareVersionM']            = registers[10]
-    holding_registers['firmwareVersionL']            = registers[11]
-    holding_registers['controllerVersionH']          = registers[12]
-    holding_registers['controllerVersionM']          = registers[13]
-    holding_registers['controllerVersionL']          = registers[14]
-    holding_registers['lcdLanguage']                 = registers[15]
-    next_chunk_start = 122
-    registers = read_holding_registers(client, next_chunk_start, 64)
-    if not registers:
-        return None
-    holding_registers['exportLimitState']            = registers[122 - next_chunk_start]
-    holding_registers['exportLimitRate']             = registers[123 - next_chunk_start]
-    holding_registers['svgFunctionEnabled']          = registers[141 - next_chunk_start]
-    holding_registers['numBatteryModules']           = registers[185 - next_chunk_start]
-    registers = read_holding_registers(client, 1000, 93)
-    if not registers:
-        return None
-    holding_registers['vbatStopCharge']              = registers[5]
-    holding_registers['vbatStopDischarge']           = registers[6]
-    # Priority Mode - 0 = load, 1 = Batt, 2 = Grid
-    holding_registers['priorityMode']                = registers[44]
-    holding_registers['battType']                    = registers[48]
-    holding_registers['exportToGridRatePercent']     = registers[70]
-    holding_registers['exportToGridStopDischargePercent'] = registers[71]
-    holding_registers['batFirstChargeRate']          = registers[90]
-    holding_registers['batFirstStopChargeSOC']       = registers[91]
-    holding_registers['acChargeEnabled']             = registers[92]
-    return holding_registers
+    blocks = run_requests(read_plan_requests(HOLDING_PLAN), client)
+    return None if blocks is None else decode_holding(blocks)
 
 
 def read_inverter_input_registers(client):
-    input_registers = {}
-    registers = read_input_registers(client, 0, 118)
-    if not registers:
-        return None
-    input_registers['inverterStatus']               = registers[0]  # Seems to be 6 at night
-    input_registers['pvPowerTotal']                 = read_double_reg(registers[1], registers[2], 0.1)
-    input_registers['pv1Voltage']                   = round(registers[3] * 0.1, 1)
-    input_registers['pv1Current']                   = round(registers[4] * 0.1, 1)
-    input_registers['pv1Power']                     = round(read_double_reg(registers[5], registers[6], 0.1), 1)
-    input_registers['pv2Voltage']                   = round(registers[7] * 0.1, 1)
-    input_registers['pv2Current']                   = round(registers[8] * 0.1, 1)
-    input_registers['pv2Power']                     = round(read_double_reg(registers[9], registers[10], 0.1), 1)
-    input_registers['pvBattPower']                  = round(read_double_reg(registers[35], registers[36], 0.1), 1)
-    input_registers['gridFreq']                     = round(registers[37] * 0.01, 3)
-    input_registers['gridVolt']                     = round(registers[38] * 0.1, 2)
-    input_registers['pvOutputCurrent']              = round(registers[39] * 0.1, 1)  # PV output current, not grid
-    input_registers['pvOutputWattsVA']              = round(read_double_reg(registers[40], registers[41], 0.1), 1)
-    input_registers['inverterTemperature']          = round(registers[93] * 0.1, 1)
-    input_registers['IPMTemperature']               = round(registers[94] * 0.1, 1)
-    input_registers['boostTemperature']             = round(registers[95] * 0.1, 1)
-    input_registers['inverterPowerFactorNow']       = registers[100]  # 0 -> 20000 range
-    input_registers['realOutputPowerPercent']       = registers[101]
-    input_registers['OPFullWatt']                   = read_double_reg(registers[102], registers[103], 0.1)
-    input_registers['InverterFaultCode']            = registers[105]
-    input_registers['FaultBitCode']                 = read_double_reg(registers[106], registers[107])
-    input_registers['WarningBitCode']               = read_double_reg(registers[110], registers[111])
-    input_registers['ACChargePower']                = read_double_reg(registers[116], registers[117], 0.1)
-    # --- Energy counters (kWh, 32-bit, x0.1). Validated live; ideal for the HA energy dashboard. ---
-    input_registers['eacToday']                     = round(read_double_reg(registers[53], registers[54], 0.1), 1)
-    input_registers['eacTotal']                     = round(read_double_reg(registers[55], registers[56], 0.1), 1)
-    input_registers['epv1Today']                    = round(read_double_reg(registers[59], registers[60], 0.1), 1)
-    input_registers['epv1Total']                    = round(read_double_reg(registers[61], registers[62], 0.1), 1)
-    input_registers['epv2Today']                    = round(read_double_reg(registers[63], registers[64], 0.1), 1)
-    input_registers['epv2Total']                    = round(read_double_reg(registers[65], registers[66], 0.1), 1)
-    input_registers['epvTotal']                     = round(read_double_reg(registers[91], registers[92], 0.1), 1)
-    # --- Diagnostics ---
-    input_registers['deratingMode']                 = registers[104]  # 0=none,1=PV,3=Vac,4=Fac,5=Tboost,6=Tinv,7=ctrl,9=overBackByTime
-    input_registers['operatingHours']               = round(read_double_reg(registers[57], registers[58]) * 0.5 / 3600, 1)  # reg unit 0.5s
-    next_chunk_start = 1000
-    registers = read_input_registers(client, next_chunk_start, 124)
-    if not registers:
-        return None
-    input_registers['systemWorkMode']               = registers[0]
-    input_registers['dischargePower']               = read_double_reg(registers[9], registers[10], 0.1)
-    input_registers['chargePower']                  = read_double_reg(registers[11], registers[12], 0.1)
-    input_registers['battVoltage']                  = round(registers[13] * 0.1, 3)
-    input_registers['battSOC']                      = registers[14]
-    input_registers['gridImportPowerTotal']         = read_double_reg(registers[21], registers[22], 0.1)
-    input_registers['gridExportPowerTotal']         = read_double_reg(registers[29], registers[30], 0.1)
-    input_registers['pLocalLoadTotal']              = read_double_reg(registers[37], registers[38], 0.1)
-    # --- Storage energy counters (kWh, 32-bit, x0.1). Validated live. ---
-    input_registers['eToUserToday']                 = round(read_double_reg(registers[44], registers[45], 0.1), 1)
-    input_registers['eToUserTotal']                 = round(read_double_reg(registers[46], registers[47], 0.1), 1)
-    input_registers['eToGridToday']                 = round(read_double_reg(registers[48], registers[49], 0.1), 1)
-    input_registers['eToGridTotal']                 = round(read_double_reg(registers[50], registers[51], 0.1), 1)
-    input_registers['eDischargeToday']              = round(read_double_reg(registers[52], registers[53], 0.1), 1)
-    input_registers['eDischargeTotal']              = round(read_double_reg(registers[54], registers[55], 0.1), 1)
-    input_registers['eChargeToday']                 = round(read_double_reg(registers[56], registers[57], 0.1), 1)
-    input_registers['eChargeTotal']                 = round(read_double_reg(registers[58], registers[59], 0.1), 1)
-    input_registers['eLocalLoadToday']              = round(read_double_reg(registers[60], registers[61], 0.1), 1)
-    input_registers['eLocalLoadTotal']              = round(read_double_reg(registers[62], registers[63], 0.1), 1)
-    input_registers['battTemperature']              = registers[40]
-    input_registers['epsFreq']                      = registers[67]
-    input_registers['epsVolt']                      = round(registers[68] / 10, 2)
-    input_registers['epsCurrent']                   = registers[69]
-    input_registers['epsPower']                     = read_double_reg(registers[70], registers[71], 0.1)
-    input_registers['epsLoadPercent']               = registers[80]
-    input_registers['epsPowerFactor']               = registers[81]
-    input_registers['bmsStatus']                    = registers[83]
-    input_registers['bmsStatusBitmap']              = format(registers[83], '016b')
-    #  Bit map for bmsStatusBitmap:
-    #  0 & 1 - 00 soft start, 01 stand by, 10 charge, 11 discharge
-    #  2 - errors?
-    #  3 - cell balance 0 = unbalance, 1 = balance
-    #  4 - sleep status 0 disable 1 enable
-    #  5 output discharge - 0 disable 1 enable
-    #  6 output charge
-    #  7 battery terminal - 0 connected, 1 disconnected
-    #  8 & 9 operation mode, 00 - stand alone, 01 - parallel, 10 - parallel preparation
-    #  10 & 11 SP status - 00 none, 01 standby, 10 charge, 11 discharge
-    input_registers['bmsError']                     = registers[85]
-    input_registers['bmsSOC']                       = registers[86]
-    input_registers['bmsDeltaV']                    = registers[94]
-    input_registers['bmsCycleCount']                = registers[95]
-    input_registers['bmsSOH']                       = registers[96]
-    # --- BMS cell summary (1108-1110 confirmed against the PDF and live data). ---
-    # NB: 1108-1123 is NOT a 16-cell voltage array (the old 'cellVoltage1..16' was wrong).
-    # The true per-cell voltages live in the battery's own CAN/ESS protocol (0x0071+), not Modbus.
-    input_registers['maxCellVoltage']               = round(registers[108] * 0.001, 3)  # V
-    input_registers['minCellVoltage']               = round(registers[109] * 0.001, 3)  # V
-    input_registers['batteryModuleCount']           = registers[110]
-    # 1111-1123: PDF labels these as counts/indices/temps/SOC/error words, but the live values
-    # contradict that on this firmware. Captured raw under their address, meaning UNCONFIRMED.
-    for addr in range(1111, 1124):
-        input_registers["bmsReg" + str(addr)]       = registers[addr - 1000]
-    # Storage AC-charge energy and self-consumption energy (separate read; past the 124-register window).
-    registers = read_input_registers(client, 1124, 21)  # 1124-1144
-    if not registers:
-        return None
-    input_registers['acChargeEnergyToday']          = round(read_double_reg(registers[0], registers[1], 0.1), 1)
-    input_registers['acChargeEnergyTotal']          = round(read_double_reg(registers[2], registers[3], 0.1), 1)
-    input_registers['eSelfToday']                   = round(read_double_reg(registers[17], registers[18], 0.1), 1)  # 1141-1142
-    input_registers['eSelfTotal']                   = round(read_double_reg(registers[19], registers[20], 0.1), 1)  # 1143-1144
-    return input_registers
+    blocks = run_requests(read_plan_requests(INPUT_PLAN), client)
+    return None if blocks is None else decode_input(blocks)
@@ -0,0 +1,179 @@
+"""Persistent Modbus connections, one per bridge, shared by the poller and control.
+
+Opening a TCP connection (and, on a ShineWiFi-X dongle, the bridge's own session
+setup) is the slowest part of talking to an inverter, so instead of connecting and
+closing around every poll cycle and every control request, the pool keeps one
+``ModbusTcpClient`` open per bridge and hands it out under that bridge's lock
+(see growatt._modbus_lock), which still guarantees one active session per dongle.
+
+Before a pooled connection is reused it is health-checked: if the bridge has closed
+it, if stray bytes are waiting on it (a late reply to a timed-out request, which
+would desync the next RTU frame), or if it has sat idle longer than
+``max_idle_seconds`` (dongles silently drop idle sockets), it is closed and a fresh
+one is opened. Any exception escaping a session also discards the connection.
+
+Each session can set its own request timeout and retry count on the shared client
+(devices on one bridge can have different adaptive timeouts, see growatt.adaptive);
+without them the pool's configured defaults apply.
+"""
+
+import select
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+from pymodbus.client import ModbusTcpClient
+
+from . import metrics
+from ._modbus_lock import POLL, PRIORITY_NAMES, bridge_lock
+
+log = logging.getLogger("growatt")
+
+
+def _healthy(client):
+    """True if a pooled client's socket is still open and has nothing unread on it."""
+    sock = getattr(client, "socket", None)
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    # Nothing should arrive between sessions: readable means EOF (the bridge dropped
+    # us) or a late frame from an earlier timed-out request. Either way start fresh.
+    return not readable
+
+
+def apply_timeout(client, timeout, retries):
+    """Set the request timeout/retries on an open pymodbus client (sync or asyncio).
+
+    pymodbus gives the transaction manager its own copy of the client's comm_params,
+    and the sync client's recv() waits on the client's copy, so both are set.
+    """
+    manager = getattr(client, "transaction", None) or client.ctx
+    client.comm_params.timeout_connect = timeout
+    manager.comm_params.timeout_connect = timeout
+    manager.retries = retries
+
+
+class _Entry:
+    """A bridge's pooled client plus its bookkeeping. Only touched under the bridge lock."""
+
+    def __init__(self):
+        self.client = None
+        self.last_used = 0.0
+        self.connects = 0
+        self.reuses = 0
+
+
+class ConnectionPool:
+    """Keep one healthy Modbus client open per bridge across poll cycles and control calls.
+
+    persistent=False restores the old behaviour (connect and close around every
+    session) through the same code path, which is handy when chasing a bridge that
+    misbehaves with long-lived connections.
+    """
+
+    def __init__(self, persistent=True, max_idle_seconds=60, timeout=5, retries=3):
+        self.persistent = persistent
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+        self.retries = retries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            return entry
+
+    def _checkout(self, entry, host, port, framer, timeout, retries):
+        """Return a connected client for the bridge, reusing the pooled one if healthy."""
+        client = entry.client
+        if client is not None:
+            idle = time.monotonic() - entry.last_used
+            if idle <= self.max_idle_seconds and _healthy(client):
+                entry.reuses += 1
+                return client
+            log.debug("Dropping pooled connection to %s:%s (idle %.0fs)", host, port, idle)
+            client.close()
+            entry.client = None
+        # retries + a slightly longer timeout: raw RTU-over-TCP dongles occasionally drop or
+        # garble a frame (no on-device retry/reassembly like the EW11 had).
+        kwargs = {"framer": framer} if framer is not None else {}
+        client = ModbusTcpClient(host, port=port, timeout=timeout, retries=retries, **kwargs)
+        if not client.connect():
+            client.close()
+            return None
+        entry.connects += 1
+        entry.client = client
+        return client
+
+    @contextmanager
+    def session(self, host, port=502, framer=None, timeout=None, retries=None, priority=POLL):
+        """Hold the bridge lock and yield a connected client, or None if connect failed.
+
+        priority (growatt._modbus_lock.CONTROL or POLL) orders this session against
+        others waiting for the same bridge.
+        """
+        port = int(port)
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        entry = self._entry((host, port))
+        waited = time.monotonic()
+        with bridge_lock(host, port).hold(priority):
+            acquired = time.monotonic()
+            if metrics.ENABLED:
+                metrics.LOCK_WAIT.observe(acquired - waited, "%s:%d" % (host, port),
+                                          PRIORITY_NAMES[priority])
+            client = self._checkout(entry, host, port, framer, timeout, retries)
+            if client is not None:
+                apply_timeout(client, timeout, retries)
+            try:
+                yield client
+            except BaseException:
+                self._discard(entry)
+                raise
+            finally:
+                if entry.client is not None:
+                    entry.last_used = time.monotonic()
+                    if not self.persistent:
+                        self._discard(entry)
+                if metrics.ENABLED:
+                    metrics.LOCK_HOLD.observe(time.monotonic() - acquired, "%s:%d" % (host, port))
+
+    def _discard(self, entry):
+        if entry.client is not None:
+            entry.client.close()
+            entry.client = None
+
+    def stats(self, host, port=502):
+        """Reuse/reconnect counters for a bridge, for the diagnostics payload."""
+        entry = self._entry((host, int(port)))
+        return {
+            "connectionReuses": entry.reuses,
+            # The first connect is not a reconnect.
+            "connectionReconnects": max(0, entry.connects - 1),
+        }
+
+    def close_all(self):
+        """Close every pooled connection (on shutdown)."""
+        with self._lock:
+            items = list(self._entries.items())
+        for (host, port), entry in items:
+            with bridge_lock(host, port):
+                self._discard(entry)
+
+
+def make_pool(config):
+    """Build the process-wide connection pool from the `modbus` config section."""
+    cfg = config.get("modbus") or {}
+    return ConnectionPool(
+        persistent=cfg.get("persistent", True),
+        max_idle_seconds=cfg.get("max_idle_seconds", 60),
+        timeout=cfg.get("timeout", 5),
+        retries=cfg.get("retries", 3),
+    )
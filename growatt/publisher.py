@@ -0,0 +1,121 @@
+"""Background MQTT publishing, off the Modbus critical section.
+
+Publishing used to happen inside the bridge session: a slow broker, or the ~60
+retained messages of a discovery burst, held the bridge lock and so delayed the next
+device's poll and any control request waiting for the dongle. ``Publisher`` takes
+publishes through the same ``publish(topic, payload, retain=...)`` call as a paho
+client, queues them, and hands them to paho from its own thread.
+
+The queue is bounded and keyed by topic: a newer message for a topic that is still
+waiting replaces the queued one in place (only the latest state matters), and if the
+queue is full of distinct topics the oldest is dropped and counted. A caller that
+must know whether its message went out (growatt.discovery) passes on_sent, called
+with True once paho has accepted it, or False if it was dropped, superseded or
+refused (e.g. while disconnected). Queue depth and
+publish latency (enqueue to handed to paho) are reported in the diagnostics payload;
+the latency covers the window the poll loop last closed with roll(), once per
+scheduler round, so every device's diagnostics in a round report the same figures.
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from . import metrics
+
+log = logging.getLogger("growatt")
+
+
+class Publisher:
+    """A bounded latest-per-topic publish queue drained by a daemon thread."""
+
+    def __init__(self, client, max_pending=1000):
+        self._client = client
+        self._max_pending = max_pending
+        # topic -> (payload, retain, enqueued monotonic, on_sent)
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self.superseded = 0
+        self.dropped = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self._latency_count = 0
+        self._window = (0.0, 0.0)  # (mean, max) latency of the last rolled window, ms
+        self._thread = threading.Thread(target=self._run, name="mqtt-publish", daemon=True)
+        self._thread.start()
+
+    def publish(self, topic, payload, retain=False, on_sent=None):
+        """Queue a message; returns at once. Same call shape as paho's publish()."""
+        lost = None
+        with self._cond:
+            if topic in self._pending:
+                self.superseded += 1
+                lost = self._pending[topic][3]
+            elif len(self._pending) >= self._max_pending:
+                dropped, (_, _, _, lost) = self._pending.popitem(last=False)
+                self.dropped += 1
+                log.warning("MQTT publish queue full, dropping %s", dropped)
+            self._pending[topic] = (payload, retain, time.monotonic(), on_sent)
+            self._cond.notify_all()
+        if lost is not None:
+            lost(False)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                topic, (payload, retain, enqueued, on_sent) = self._pending.popitem(last=False)
+                self._busy = True
+            try:
+                info = self._client.publish(topic, payload, retain=retain)
+                ok = getattr(info, "rc", 0) == 0
+            except Exception as e:
+                log.warning("MQTT publish to %s failed: %s", topic, e)
+                ok = False
+            if on_sent is not None:
+                on_sent(ok)
+            latency = time.monotonic() - enqueued
+            if metrics.ENABLED:
+                metrics.MQTT_PUBLISH.observe(latency)
+            with self._cond:
+                self._busy = False
+                self._latency_sum += latency
+                self._latency_max = max(self._latency_max, latency)
+                self._latency_count += 1
+                self._cond.notify_all()
+
+    def roll(self):
+        """Close the latency window: stats() reports it until the next roll()."""
+        with self._cond:
+            count = self._latency_count
+            self._window = (round(1000 * self._latency_sum / count, 1) if count else 0.0,
+                            round(1000 * self._latency_max, 1))
+            self._latency_sum = self._latency_max = 0.0
+            self._latency_count = 0
+
+    def stats(self):
+        """Queue depth, and publish latency over the last rolled window, for diagnostics."""
+        with self._cond:
+            return {
+                "publishQueueDepth": len(self._pending),
+                "publishLatencyMs": self._window[0],
+                "publishLatencyMaxMs": self._window[1],
+                "publishDroppedTotal": self.dropped,
+            }
+
+    def close(self, timeout=5):
+        """Flush what is queued (up to timeout seconds), then stop the thread."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._pending or self._busy) and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify_all()
+        self._thread.join(timeout)
@@ -0,0 +1,187 @@
+"""Optional append-only recorder of raw register blocks, and a replay reader.
+
+The decoders throw the raw registers away, so when a scaling question comes up (see
+REGISTERS.md) there is nothing to re-decode. With ``recorder.enabled`` every
+successful cycle's blocks are appended to a compact binary file, rotated by size and
+pruned to the newest ``keep_files``; a recording can later be replayed through the
+current decoder.
+
+File layout (little-endian): an 8-byte magic, then back-to-back records of
+
+    float64 timestamp | uint8 device length | uint8 function code (3 holding,
+    4 input) | uint16 start address | uint16 count | device (UTF-8) | count x uint16
+
+All blocks of one cycle share a timestamp, which is how replay regroups them. The
+writer is a buffered append under one lock, done after the bridge is released;
+the reader walks an mmap of the file with struct.unpack_from, lifting each block
+straight into a uint16 array, so days of data replay at decode speed.
+
+Replay from the command line, one JSON state per cycle:
+
+    python -m growatt.recorder recordings/growatt-*.bin [--device HOST]
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import logging
+import threading
+from array import array
+
+from .registers import ReadBlock
+from .monitor import decoder_for_plan
+
+log = logging.getLogger("growatt")
+
+MAGIC = b"GWREC01\n"
+_RECORD = struct.Struct("<dBBHH")
+_FUNCTION_CODES = {"holding": 3, "input": 4}
+_TABLES = {code: table for table, code in _FUNCTION_CODES.items()}
+
+
+class Recorder:
+    """Append cycles of raw blocks to rotated files in a directory."""
+
+    def __init__(self, directory, rotate_bytes=64 << 20, keep_files=48):
+        self.directory = directory
+        self.rotate_bytes = rotate_bytes
+        self.keep_files = keep_files
+        self._file = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self):
+        name = time.strftime("growatt-%Y%m%d-%H%M%S.bin", time.gmtime())
+        path = os.path.join(self.directory, name)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._prune()
+
+    def _prune(self):
+        files = recordings(self.directory)
+        for path in files[:-self.keep_files] if self.keep_files else ():
+            try:
+                os.remove(path)
+            except OSError as e:
+                log.warning("Could not prune recording %s: %s", path, e)
+
+    def record(self, device, plan, blocks, timestamp=None):
+        """Append one cycle: the plan's blocks and their register lists."""
+        timestamp = time.time() if timestamp is None else timestamp
+        name = device.encode()[:255]
+        chunks = []
+        for block, registers in zip(plan, blocks):
+            chunks.append(_RECORD.pack(timestamp, len(name), _FUNCTION_CODES[block.table],
+                                       block.start, len(registers)))
+            chunks.append(name)
+            chunks.append(array("H", registers).tobytes())
+        data = b"".join(chunks)
+        with self._lock:
+            if self._file is None or self._file.tell() + len(data) > self.rotate_bytes:
+                self.close()
+                self._open()
+            self._file.write(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def recordings(directory):
+    """The recording files in a directory, oldest first."""
+    names = sorted(n for n in os.listdir(directory)
+                   if n.startswith("growatt-") and n.endswith(".bin"))
+    return [os.path.join(directory, n) for n in names]
+
+
+def iter_records(path):
+    """Yield (timestamp, device, ReadBlock, registers) for each record of a file."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(MAGIC)] != MAGIC:
+                raise ValueError("%s is not a growatt recording" % path)
+            offset = len(MAGIC)
+            end = len(mapped)
+            while offset + _RECORD.size <= end:
+                timestamp, name_len, code, start, count = _RECORD.unpack_from(mapped, offset)
+                offset += _RECORD.size
+                device = mapped[offset:offset + name_len].decode()
+                offset += name_len
+                if offset + 2 * count > end:
+                    break  # truncated tail (the process stopped mid-write)
+                registers = array("H")
+                registers.frombytes(mapped[offset:offset + 2 * count])
+                offset += 2 * count
+                yield timestamp, device, ReadBlock(_TABLES[code], start, count), registers
+
+
+def iter_cycles(paths, device=None):
+    """Yield (timestamp, device, plan, blocks) per recorded cycle across files.
+
+    A cycle is written in one append, so it never spans two files.
+    """
+    for path in paths:
+        current = None
+        for timestamp, dev, block, registers in iter_records(path):
+            if device is not None and dev != device:
+                continue
+            if current is None or current[0] != timestamp or current[1] != dev:
+                if current is not None:
+                    yield current[0], current[1], tuple(current[2]), current[3]
+                current = (timestamp, dev, [], [])
+            current[2].append(block)
+            current[3].append(registers)
+        if current is not None:
+            yield current[0], current[1], tuple(current[2]), current[3]
+
+
+def replay(paths, device=None):
+    """Yield (timestamp, device, decoded fields) per recorded cycle, via the current decoders."""
+    for timestamp, dev, plan, blocks in iter_cycles(paths, device):
+        yield timestamp, dev, decoder_for_plan(plan)(blocks)
+
+
+_RECORDER = None
+_RECORDER_LOCK = threading.Lock()
+
+
+def get_recorder(config):
+    """The process-wide Recorder from the `recorder` config section, or None if disabled."""
+    global _RECORDER
+    cfg = config.get("recorder") or {}
+    if not cfg.get("enabled"):
+        return None
+    with _RECORDER_LOCK:
+        if _RECORDER is None:
+            _RECORDER = Recorder(cfg.get("directory", "recordings"),
+                                 rotate_bytes=int(cfg.get("rotate_mb", 64)) << 20,
+                                 keep_files=cfg.get("keep_files", 48))
+        return _RECORDER
+
+
+def close_recorder():
+    """Flush and close the process-wide recorder (on shutdown)."""
+    with _RECORDER_LOCK:
+        if _RECORDER is not None:
+            _RECORDER.close()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay growatt raw-block recordings.")
+    parser.add_argument("paths", nargs="+", help="recording files, oldest first")
+    parser.add_argument("--device", help="only this device (bridge host)")
+    args = parser.parse_args(argv)
+    for timestamp, dev, fields in replay(args.paths, args.device):
+        sys.stdout.write(json.dumps({"timestamp": timestamp, "device": dev, **fields}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
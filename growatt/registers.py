@@ -3,9 +3,17 @@
 ``SENSOR_META`` is the curated map of state-payload field -> Home Assistant
 sensor metadata used to drive MQTT discovery. Fields not listed here are still
 published in the state payload, they just do not get a HA entity.
-Tuple: (friendly name, device_class, unit, state_class).
+Tuple: (friendly name, device_class, unit, state_class). The unit also picks the
+field's default deadband for change-only publishing (``sensor_deadbands``).
+
+``HOLDING_FIELDS``/``INPUT_FIELDS`` are the declarative telemetry map (address,
+width, scaling, rounding, name) that growatt.monitor decodes, and
+``compile_read_plan`` turns any set of those fields into the fewest legal Modbus
+reads, so adding or dropping a field reshapes the reads automatically.
 """
 
+from collections import namedtuple
+
 SENSOR_META = {
     "pvPowerTotal":         ("PV power total",        "power",       "W",  "measurement"),
     "pv1Voltage":           ("PV1 voltage",           "voltage",     "V",  "measurement"),
@@ -64,3 +72,254 @@ SENSOR_META = {
     "operatingHours":       ("Operating hours",       "duration",    "h",  "total_increasing"),
     "deratingMode":         ("Derating mode",         None,          None, "measurement"),
 }
+
+# Change-only publishing (mqtt.change_only): a state is only re-published when some
+# field has moved by more than its deadband since the last published state. Sensors get
+# a default by unit, SENSOR_DEADBANDS overrides that per field, and mqtt.deadbands in
+# config overrides both. Fields without a deadband publish on any change.
+DEADBAND_BY_UNIT = {"W": 20, "VA": 20, "V": 1.0, "A": 0.2, "Hz": 0.05, "°C": 0.5}
+SENSOR_DEADBANDS = {
+    "battVoltage": 0.2,
+    "maxCellVoltage": 0.005,
+    "minCellVoltage": 0.005,
+}
+
+
+def sensor_deadbands(overrides=None):
+    """Field -> deadband for change-only publishing, with config overrides applied."""
+    deadbands = {key: DEADBAND_BY_UNIT[meta[2]] for key, meta in SENSOR_META.items()
+                 if meta[2] in DEADBAND_BY_UNIT}
+    deadbands.update(SENSOR_DEADBANDS)
+    deadbands.update(overrides or {})
+    return deadbands
+
+
+# ---------------------------------------------------------------------------
+# Telemetry field map
+# ---------------------------------------------------------------------------
+# One Field per decoded value in the state payload, in payload order (the JSON key
+# order is part of the output, so keep new fields where they should appear).
+#   table:   "holding" (FC03) or "input" (FC04)
+#   kind:    "u16" one register; "u32" two registers as high << 16 | low;
+#            "bits16" one register rendered as a 16-character binary string
+#   scale / divide / digits: the raw value is multiplied by scale, then divided by
+#            divide, then round()ed to digits - each step only if set, in that order,
+#            which reproduces the original hand-written expressions bit for bit.
+#   tier:    how often the poller re-reads it (see POLL_TIERS); cached values of the
+#            slower tiers are merged into every published state.
+# Scaling and naming follow the running code, not the PDF; see REGISTERS.md.
+Field = namedtuple("Field", "name table address kind scale divide digits tier",
+                   defaults=("u16", None, None, None, "fast"))
+
+# Poll tiers, fastest first:
+#   fast   - power flows, SOC, temperatures, modes: read every cycle.
+#   energy - kWh/hour counters: every poll_tiers.energy_every_cycles successful cycles.
+#   static - identity/config holding registers (firmware, language, export limit,
+#            module count): every poll_tiers.static_every_seconds, and after a control write.
+POLL_TIERS = ("fast", "energy", "static")
+
+# Width in registers of each field kind.
+KIND_WIDTH = {"u16": 1, "u32": 2, "bits16": 1}
+
+HOLDING_FIELDS = (
+    Field("safetyFunctionsBitMap", "holding", 1, tier="static"),
+    Field("maxOutputActivePower", "holding", 3, tier="static"),
+    Field("maxOutputReactivePower", "holding", 4, tier="static"),
+    Field("inverterPowerFactor", "holding", 5, tier="static"),
+    Field("NormalPower", "holding", 6, "u32", 0.1, digits=2, tier="static"),
+    Field("inverterNormalVoltage", "holding", 8, tier="static"),
+    Field("firmwareVersionH", "holding", 9, tier="static"),
+    Field("firmwareVersionM", "holding", 10, tier="static"),
+    Field("firmwareVersionL", "holding", 11, tier="static"),
+    Field("controllerVersionH", "holding", 12, tier="static"),
+    Field("controllerVersionM", "holding", 13, tier="static"),
+    Field("controllerVersionL", "holding", 14, tier="static"),
+    Field("lcdLanguage", "holding", 15, tier="static"),
+    Field("exportLimitState", "holding", 122, tier="static"),
+    Field("exportLimitRate", "holding", 123, tier="static"),
+    Field("svgFunctionEnabled", "holding", 141, tier="static"),
+    Field("numBatteryModules", "holding", 185, tier="static"),
+    Field("vbatStopCharge", "holding", 1005),
+    Field("vbatStopDischarge", "holding", 1006),
+    # Priority Mode - 0 = load, 1 = Batt, 2 = Grid
+    Field("priorityMode", "holding", 1044),
+    Field("battType", "holding", 1048),
+    Field("exportToGridRatePercent", "holding", 1070),
+    Field("exportToGridStopDischargePercent", "holding", 1071),
+    Field("batFirstChargeRate", "holding", 1090),
+    Field("batFirstStopChargeSOC", "holding", 1091),
+    Field("acChargeEnabled", "holding", 1092),
+)
+
+INPUT_FIELDS = (
+    Field("inverterStatus", "input", 0),  # Seems to be 6 at night
+    Field("pvPowerTotal", "input", 1, "u32", 0.1),
+    Field("pv1Voltage", "input", 3, "u16", 0.1, digits=1),
+    Field("pv1Current", "input", 4, "u16", 0.1, digits=1),
+    Field("pv1Power", "input", 5, "u32", 0.1, digits=1),
+    Field("pv2Voltage", "input", 7, "u16", 0.1, digits=1),
+    Field("pv2Current", "input", 8, "u16", 0.1, digits=1),
+    Field("pv2Power", "input", 9, "u32", 0.1, digits=1),
+    Field("pvBattPower", "input", 35, "u32", 0.1, digits=1),
+    Field("gridFreq", "input", 37, "u16", 0.01, digits=3),
+    Field("gridVolt", "input", 38, "u16", 0.1, digits=2),
+    Field("pvOutputCurrent", "input", 39, "u16", 0.1, digits=1),  # PV output current, not grid
+    Field("pvOutputWattsVA", "input", 40, "u32", 0.1, digits=1),
+    Field("inverterTemperature", "input", 93, "u16", 0.1, digits=1),
+    Field("IPMTemperature", "input", 94, "u16", 0.1, digits=1),
+    Field("boostTemperature", "input", 95, "u16", 0.1, digits=1),
+    Field("inverterPowerFactorNow", "input", 100),  # 0 -> 20000 range
+    Field("realOutputPowerPercent", "input", 101),
+    Field("OPFullWatt", "input", 102, "u32", 0.1),
+    Field("InverterFaultCode", "input", 105),
+    Field("FaultBitCode", "input", 106, "u32"),
+    Field("WarningBitCode", "input", 110, "u32"),
+    Field("ACChargePower", "input", 116, "u32", 0.1),
+    # --- Energy counters (kWh, 32-bit, x0.1). Validated live; ideal for the HA energy dashboard. ---
+    Field("eacToday", "input", 53, "u32", 0.1, digits=1, tier="energy"),
+    Field("eacTotal", "input", 55, "u32", 0.1, digits=1, tier="energy"),
+    Field("epv1Today", "input", 59, "u32", 0.1, digits=1, tier="energy"),
+    Field("epv1Total", "input", 61, "u32", 0.1, digits=1, tier="energy"),
+    Field("epv2Today", "input", 63, "u32", 0.1, digits=1, tier="energy"),
+    Field("epv2Total", "input", 65, "u32", 0.1, digits=1, tier="energy"),
+    Field("epvTotal", "input", 91, "u32", 0.1, digits=1, tier="energy"),
+    # --- Diagnostics ---
+    Field("deratingMode", "input", 104),  # 0=none,1=PV,3=Vac,4=Fac,5=Tboost,6=Tinv,7=ctrl,9=overBackByTime
+    Field("operatingHours", "input", 57, "u32", 0.5, 3600, 1, tier="energy"),  # reg unit 0.5s
+    Field("systemWorkMode", "input", 1000),
+    Field("dischargePower", "input", 1009, "u32", 0.1),
+    Field("chargePower", "input", 1011, "u32", 0.1),
+    Field("battVoltage", "input", 1013, "u16", 0.1, digits=3),
+    Field("battSOC", "input", 1014),
+    Field("gridImportPowerTotal", "input", 1021, "u32", 0.1),
+    Field("gridExportPowerTotal", "input", 1029, "u32", 0.1),
+    Field("pLocalLoadTotal", "input", 1037, "u32", 0.1),
+    # --- Storage energy counters (kWh, 32-bit, x0.1). Validated live. ---
+    Field("eToUserToday", "input", 1044, "u32", 0.1, digits=1, tier="energy"),
+    Field("eToUserTotal", "input", 1046, "u32", 0.1, digits=1, tier="energy"),
+    Field("eToGridToday", "input", 1048, "u32", 0.1, digits=1, tier="energy"),
+    Field("eToGridTotal", "input", 1050, "u32", 0.1, digits=1, tier="energy"),
+    Field("eDischargeToday", "input", 1052, "u32", 0.1, digits=1, tier="energy"),
+    Field("eDischargeTotal", "input", 1054, "u32", 0.1, digits=1, tier="energy"),
+    Field("eChargeToday", "input", 1056, "u32", 0.1, digits=1, tier="energy"),
+    Field("eChargeTotal", "input", 1058, "u32", 0.1, digits=1, tier="energy"),
+    Field("eLocalLoadToday", "input", 1060, "u32", 0.1, digits=1, tier="energy"),
+    Field("eLocalLoadTotal", "input", 1062, "u32", 0.1, digits=1, tier="energy"),
+    Field("battTemperature", "input", 1040),
+    Field("epsFreq", "input", 1067),
+    Field("epsVolt", "input", 1068, "u16", divide=10, digits=2),
+    Field("epsCurrent", "input", 1069),
+    Field("epsPower", "input", 1070, "u32", 0.1),
+    Field("epsLoadPercent", "input", 1080),
+    Field("epsPowerFactor", "input", 1081),
+    Field("bmsStatus", "input", 1083),
+    #  Bit map for bmsStatusBitmap:
+    #  0 & 1 - 00 soft start, 01 stand by, 10 charge, 11 discharge
+    #  2 - errors?
+    #  3 - cell balance 0 = unbalance, 1 = balance
+    #  4 - sleep status 0 disable 1 enable
+    #  5 output discharge - 0 disable 1 enable
+    #  6 output charge
+    #  7 battery terminal - 0 connected, 1 disconnected
+    #  8 & 9 operation mode, 00 - stand alone, 01 - parallel, 10 - parallel preparation
+    #  10 & 11 SP status - 00 none, 01 standby, 10 charge, 11 discharge
+    Field("bmsStatusBitmap", "input", 1083, "bits16"),
+    Field("bmsError", "input", 1085),
+    Field("bmsSOC", "input", 1086),
+    Field("bmsDeltaV", "input", 1094),
+    Field("bmsCycleCount", "input", 1095, tier="energy"),
+    Field("bmsSOH", "input", 1096),
+    # --- BMS cell summary (1108-1110 confirmed against the PDF and live data). ---
+    # NB: 1108-1123 is NOT a 16-cell voltage array (the old 'cellVoltage1..16' was wrong).
+    # The true per-cell voltages live in the battery's own CAN/ESS protocol (0x0071+), not Modbus.
+    Field("maxCellVoltage", "input", 1108, "u16", 0.001, digits=3),  # V
+    Field("minCellVoltage", "input", 1109, "u16", 0.001, digits=3),  # V
+    Field("batteryModuleCount", "input", 1110),
+    # 1111-1123: PDF labels these as counts/indices/temps/SOC/error words, but the live values
+    # contradict that on this firmware. Captured raw under their address, meaning UNCONFIRMED.
+    *(Field("bmsReg%d" % addr, "input", addr) for addr in range(1111, 1124)),
+    # Storage AC-charge energy and self-consumption energy.
+    Field("acChargeEnergyToday", "input", 1124, "u32", 0.1, digits=1, tier="energy"),
+    Field("acChargeEnergyTotal", "input", 1126, "u32", 0.1, digits=1, tier="energy"),
+    Field("eSelfToday", "input", 1141, "u32", 0.1, digits=1, tier="energy"),
+    Field("eSelfTotal", "input", 1143, "u32", 0.1, digits=1, tier="energy"),
+)
+
+
+# ---------------------------------------------------------------------------
+# Read-plan compiler
+# ---------------------------------------------------------------------------
+# Modbus caps a single register read at 125 registers.
+MAX_READ_REGISTERS = 125
+
+# Address ranges (inclusive) that answer a read on the SPH, per table. A request that
+# strays into a gap between them is rejected as a whole, so a read never spans two.
+READ_WINDOWS = {
+    "holding": ((0, 185), (1000, 1108)),
+    "input": ((0, 117), (1000, 1144)),
+}
+
+# One Modbus read: also the ("holding" | "input", start, count) request tuple that the
+# request generators in growatt.client yield.
+ReadBlock = namedtuple("ReadBlock", "table start count")
+
+# Raw registers read with the fast tier although no field decodes them: the Battery-
+# First and Grid-First time slots (the slot map in growatt.control), so GET /slots can
+# be answered from the poller's last cycle rather than a bus session of its own. They
+# sit inside the 1005-1092 read already, bar 1100-1108, which only stretches it.
+SLOT_READS = (
+    ReadBlock("holding", 1018, 18),
+    ReadBlock("holding", 1080, 9),
+    ReadBlock("holding", 1100, 9),
+)
+
+
+def _cover(points):
+    """Cover sorted addresses with the fewest reads, then the fewest registers.
+
+    Dynamic programme over the points: best[i] is the cheapest plan for points[i:],
+    where a read starting at points[i] may extend to any later point within
+    MAX_READ_REGISTERS. Returns [(start, count)].
+    """
+    n = len(points)
+    best = [None] * n + [(0, 0, n)]   # (reads, registers, index after this read)
+    for i in range(n - 1, -1, -1):
+        j = i
+        while j < n and points[j] - points[i] < MAX_READ_REGISTERS:
+            reads, regs, _ = best[j + 1]
+            cand = (reads + 1, regs + points[j] - points[i] + 1, j + 1)
+            if best[i] is None or cand[:2] < best[i][:2]:
+                best[i] = cand
+            j += 1
+    blocks, i = [], 0
+    while i < n:
+        nxt = best[i][2]
+        blocks.append((points[i], points[nxt - 1] - points[i] + 1))
+        i = nxt
+    return blocks
+
+
+def compile_read_plan(fields, extra=()):
+    """Turn the wanted fields into the fewest legal Modbus reads.
+
+    extra is an iterable of (table, start, count) ranges to cover as well (raw
+    registers wanted without a decoded field). Reads respect MAX_READ_REGISTERS and
+    never cross a gap between READ_WINDOWS; among plans with the fewest reads the one
+    reading the fewest registers wins. Returns a tuple of ReadBlock, holding first.
+    """
+    needed = {table: set() for table in READ_WINDOWS}
+    for field in fields:
+        needed[field.table].update(range(field.address, field.address + KIND_WIDTH[field.kind]))
+    for table, start, count in extra:
+        needed[table].update(range(start, start + count))
+    plan = []
+    for table, windows in READ_WINDOWS.items():
+        addresses = sorted(needed[table])
+        outside = [a for a in addresses if not any(lo <= a <= hi for lo, hi in windows)]
+        if outside:
+            raise ValueError("%s registers %s are outside every readable window"
+                             % (table, outside))
+        for lo, hi in windows:
+            points = [a for a in addresses if lo <= a <= hi]
+            plan.extend(ReadBlock(table, start, count) for start, count in _cover(points))
+    return tuple(plan)
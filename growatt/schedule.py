@@ -0,0 +1,62 @@
+"""Deadline scheduling of poll cycles on the monotonic clock.
+
+Sleeping ``poll_interval`` after each round of polls made the real period interval +
+poll time, drifting further whenever retries piled up, and gave every device the same
+interval. Instead each device gets a fixed grid of deadlines (start + phase + k *
+interval, with an optional per-device ``poll_interval``), so the period does not
+drift. Devices are phase-staggered across the interval so they do not all hit the bus
+at once, and a cycle that finishes after its next deadline skips the deadlines it
+missed, counting them as overruns, rather than queuing catch-up polls.
+
+Like the request generators in growatt.client this holds no I/O: the engines do the
+waiting (threading.Event.wait / asyncio.wait_for on their stop event, so shutdown
+wakes them at once) and report each finished cycle back through done().
+"""
+
+
+class Slot:
+    """One device's place in the schedule."""
+
+    def __init__(self, dev, interval, deadline):
+        self.dev = dev
+        self.interval = interval
+        self.deadline = deadline
+
+
+class Scheduler:
+    """Monotonic deadlines for a set of devices.
+
+    stagger is the device list the phases are spread over (default: devices), so
+    several schedulers - the asyncio engine runs one per bridge - can share one
+    stagger and still interleave.
+    """
+
+    def __init__(self, devices, default_interval, now, stagger=None):
+        stagger = list(stagger or devices)
+        self.slots = []
+        for dev in devices:
+            interval = float(dev.get("poll_interval") or default_interval)
+            position = next(i for i, other in enumerate(stagger) if other is dev)
+            phase = interval * position / len(stagger)
+            self.slots.append(Slot(dev, interval, now + phase))
+
+    def due(self, now, busy=None):
+        """The slots whose deadline has arrived, in config order, leaving out any that
+        busy(slot) says are still mid-cycle."""
+        return [slot for slot in self.slots
+                if slot.deadline <= now and not (busy and busy(slot))]
+
+    def next_wait(self, now, busy=None):
+        """Seconds until the earliest deadline of a slot that is not busy (0 if one has
+        already passed), or None if every slot is busy."""
+        deadlines = [slot.deadline for slot in self.slots if not (busy and busy(slot))]
+        return max(0.0, min(deadlines) - now) if deadlines else None
+
+    def done(self, slot, now):
+        """Advance a slot past a finished cycle; return how many deadlines it overran."""
+        slot.deadline += slot.interval
+        if slot.deadline > now:
+            return 0
+        missed = int((now - slot.deadline) // slot.interval) + 1
+        slot.deadline += missed * slot.interval
+        return missed
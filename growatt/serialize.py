@@ -0,0 +1,91 @@
+"""Payload encoders for the state and diagnostics topics.
+
+``mqtt.serializer`` picks how payloads are encoded:
+
+- ``json`` (default): stdlib json, byte-for-byte the payloads published before.
+- ``orjson``: the same JSON, compact (no spaces) and several times cheaper to
+  produce. Needs the optional orjson package; without it the poller warns once and
+  falls back to stdlib json.
+
+With ``mqtt.msgpack: true`` each state is also published as a MessagePack map on a
+parallel ``<prefix>/<serial>/state/msgpack`` topic: smaller than the JSON (binary
+numbers, no quoting) and cheap for telegraf to parse. Needs the optional msgpack
+package; without it the parallel topic is disabled with a warning.
+
+No encoder sorts keys or merges dicts: the state arrives already laid out in
+growatt.monitor.STATE_KEYS order (built once from the register tables), and every
+backend emits it in that order.
+"""
+
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+log = logging.getLogger("growatt")
+
+SERIALIZERS = ("json", "orjson")
+
+
+def _json_bytes(obj):
+    return json.dumps(obj).encode()
+
+
+def _orjson_bytes(obj):
+    # No OPT_SORT_KEYS: keys stay in the state's layout order.
+    return orjson.dumps(obj)
+
+
+def _msgpack_bytes(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def json_encoder(name="json"):
+    """The JSON encoder (obj -> bytes) for a serializer name, falling back to stdlib json
+    if the named one is not installed."""
+    if name not in SERIALIZERS:
+        raise ValueError("unknown mqtt.serializer %r (expected one of %s)"
+                         % (name, ", ".join(SERIALIZERS)))
+    if name == "orjson":
+        if orjson is not None:
+            return _orjson_bytes
+        log.warning("mqtt.serializer is orjson but orjson is not installed; using json")
+    return _json_bytes
+
+
+def msgpack_encoder():
+    """The MessagePack encoder (obj -> bytes), or None if msgpack is not installed."""
+    if msgpack is None:
+        log.warning("mqtt.msgpack is enabled but msgpack is not installed; not publishing "
+                    "the msgpack state topic")
+        return None
+    return _msgpack_bytes
+
+
+class Serializer:
+    """The configured encoders for one process, built once from the mqtt config."""
+
+    def __init__(self, mqtt_cfg):
+        self.encode = json_encoder(mqtt_cfg.get("serializer") or "json")
+        self.encode_msgpack = msgpack_encoder() if mqtt_cfg.get("msgpack") else None
+
+
+_SERIALIZERS = {}
+
+
+def get_serializer(mqtt_cfg):
+    """The Serializer for an mqtt config section, cached so it is built (and any
+    missing-package warning logged) once per process."""
+    key = (mqtt_cfg.get("serializer") or "json", bool(mqtt_cfg.get("msgpack")))
+    serializer = _SERIALIZERS.get(key)
+    if serializer is None:
+        serializer = _SERIALIZERS[key] = Serializer(mqtt_cfg)
+    return serializer
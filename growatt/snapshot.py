@@ -0,0 +1,69 @@
+"""The last merged state of each device, kept for GET /state.
+
+Every successful cycle replaces the device's ``StateSnapshot`` (in its stats dict,
+under "snapshot") with a new one carrying the next sequence number. The HTTP side
+never touches Modbus: it answers from the snapshot, with an ETag built from the
+sequence number (and a per-process id, so a restart's sequence numbers do not
+collide), so a client that already has the cycle gets a 304 without a body.
+
+A snapshot is immutable once built; the response bodies rendered from it, one per
+requested field list, are cached on it so concurrent readers of the same cycle share
+one encode.
+"""
+
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+# Distinguishes this process's ETags from an earlier run's equal sequence numbers.
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+# Distinct field lists cached per snapshot; others are encoded per request.
+_MAX_BODIES = 16
+
+
+class StateSnapshot:
+    """One cycle's merged state: sequence number, serial, wall-clock time and values."""
+
+    __slots__ = ("seq", "serial", "timestamp", "state", "_bodies", "_lock")
+
+    def __init__(self, seq, serial, state, timestamp=None):
+        self.seq = seq
+        self.serial = serial
+        self.state = state
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def etag(self, fields=None):
+        tag = "%s-%d" % (_BOOT_ID, self.seq)
+        if fields is not None:
+            tag += "-" + hashlib.sha1(",".join(fields).encode()).hexdigest()[:8]
+        return '"%s"' % tag
+
+    def body(self, device, fields=None):
+        """The GET /state response body for a field list (None: every field), encoded
+        once per snapshot."""
+        key = (device, None if fields is None else tuple(fields))
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is None:
+                state = (self.state if fields is None
+                         else {name: self.state.get(name) for name in fields})
+                body = json.dumps({"status": "success", "device": device,
+                                   "serial": self.serial, "seq": self.seq,
+                                   "timestamp": round(self.timestamp, 3),
+                                   "state": state}).encode()
+                if len(self._bodies) < _MAX_BODIES:
+                    self._bodies[key] = body
+            return body
+
+
+def record_snapshot(st, serial, state):
+    """Store a successful cycle's merged state as the device's next snapshot."""
+    previous = st.get("snapshot")
+    snapshot = st["snapshot"] = StateSnapshot(previous.seq + 1 if previous else 1,
+                                              serial, state)
+    return snapshot
@@ -0,0 +1,133 @@
+"""Server-Sent Events for GET /stream: each device's state pushed as its cycle completes.
+
+publish_cycle hands every successful cycle's StateSnapshot (growatt.snapshot) to
+``HUB``, which appends a reference to it to each connected client's buffer and wakes
+the client's writer. That is all the poll side does: no encoding, no socket I/O and no
+waiting on a client, so a stuck browser tab cannot hold up a cycle.
+
+Each client's buffer is a ``deque(maxlen=http.stream_buffer)``: a client that does not
+keep up loses its oldest events, never the poll loop's time or unbounded memory. The
+writer (a server thread, or a task on the asyncio engine's loop) renders the frames:
+
+- ``event: state`` carries the same JSON as GET /state (optionally only some fields);
+- with ``changes=1``, after a device's first event only ``event: changes`` frames with
+  the fields that differ from the last state this client was sent. The comparison is
+  against what the client actually received, so dropped events lose intermediate
+  values but never a change.
+
+Full-state frames reuse the snapshot's cached body, so the JSON for a cycle is encoded
+once however many clients are listening.
+"""
+
+import json
+import logging
+import threading
+from collections import deque
+
+log = logging.getLogger("growatt")
+
+# Sent between events so proxies keep the connection open and dead clients are noticed.
+KEEPALIVE = b": keepalive\n\n"
+
+
+class StreamClient:
+    """One GET /stream connection: its filters, bounded event buffer and render state.
+
+    devices is a set of hosts (None: every device), fields a list of state keys (None:
+    all). wake, if given, is called (from the poll side) after each event is buffered;
+    the asyncio front end uses it to hop onto its loop instead of blocking in take().
+    """
+
+    def __init__(self, devices=None, fields=None, changes=False, buffer=32, wake=None):
+        self.devices = devices
+        self.fields = fields
+        self.changes = changes
+        self.dropped = 0
+        self._events = deque(maxlen=max(1, buffer))
+        self._cond = threading.Condition()
+        self._wake = wake
+        self._closed = False
+        self._sent = {}  # device -> the last snapshot rendered for this client
+
+    def push(self, device, snapshot):
+        """Buffer an event without blocking, dropping the oldest if the buffer is full."""
+        if self.devices is not None and device not in self.devices:
+            return
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append((device, snapshot))
+            self._cond.notify()
+        if self._wake is not None:
+            try:
+                self._wake()
+            except RuntimeError:  # the asyncio loop has closed under us
+                pass
+
+    def take(self, timeout=0):
+        """Render every buffered event as SSE frames, waiting up to timeout seconds for
+        one; b"" if there was none (or none left after filtering)."""
+        with self._cond:
+            if not self._events and not self._closed and timeout:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+        return b"".join(self._frame(device, snapshot) for device, snapshot in events)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _frame(self, device, snapshot):
+        last = self._sent.get(device)
+        if last is not None and snapshot.seq <= last.seq:
+            return b""  # already sent (the initial state raced a new cycle)
+        self._sent[device] = snapshot
+        if not self.changes or last is None:
+            return b"event: state\ndata: " + snapshot.body(device, self.fields) + b"\n\n"
+        new, old = snapshot.state, last.state
+        changed = {name: new.get(name) for name in (self.fields or new)
+                   if new.get(name) != old.get(name)}
+        if not changed:
+            return b""
+        data = json.dumps({"device": device, "serial": snapshot.serial, "seq": snapshot.seq,
+                           "timestamp": round(snapshot.timestamp, 3), "changes": changed})
+        return b"event: changes\ndata: " + data.encode() + b"\n\n"
+
+
+class StreamHub:
+    """The connected GET /stream clients, fed by publish_cycle."""
+
+    def __init__(self):
+        # Replaced, never mutated, so publish() iterates it without taking the lock.
+        self._clients = ()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def subscribe(self, max_clients=16, **kwargs):
+        """A new StreamClient (kwargs as for StreamClient), or None if max_clients are
+        already connected."""
+        with self._lock:
+            if len(self._clients) >= max_clients:
+                return None
+            client = StreamClient(**kwargs)
+            self._clients += (client,)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients = tuple(c for c in self._clients if c is not client)
+        client.close()
+        if client.dropped:
+            log.info("Stream client disconnected after dropping %d events", client.dropped)
+
+    def publish(self, device, snapshot):
+        """Hand a device's new snapshot to every client; never blocks on one."""
+        for client in self._clients:
+            client.push(device, snapshot)
+
+
+HUB = StreamHub()
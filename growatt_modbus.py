@@ -10,23 +10,47 @@ control side can reuse them.
 import os
 import re
 import time
-import json
+import types
 import signal
+import asyncio
 import logging
 import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import paho.mqtt.client as mqtt
-from pymodbus.client import ModbusTcpClient
 
 from growatt.config import load_config, device_framer
-from growatt.registers import SENSOR_META
-from growatt.client import get_inverter_serial_number, sync_inverter_time
+from growatt.registers import sensor_deadbands
+from growatt.client import (
+    READ_HOLDING,
+    arun_requests,
+    decode_serial_number,
+    run_requests,
+    sync_time_requests,
+)
 from growatt.monitor import (
-    read_inverter_holding_registers,
-    read_inverter_input_registers,
+    block_label,
+    due_tiers,
+    mark_tiers_read,
+    merge_state,
+    read_set,
+    value_cache,
 )
-from growatt._modbus_lock import MODBUS_LOCK
-from growatt.http_api import make_http_server
+from growatt._modbus_lock import bridge_key
+from growatt.pool import make_pool
+from growatt.http_api import attach_state, make_http_server, start_async_http_server
+from growatt.commands import CommandHandler
+from growatt.jobs import make_job_queue
+from growatt.aio import AsyncEngine, attach_mqtt
+from growatt.schedule import Scheduler
+from growatt.publisher import Publisher
+from growatt.discovery import Discovery, diagnostics_topic
+from growatt.serialize import get_serializer
+from growatt.adaptive import make_link_health
+from growatt import metrics, stream
+from growatt.history import device_history
+from growatt.snapshot import record_snapshot
+from growatt.recorder import close_recorder, get_recorder
 
 logging.basicConfig(
     level=os.environ.get("LOG_LEVEL", "INFO").upper(),
@@ -34,90 +58,37 @@ logging.basicConfig(
 )
 log = logging.getLogger("growatt")
 
-# Set by the signal handler so the main loop can exit cleanly on docker stop.
-_shutdown = False
+# Set by the signal handler so the main loop can exit cleanly on docker stop; the
+# scheduler waits on it, so setting it wakes the loop at once.
+_shutdown = threading.Event()
 
 
 def _handle_signal(signum, _frame):
-    global _shutdown
     log.info("Received signal %s, shutting down after this cycle", signum)
-    _shutdown = True
+    _shutdown.set()
 
 
 # ---------------------------------------------------------------------------
 # MQTT
 # ---------------------------------------------------------------------------
-def make_mqtt_client(mqtt_cfg):
-    """Create and connect a persistent MQTT client."""
+def make_mqtt_client(mqtt_cfg, loop=None):
+    """Create and connect a persistent MQTT client.
+
+    With an asyncio loop, the client's socket is serviced by that loop (growatt.aio)
+    instead of paho's own network thread.
+    """
     client = mqtt.Client(client_id="growatt", callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
     if mqtt_cfg.get("username"):
         client.username_pw_set(mqtt_cfg["username"], mqtt_cfg.get("password"))
+    if loop is not None:
+        client.gw_housekeeping = attach_mqtt(client, loop)
     client.connect(mqtt_cfg["broker"], mqtt_cfg["port"])
-    client.loop_start()
+    if loop is None:
+        client.loop_start()
     return client
 
 
-# Read-health counters published to a separate per-device diagnostics topic (every cycle,
-# including failed ones). Lets us watch how often / when a dongle garbles or drops frames,
-# so we can decide whether to swap it back for the (very reliable) EW11.
-# key -> (HA name, state_class). Totals are monotonic counters; HA handles restarts.
-DIAGNOSTIC_SENSORS = {
-    "readErrorsTotal":  ("Garbled reads", "total_increasing"),
-    "pollSkippedTotal": ("Skipped polls", "total_increasing"),
-    "pollOkTotal":      ("Successful polls", "total_increasing"),
-    "lastCycleRetries": ("Last poll retries", "measurement"),
-}
-
-
-def diagnostics_topic(mqtt_cfg, serial):
-    return f"{mqtt_cfg['topic_prefix']}/{serial}/diagnostics"
-
-
-def publish_discovery(client, mqtt_cfg, serial, device_name):
-    """Publish Home Assistant MQTT discovery configs for known sensors."""
-    prefix = mqtt_cfg["discovery_prefix"]
-    state_topic = f"{mqtt_cfg['topic_prefix']}/{serial}/state"
-    device = {
-        "identifiers": [serial],
-        "manufacturer": "Growatt",
-        "name": f"Growatt {device_name or serial}",
-    }
-    for key, (name, device_class, unit, state_class) in SENSOR_META.items():
-        config = {
-            "name": name,
-            "unique_id": f"{serial}_{key}",
-            "object_id": f"growatt_{serial}_{key}",
-            "state_topic": state_topic,
-            "value_template": f"{{{{ value_json.{key} }}}}",
-            "state_class": state_class,
-            "device": device,
-        }
-        if device_class:
-            config["device_class"] = device_class
-        if unit:
-            config["unit_of_measurement"] = unit
-        topic = f"{prefix}/sensor/{serial}_{key}/config"
-        client.publish(topic, json.dumps(config), retain=True)
-    # Read-health diagnostics: separate state topic, marked as diagnostic entities.
-    diag_topic = diagnostics_topic(mqtt_cfg, serial)
-    for key, (name, state_class) in DIAGNOSTIC_SENSORS.items():
-        config = {
-            "name": name,
-            "unique_id": f"{serial}_{key}",
-            "object_id": f"growatt_{serial}_{key}",
-            "state_topic": diag_topic,
-            "value_template": f"{{{{ value_json.{key} }}}}",
-            "state_class": state_class,
-            "entity_category": "diagnostic",
-            "device": device,
-        }
-        topic = f"{prefix}/sensor/{serial}_{key}/config"
-        client.publish(topic, json.dumps(config), retain=True)
-    log.info("Published HA discovery for %s (%d sensors + %d diagnostics)",
-             serial, len(SENSOR_META), len(DIAGNOSTIC_SENSORS))
-
-
-def publish_diagnostics(client, mqtt_cfg, st):
+def publish_diagnostics(client, mqtt_cfg, st, link_stats=None):
     """Publish a device's read-health counters (retained) so HA/Grafana can track flakiness.
 
     No-op until we have resolved the serial at least once, since the diagnostic entities hang
@@ -133,146 +104,448 @@ def publish_diagnostics(client, mqtt_cfg, st):
         "pollSkippedTotal": st["pollSkippedTotal"],
         "pollOkTotal": st["pollOkTotal"],
         "lastCycleRetries": st["lastCycleRetries"],
+        # Scheduled cycles skipped because the previous one ran past their deadline.
+        "pollOverrunsTotal": st["pollOverrunsTotal"],
+        # States not re-published because nothing moved past its deadband (change_only).
+        "statePublishSkippedTotal": st["statePublishSkippedTotal"],
+        # Cumulative re-reads per register block, e.g. {"input_1108": 3}: which block
+        # a flaky dongle garbles.
+        "blockRetries": dict(st.get("blockRetries") or {}),
+        # Persistent-connection health for the device's bridge (see growatt.pool) and
+        # the device's adaptive timeout / backoff state (see growatt.adaptive).
+        **(link_stats or {}),
     }
-    client.publish(diagnostics_topic(mqtt_cfg, serial), json.dumps(payload), retain=True)
+    if isinstance(client, Publisher):
+        # Process-wide publish queue depth and latency (see growatt.publisher).
+        payload.update(client.stats())
+    client.publish(diagnostics_topic(mqtt_cfg, serial), get_serializer(mqtt_cfg).encode(payload),
+                   retain=True)
 
 
 # ---------------------------------------------------------------------------
 # Main loop
 # ---------------------------------------------------------------------------
-def poll_device(dev, config, mqtt_client, discovered, stats):
-    """Poll a single inverter, publish its data, and track read-health counters."""
-    host = dev["host"]
-    st = stats.setdefault(host, {
+def device_stats(stats, host):
+    """The read-health counters for a device, created on first use."""
+    return stats.setdefault(host, {
         "serial": None,
         "readErrorsTotal": 0,
         "pollSkippedTotal": 0,
         "pollOkTotal": 0,
         "lastCycleRetries": 0,
+        "pollOverrunsTotal": 0,
+        "statePublishSkippedTotal": 0,
         # Wall/monotonic clock of the last fully-successful read; drives /health.
         "lastGoodReadMonotonic": None,
     })
-    mqtt_cfg = config["mqtt"]
 
-    # Serialise the whole Modbus session (connect -> reads -> close) against the control
-    # endpoint, which shares this process and the same dongle. The dongle bridges every
-    # TCP connection onto one serial line with no framing, so two concurrent sessions
-    # garble each other. Holding the lock for the full session = only one connection ever.
-    with MODBUS_LOCK:
-        # retries + a slightly longer timeout: raw RTU-over-TCP dongles occasionally drop or
-        # garble a frame (no on-device retry/reassembly like the EW11 had).
-        client = ModbusTcpClient(host=host, port=dev.get("port", 502),
-                                 framer=device_framer(dev), timeout=5, retries=3)
-        if not client.connect():
+
+def device_link(st, config):
+    """The device's latency/timeout/backoff tracker (growatt.adaptive), created on first use."""
+    link = st.get("link")
+    if link is None:
+        link = st["link"] = make_link_health(config)
+    return link
+
+
+def poll_cycle(dev, config, st, read_retries=None):
+    """The Modbus half of one poll cycle, as a request generator (see growatt.client).
+
+    Driven by run_requests in the threaded engine and arun_requests in the asyncio
+    engine, so both share one copy of this logic. Updates the read-health counters in
+    st and returns (serial, state), or None to skip the cycle. Only the poll tiers that
+    are due are read (see growatt.monitor); the rest of state comes from st["values"].
+    read_retries overrides the configured attempts (a backoff probe makes just one).
+    """
+    host = dev["host"]
+    # An inverter's serial never changes, so resolve it once and then reuse the cached
+    # value every cycle. Re-reading it each poll was wasted work and, worse, a single
+    # garbled serial frame would throw away an otherwise-good cycle (the dominant cause
+    # of the per-inverter metric gaps on the flakier dongle). It can also be pinned in
+    # config (`serial:` per device) to skip even the first read.
+    serial_number = st["serial"] or dev.get("serial")
+    if not serial_number:
+        serial_number = decode_serial_number((yield (READ_HOLDING, 23, 5))).strip()
+        # Guard against a garbled/blank serial read: publishing under it would create a
+        # phantom HA device (e.g. 'unknown_serial') with retained entities. Skip the
+        # cycle until we get one clean read; thereafter we never read it again.
+        if not re.fullmatch(r"[A-Za-z0-9]{6,}", serial_number) or serial_number == "unknown_serial":
+            log.warning("Bad/blank serial from %s (%r), skipping cycle until a clean read",
+                        host, serial_number)
+            st["pollSkippedTotal"] += 1
+            return None
+    if not st["serial"]:
+        st["serial"] = serial_number
+        log.info("Device %s serial number: %s (cached; not re-read each cycle)",
+                 host, serial_number)
+
+    if config["time_sync"]["enabled"]:
+        yield from sync_time_requests(config["time_sync"]["max_drift_seconds"])
+
+    # All-or-nothing: a failed/short read returns None (see client.py); skip the cycle
+    # rather than publish partial data (and don't poison `discovery` / retained state).
+    # A single garbled frame is common on the RTU-over-TCP dongles and pymodbus' own
+    # retries don't catch it, so re-read a few times before giving up, tallying each
+    # failed attempt so we can watch dongle health over time. Reads are block-granular:
+    # blocks that came back clean are kept, and each further attempt re-issues only the
+    # ones that failed, so one garbled frame costs one block's bus time, not six.
+    if read_retries is None:
+        read_retries = config.get("read_retries", 3)
+    now = time.monotonic()
+    reads = read_set(due_tiers(st, config.get("poll_tiers") or {}, now))
+    plan = reads.plan
+    blocks = [None] * len(plan)
+    block_retries = st.setdefault("blockRetries", {})
+    attempts_used = 0
+    for attempt in range(1, read_retries + 1):
+        attempts_used = attempt
+        for index, block in enumerate(plan):
+            if blocks[index] is None:
+                if attempt > 1:
+                    label = block_label(block)
+                    block_retries[label] = block_retries.get(label, 0) + 1
+                blocks[index] = yield block
+        if None not in blocks:
+            break
+        st["readErrorsTotal"] += 1
+        log.warning("Incomplete read from %s (attempt %d/%d, %d block(s) failed)",
+                    host, attempt, read_retries, blocks.count(None))
+    if None in blocks:
+        log.warning("Giving up on %s after %d attempt(s), skipping cycle",
+                    host, read_retries)
+        st["pollSkippedTotal"] += 1
+        return None
+    cache = st.get("values")
+    if cache is None:
+        cache = st["values"] = value_cache()
+    state = merge_state(cache, reads, blocks, serial_number)
+    # The raw registers behind this state, for the recorder (and anything else that
+    # wants to re-decode them).
+    st["lastBlocks"] = (plan, blocks)
+
+    mark_tiers_read(st, reads.tiers, now)
+    st["pollOkTotal"] += 1
+    st["lastCycleRetries"] = attempts_used - 1
+    st["lastGoodReadMonotonic"] = time.monotonic()
+    return serial_number, state
+
+
+def state_changed(previous, state, deadbands):
+    """True if any field of state moved past its deadband since the previous state."""
+    if previous is None or previous.keys() != state.keys():
+        return True
+    for key, value in state.items():
+        old = previous[key]
+        if value == old:
+            continue
+        band = deadbands.get(key)
+        if (band is None or isinstance(value, str) or isinstance(old, str)
+                or abs(value - old) > band):
+            return True
+    return False
+
+
+def publish_cycle(dev, config, mqtt_client, discovery, st, result, link_stats):
+    """Publish one cycle's outcome: state + discovery on success, diagnostics always.
+
+    A successful cycle is also kept as the device's snapshot (GET /state), pushed to
+    any GET /stream clients and kept in its history and, if enabled, its raw blocks are
+    appended to the recorder.
+    """
+    mqtt_cfg = config["mqtt"]
+    if result is None:
+        publish_diagnostics(mqtt_client, mqtt_cfg, st, link_stats)
+        return
+    serial_number, state = result
+
+    # The merged state as served by GET /state, with this cycle's sequence number,
+    # and buffered for the GET /stream clients (growatt.stream; never blocks).
+    stream.HUB.publish(dev["host"], record_snapshot(st, serial_number, state))
+    # Keep the cycle in the device's in-memory history (GET /history).
+    history = device_history(st, config, dev)
+    if history is not None:
+        history.append(time.time(), state)
+    recorder = get_recorder(config)
+    if recorder is not None:
+        recorder.record(dev["host"], *st["lastBlocks"])
+
+    retain = mqtt_cfg["retain"]
+
+    # Per-device topic: merged holding+input state, retained. This is the single
+    # source consumed by telegraf and Home Assistant (discovery + manual sensors).
+    # In change-only mode the state is skipped while every field sits within its
+    # deadband of the last published one, except for a full publish every heartbeat.
+    now = time.monotonic()
+    last_sent = st.get("lastStatePublishMonotonic")
+    if (mqtt_cfg.get("change_only") and last_sent is not None
+            and now - last_sent < mqtt_cfg.get("heartbeat_seconds", 300)
+            and not state_changed(st.get("lastPublishedState"), state,
+                                  sensor_deadbands(mqtt_cfg.get("deadbands")))):
+        st["statePublishSkippedTotal"] += 1
+    else:
+        state_topic = f"{mqtt_cfg['topic_prefix']}/{serial_number}/state"
+        serializer = get_serializer(mqtt_cfg)
+        mqtt_client.publish(state_topic, serializer.encode(state), retain=retain)
+        if serializer.encode_msgpack is not None:
+            # Parallel compact copy for telegraf (mqtt.msgpack; see growatt.serialize).
+            mqtt_client.publish(state_topic + "/msgpack", serializer.encode_msgpack(state),
+                                retain=retain)
+        st["lastPublishedState"] = state
+        st["lastStatePublishMonotonic"] = now
+
+    publish_diagnostics(mqtt_client, mqtt_cfg, st, link_stats)
+
+    # HA discovery: only the configs the broker does not already hold (growatt.discovery).
+    if mqtt_cfg["discovery"]:
+        discovery.publish(mqtt_client, serial_number, dev.get("name"))
+
+
+def poll_device(dev, config, mqtt_client, discovery, stats, pool):
+    """Poll a single inverter, publish its data, and track read-health counters."""
+    host, port = bridge_key(dev)
+    st = device_stats(stats, host)
+    link = device_link(st, config)
+    if link.backing_off(time.monotonic()):
+        # Failing repeatedly: leave the bridge to the other devices until the backoff
+        # expires; the next cycle is then a single quick probe.
+        st["pollSkippedTotal"] += 1
+        publish_cycle(dev, config, mqtt_client, discovery, st, None,
+                      {**pool.stats(host, port), **link.stats(time.monotonic())})
+        return
+    probing = link.probing()
+
+    # Serialise the whole Modbus session (reads under one connection) against the control
+    # endpoint and any other device on the same bridge. The dongle bridges every TCP
+    # connection onto one serial line with no framing, so two concurrent sessions garble
+    # each other. The pool holds the bridge's lock for the full session = only one
+    # connection per dongle ever, kept open across cycles; other bridges are not held up.
+    # The session uses the device's adaptive timeout; a probe gets no pymodbus retries
+    # and a single read attempt, so a still-dead device costs as little bus time as possible.
+    with pool.session(host, port, device_framer(dev), timeout=link.timeout(),
+                      retries=0 if probing else link.retries) as client:
+        started = time.monotonic()
+        if client is None:
             log.warning("Failed to connect to Modbus device %s", host)
             st["pollSkippedTotal"] += 1
-            publish_diagnostics(mqtt_client, mqtt_cfg, st)
-            return
+            result = None
+        else:
+            result = run_requests(poll_cycle(dev, config, st, 1 if probing else None),
+                                  client, observe=link.observe)
+        if metrics.ENABLED:
+            metrics.POLL_CYCLE.observe(time.monotonic() - started, host)
+    link.record(result is not None, time.monotonic())
+    # Publish after the bridge is released; mqtt_client is the Publisher, so this only
+    # queues the messages and a slow broker cannot hold up the next session.
+    publish_cycle(dev, config, mqtt_client, discovery, st, result,
+                  {**pool.stats(host, port), **link.stats(time.monotonic())})
+
+
+def record_cycle(scheduler, slot, stats):
+    """Advance a device's schedule after a cycle, counting any deadlines it overran."""
+    missed = scheduler.done(slot, time.monotonic())
+    if missed:
+        device_stats(stats, slot.dev["host"])["pollOverrunsTotal"] += missed
+        log.warning("Poll of %s overran its %gs interval, skipping %d cycle(s)",
+                    slot.dev["host"], slot.interval, missed)
+
+
+def poll_bridge(slots, config, mqtt_client, discovery, stats, pool, scheduler):
+    """Poll, one after another, the due devices that share a single bridge."""
+    for slot in slots:
         try:
-            # An inverter's serial never changes, so resolve it once and then reuse the cached
-            # value every cycle. Re-reading it each poll was wasted work and, worse, a single
-            # garbled serial frame would throw away an otherwise-good cycle (the dominant cause
-            # of the per-inverter metric gaps on the flakier dongle). It can also be pinned in
-            # config (`serial:` per device) to skip even the first read.
-            serial_number = st["serial"] or dev.get("serial")
-            if not serial_number:
-                serial_number = (get_inverter_serial_number(client) or "").strip()
-                # Guard against a garbled/blank serial read: publishing under it would create a
-                # phantom HA device (e.g. 'unknown_serial') with retained entities. Skip the
-                # cycle until we get one clean read; thereafter we never read it again.
-                if not re.fullmatch(r"[A-Za-z0-9]{6,}", serial_number) or serial_number == "unknown_serial":
-                    log.warning("Bad/blank serial from %s (%r), skipping cycle until a clean read",
-                                host, serial_number)
-                    st["pollSkippedTotal"] += 1
-                    publish_diagnostics(mqtt_client, mqtt_cfg, st)
-                    return
-            if not st["serial"]:
-                st["serial"] = serial_number
-                log.info("Device %s serial number: %s (cached; not re-read each cycle)",
-                         host, serial_number)
-
-            if config["time_sync"]["enabled"]:
-                sync_inverter_time(client, config["time_sync"]["max_drift_seconds"])
-
-            # All-or-nothing: a failed/short read returns None (see client.py); skip the cycle
-            # rather than publish partial data (and don't poison `discovered` / retained state).
-            # A single garbled frame is common on the RTU-over-TCP dongles and pymodbus' own
-            # retries don't catch it, so re-read a few times before giving up, tallying each
-            # failed attempt so we can watch dongle health over time.
-            read_retries = config.get("read_retries", 3)
-            holding_registers = input_registers = None
-            attempts_used = 0
-            for attempt in range(1, read_retries + 1):
-                attempts_used = attempt
-                holding_registers = read_inverter_holding_registers(client)
-                input_registers = read_inverter_input_registers(client)
-                if holding_registers is not None and input_registers is not None:
-                    break
-                st["readErrorsTotal"] += 1
-                log.warning("Incomplete read from %s (attempt %d/%d)",
-                            host, attempt, read_retries)
-            if holding_registers is None or input_registers is None:
-                log.warning("Giving up on %s after %d attempt(s), skipping cycle",
-                            host, read_retries)
-                st["pollSkippedTotal"] += 1
-                publish_diagnostics(mqtt_client, mqtt_cfg, st)
-                return
-
-            st["pollOkTotal"] += 1
-            st["lastCycleRetries"] = attempts_used - 1
-            st["lastGoodReadMonotonic"] = time.monotonic()
-            holding_registers['serialNumber'] = serial_number
-            input_registers['serialNumber'] = serial_number
-
-            retain = mqtt_cfg["retain"]
-
-            # Per-device topic: merged holding+input state, retained. This is the single
-            # source consumed by telegraf and Home Assistant (discovery + manual sensors).
-            state = {**holding_registers, **input_registers}
-            state_topic = f"{mqtt_cfg['topic_prefix']}/{serial_number}/state"
-            mqtt_client.publish(state_topic, json.dumps(state), retain=retain)
-
-            publish_diagnostics(mqtt_client, mqtt_cfg, st)
-
-            # Publish HA discovery once per serial per run.
-            if mqtt_cfg["discovery"] and serial_number not in discovered:
-                publish_discovery(mqtt_client, mqtt_cfg, serial_number, dev.get("name"))
-                discovered.add(serial_number)
-        finally:
-            client.close()
+            poll_device(slot.dev, config, mqtt_client, discovery, stats, pool)
+        except Exception as e:
+            log.exception("Unexpected error polling %s: %s", slot.dev.get("host"), e)
+        record_cycle(scheduler, slot, stats)
+
+
+def group_by_bridge(devices):
+    """Group device configs by (host, port), keeping config order within each bridge."""
+    bridges = {}
+    for dev in devices:
+        bridges.setdefault(bridge_key(dev), []).append(dev)
+    return list(bridges.values())
+
+
+# ---------------------------------------------------------------------------
+# asyncio engine (engine: async)
+# ---------------------------------------------------------------------------
+async def apoll_device(dev, config, mqtt_client, discovery, stats, engine):
+    """poll_device for the asyncio engine: same cycle, over the bridge's async client."""
+    host, port = bridge_key(dev)
+    st = device_stats(stats, host)
+    bridge = engine.bridge(host, port, device_framer(dev))
+    link = device_link(st, config)
+    if link.backing_off(time.monotonic()):
+        st["pollSkippedTotal"] += 1
+        publish_cycle(dev, config, mqtt_client, discovery, st, None,
+                      {**bridge.stats(), **link.stats(time.monotonic())})
+        return
+    probing = link.probing()
+    async with bridge.session(timeout=link.timeout(),
+                              retries=0 if probing else link.retries) as client:
+        started = time.monotonic()
+        if client is None:
+            log.warning("Failed to connect to Modbus device %s", host)
+            st["pollSkippedTotal"] += 1
+            result = None
+        else:
+            result = await arun_requests(poll_cycle(dev, config, st, 1 if probing else None),
+                                         client, observe=link.observe)
+        if metrics.ENABLED:
+            metrics.POLL_CYCLE.observe(time.monotonic() - started, host)
+    link.record(result is not None, time.monotonic())
+    # paho's publish() only buffers here (the loop services its socket), so publishing
+    # on the loop is cheap; it still happens after the bridge is released.
+    publish_cycle(dev, config, mqtt_client, discovery, st, result,
+                  {**bridge.stats(), **link.stats(time.monotonic())})
+
+
+async def apoll_bridge(devs, config, mqtt_client, discovery, stats, engine, stop):
+    """One task per bridge: poll its devices on their schedules until stop is set."""
+    # Staggered over every configured device, so the bridges' tasks interleave too.
+    scheduler = Scheduler(devs, config["poll_interval"], time.monotonic(),
+                          stagger=config["devices"])
+    while not stop.is_set():
+        due = scheduler.due(time.monotonic())
+        if not due:
+            try:
+                await asyncio.wait_for(stop.wait(), scheduler.next_wait(time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            continue
+        for slot in due:
+            try:
+                await apoll_device(slot.dev, config, mqtt_client, discovery, stats, engine)
+            except Exception as e:
+                log.exception("Unexpected error polling %s: %s", slot.dev.get("host"), e)
+            record_cycle(scheduler, slot, stats)
+
+
+async def async_main(config):
+    """Run the poller on one event loop: a task per bridge, MQTT and HTTP on the loop too."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    mqtt_client = make_mqtt_client(config["mqtt"], loop=loop)
+    discovery = Discovery(config["mqtt"], mqtt_client)
+    stats = {}
+    engine = AsyncEngine(config, loop)
+    # One control job queue for the HTTP routes and the MQTT command topics.
+    jobs = make_job_queue(config)
+    http_server = await start_async_http_server(config, mqtt_client, stats,
+                                                engine.control_blocking, discovery, jobs)
+    if config["mqtt"].get("commands"):
+        ctx = attach_state(types.SimpleNamespace(), config, mqtt_client, stats,
+                           engine.control_blocking, discovery, jobs)
+        # Results are published from the job worker thread; paho is driven by the loop.
+        CommandHandler(ctx, mqtt_client, call=loop.call_soon_threadsafe).start()
+
+    bridges = group_by_bridge(config["devices"])
+    log.info("Polling %d device(s) on %d bridge(s) every %ss (asyncio engine)",
+             len(config["devices"]), len(bridges), config["poll_interval"])
+    tasks = [asyncio.create_task(apoll_bridge(devs, config, mqtt_client, discovery,
+                                              stats, engine, stop))
+             for devs in bridges]
+    try:
+        await stop.wait()
+        log.info("Shutting down")
+        await asyncio.gather(*tasks)
+    finally:
+        http_server.close()
+        engine.close()
+        close_recorder()
+        mqtt_client.gw_housekeeping.cancel()
+        mqtt_client.disconnect()
+        log.info("Stopped")
 
 
 def main():
+    config = load_config()
+    # Build the payload encoders now, so a bad mqtt.serializer stops startup.
+    get_serializer(config["mqtt"])
+    if config.get("engine") == "async":
+        asyncio.run(async_main(config))
+        return
+
     signal.signal(signal.SIGTERM, _handle_signal)
     signal.signal(signal.SIGINT, _handle_signal)
 
-    config = load_config()
     mqtt_client = make_mqtt_client(config["mqtt"])
-    discovered = set()
+    # Poll cycles hand their messages to this queue rather than publishing under the
+    # bridge lock; its thread feeds paho.
+    publisher = Publisher(mqtt_client, config["mqtt"].get("publish_queue_size", 1000))
+    discovery = Discovery(config["mqtt"], mqtt_client)
     stats = {}  # per-host read-health counters, surfaced as HA diagnostic sensors
+    # One persistent connection per bridge, shared by the poll loop and the HTTP control
+    # endpoint; sessions borrow it under the bridge lock.
+    pool = make_pool(config)
 
     # Control + health HTTP endpoint (formerly a separate lighttpd/CGI container). Runs in
-    # a daemon thread; it shares `stats` (for /health) and the global Modbus lock with the
-    # poll loop below, so control writes can never collide with a poll on the dongle.
-    http_server = make_http_server(config, mqtt_client, stats)
+    # a daemon thread; it shares `stats` (for /health) and the per-bridge Modbus locks with
+    # the poll loop below, so control writes can never collide with a poll on the dongle.
+    http_server = make_http_server(config, mqtt_client, stats, pool, discovery)
     threading.Thread(target=http_server.serve_forever, name="http", daemon=True).start()
+    if config["mqtt"].get("commands"):
+        # MQTT command topics share the server's context, so its control job queue too.
+        CommandHandler(http_server, mqtt_client, publisher).start()
+
+    # Concurrent mode: with poll_workers > 1, devices behind *different* bridges are polled
+    # in parallel by a bounded worker pool (one task per bridge per cycle). Devices sharing a
+    # bridge stay sequential within their task, and the per-bridge lock still keeps control
+    # sessions off a dongle that is being polled.
+    bridges = group_by_bridge(config["devices"])
+    workers = min(max(1, int(config.get("poll_workers") or 1)), len(bridges))
+    executor = (ThreadPoolExecutor(max_workers=workers, thread_name_prefix="poll")
+                if workers > 1 else None)
+
+    # Each device polls on its own grid of monotonic deadlines (see growatt.schedule), so
+    # the period does not stretch by the time the polls themselves take.
+    scheduler = Scheduler(config["devices"], config["poll_interval"], time.monotonic())
+
+    log.info("Polling %d device(s) on %d bridge(s) every %ss with %d worker(s)",
+             len(config["devices"]), len(bridges), config["poll_interval"], workers)
+    # Concurrent mode: bridge -> the future of its cycle still running. A slow or dead
+    # bridge is not resubmitted until it finishes, and nobody else waits for it: its
+    # late finish shows up as its own overruns.
+    in_flight = {}
+
+    def busy(slot):
+        return bridge_key(slot.dev) in in_flight
 
-    log.info("Polling %d device(s) every %ss",
-             len(config["devices"]), config["poll_interval"])
     try:
-        while not _shutdown:
-            for dev in config["devices"]:
-                try:
-                    poll_device(dev, config, mqtt_client, discovered, stats)
-                except Exception as e:
-                    log.exception("Unexpected error polling %s: %s", dev.get("host"), e)
-            # Sleep in short slices so a signal interrupts us promptly.
-            for _ in range(config["poll_interval"]):
-                if _shutdown:
-                    break
-                time.sleep(1)
+        while not _shutdown.is_set():
+            for key in [key for key, future in in_flight.items() if future.done()]:
+                del in_flight[key]
+            due = scheduler.due(time.monotonic(), busy)
+            if not due:
+                timeout = scheduler.next_wait(time.monotonic(), busy)
+                if in_flight:
+                    wait(list(in_flight.values()), timeout=timeout,
+                         return_when=FIRST_COMPLETED)
+                else:
+                    _shutdown.wait(timeout)
+                continue
+            # One publish-latency window per round, shared by every device's diagnostics.
+            publisher.roll()
+            due_bridges = {}
+            for slot in due:
+                due_bridges.setdefault(bridge_key(slot.dev), []).append(slot)
+            for key, slots in due_bridges.items():
+                if executor is None:
+                    poll_bridge(slots, config, publisher, discovery, stats, pool, scheduler)
+                else:
+                    in_flight[key] = executor.submit(poll_bridge, slots, config, publisher,
+                                                     discovery, stats, pool, scheduler)
     finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
         http_server.shutdown()
+        pool.close_all()
+        publisher.close()
+        close_recorder()
         mqtt_client.loop_stop()
         mqtt_client.disconnect()
         log.info("Stopped")
@@ -0,0 +1,15 @@
+"""A local Growatt SPH simulator, for exercising the poller and control without an inverter.
+
+``Inverter`` holds one unit's register tables (the SPH read windows, the serial
+number, a running RTC that accepts the 2-digit-year clock write) and can evolve
+plausible values over time or replay recorded ``old_fields.json``-style states.
+``SimServer`` serves one or more of them over Modbus TCP (MBAP) or RTU over TCP,
+with optional latency, short frames, garbled frames and dropped connections.
+
+    python -m growatt_sim --port 5020 [--framer rtu] [--latency 0.05] [--garble 0.02]
+"""
+
+from .model import Inverter, load_snapshots
+from .server import Faults, SimServer
+
+__all__ = ["Inverter", "load_snapshots", "Faults", "SimServer"]
@@ -0,0 +1,62 @@
+"""Run the simulator from the command line (see growatt_sim for the options)."""
+
+import asyncio
+import logging
+import argparse
+
+from .model import Inverter, load_snapshots
+from .server import Faults, SimServer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate Growatt SPH inverters over Modbus.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5020)
+    parser.add_argument("--framer", choices=("socket", "rtu"), default="socket",
+                        help="socket = Modbus TCP / MBAP (EW11), rtu = RTU over TCP (dongle)")
+    parser.add_argument("--units", type=int, default=1,
+                        help="simulate this many inverters, unit ids 1..N")
+    parser.add_argument("--serial", default="WCK0CDE013",
+                        help="serial number of unit 1 (later units get a numeric suffix)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added per response")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="up to this many seconds more, uniformly random")
+    parser.add_argument("--short", type=float, default=0.0, help="probability of a short frame")
+    parser.add_argument("--garble", type=float, default=0.0,
+                        help="probability of a garbled frame")
+    parser.add_argument("--drop", type=float, default=0.0,
+                        help="probability of dropping the connection instead of answering")
+    parser.add_argument("--replay", help="serve the recorded states in this file, in turn "
+                                             "(with several serials, one per unit)")
+    parser.add_argument("--replay-interval", type=float, default=10.0,
+                        help="seconds per replayed state")
+    parser.add_argument("--static", action="store_true", help="do not evolve values")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    snapshots = load_snapshots(args.replay) if args.replay else []
+    serials = list(dict.fromkeys(s["serialNumber"] for s in snapshots if "serialNumber" in s))
+    units = {}
+    for unit in range(1, args.units + 1):
+        serial = args.serial if unit == 1 else "%s%d" % (args.serial[:-len(str(unit))], unit)
+        inverter = Inverter(serial, evolve=not args.static, seed=args.seed)
+        if snapshots:
+            recorded = serials[(unit - 1) % len(serials)] if len(serials) > 1 else None
+            inverter.replay([s for s in snapshots if s.get("serialNumber") in (recorded, None)]
+                            if recorded else snapshots, args.replay_interval)
+        units[unit] = inverter
+    faults = Faults(args.latency, args.jitter, args.short, args.garble, args.drop, args.seed)
+    server = SimServer(units, args.framer, faults)
+
+    async def run():
+        await (await server.serve(args.host, args.port)).serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""The simulated inverter: SPH register tables, a running RTC and evolving values.
+
+Registers are kept raw, exactly as the inverter would serve them, in one uint16 array
+per table covering ``growatt.registers.READ_WINDOWS``. Values are set by field name
+through the same Field table the poller decodes with, so a state written here reads
+back through ``growatt.monitor`` as the same state (to the field's rounding).
+"""
+
+import json
+import math
+import random
+import datetime
+from array import array
+
+from growatt.registers import HOLDING_FIELDS, INPUT_FIELDS, READ_WINDOWS
+
+FIELDS = {field.name: field for field in HOLDING_FIELDS + INPUT_FIELDS}
+
+SERIAL_ADDRESS = 23
+RTC_ADDRESS = 45
+
+# A plausible idle SPH 3600 with a 10 kWh pack, in decoded units.
+DEFAULT_STATE = {
+    "maxOutputActivePower": 100, "inverterPowerFactor": 10000, "NormalPower": 3600,
+    "inverterNormalVoltage": 2300, "firmwareVersionH": 16978, "firmwareVersionM": 12337,
+    "firmwareVersionL": 12336, "controllerVersionH": 20047, "controllerVersionM": 12337,
+    "controllerVersionL": 12340, "lcdLanguage": 1, "exportLimitRate": 1000,
+    "numBatteryModules": 4, "vbatStopCharge": 5800, "vbatStopDischarge": 4600,
+    "priorityMode": 0, "battType": 1, "exportToGridRatePercent": 100,
+    "exportToGridStopDischargePercent": 25, "batFirstChargeRate": 100,
+    "batFirstStopChargeSOC": 100, "acChargeEnabled": 1,
+    "inverterStatus": 1, "gridFreq": 50.0, "gridVolt": 240.0, "inverterTemperature": 30.0,
+    "IPMTemperature": 28.0, "boostTemperature": 29.0, "inverterPowerFactorNow": 10000,
+    "systemWorkMode": 5, "battVoltage": 52.0, "battSOC": 60, "battTemperature": 20,
+    "epsFreq": 0, "epsVolt": 235.0, "epsPowerFactor": 1000, "bmsStatus": 353, "bmsSOC": 60,
+    "bmsDeltaV": 4, "bmsCycleCount": 800, "bmsSOH": 96, "maxCellVoltage": 3.33,
+    "minCellVoltage": 3.32, "batteryModuleCount": 4,
+}
+
+
+def load_snapshots(path, serial=None):
+    """Read recorded states, optionally only those of one serial number.
+
+    Accepts one JSON document (an object or a list of them) or, like old_fields.json,
+    one object per line as captured from the broker; anything before a line's first
+    "{" (terminal escapes) and lines that do not parse are skipped.
+    """
+    with open(path) as f:
+        text = f.read()
+    try:
+        document = json.loads(text)
+        snapshots = document if isinstance(document, list) else [document]
+    except ValueError:
+        snapshots = []
+        for line in text.splitlines():
+            start = line.find("{")
+            if start < 0:
+                continue
+            try:
+                snapshots.append(json.loads(line[start:]))
+            except ValueError:
+                continue
+    if serial is not None:
+        snapshots = [s for s in snapshots if s.get("serialNumber") in (serial, None)]
+    return snapshots
+
+
+class Inverter:
+    """Register tables for one simulated inverter (one Modbus unit)."""
+
+    def __init__(self, serial="WCK0CDE013", state=None, evolve=True, seed=None,
+                 battery_wh=10000, peak_pv_watts=3600, clock=None):
+        self.tables = {table: array("H", bytes(2 * (windows[-1][1] + 1)))
+                       for table, windows in READ_WINDOWS.items()}
+        self.evolve = evolve
+        self.battery_wh = battery_wh
+        self.peak_pv_watts = peak_pv_watts
+        self.clock = clock or (lambda: datetime.datetime.now(datetime.timezone.utc))
+        self.clock_offset = datetime.timedelta()
+        self.snapshots = []
+        self.replay_interval = 10.0
+        self._random = random.Random(seed)
+        self._started = None
+        self._last = None
+        self._soc = None
+        self._energy = {}
+        self.set_serial(serial)
+        self.update(DEFAULT_STATE)
+        self.update(state or {})
+
+    # -- register access --
+    def readable(self, table, start, count):
+        """True if [start, start + count) lies inside one of the table's read windows."""
+        return any(lo <= start and start + count - 1 <= hi for lo, hi in READ_WINDOWS[table])
+
+    def read(self, table, start, count, now=None):
+        if table == "holding" and start <= RTC_ADDRESS + 6 and start + count > RTC_ADDRESS:
+            self._store_rtc()
+        self.tick(now)
+        return list(self.tables[table][start:start + count])
+
+    def write(self, start, values):
+        """Store holding registers; returns False for a value the inverter would reject.
+
+        A write that starts at the RTC sets the clock, with the inverter's 2-digit year
+        (a 4-digit year is rejected, as on the real SPH).
+        """
+        if start == RTC_ADDRESS:
+            return self._set_rtc(values)
+        self.tables["holding"][start:start + len(values)] = array("H", values)
+        return True
+
+    # -- values by field name --
+    def set_value(self, name, value):
+        """Store a decoded value under its field's registers; False for an unknown name."""
+        field = FIELDS.get(name)
+        if field is None:
+            return False
+        if field.kind == "bits16":
+            raw = int(value, 2) if isinstance(value, str) else int(value)
+        else:
+            raw = value * (field.divide or 1) / (field.scale or 1)
+            raw = max(0, int(round(raw)))
+        registers = self.tables[field.table]
+        if field.kind == "u32":
+            registers[field.address] = raw >> 16 & 0xFFFF
+            registers[field.address + 1] = raw & 0xFFFF
+        else:
+            registers[field.address] = raw & 0xFFFF
+        return True
+
+    def update(self, state):
+        """Apply a state dict (a recorded snapshot); unknown keys are ignored."""
+        for name, value in state.items():
+            if name == "serialNumber":
+                self.set_serial(value)
+            elif value is not None:
+                self.set_value(name, value)
+
+    def value(self, name):
+        """A field's current value, decoded as the poller would (without rounding)."""
+        field = FIELDS[name]
+        registers = self.tables[field.table]
+        raw = registers[field.address]
+        if field.kind == "u32":
+            raw = raw << 16 | registers[field.address + 1]
+        value = raw * (field.scale or 1)
+        return value / field.divide if field.divide else value
+
+    def set_serial(self, serial):
+        text = str(serial).ljust(10)[:10].encode("ascii", "replace")
+        for i in range(5):
+            self.tables["holding"][SERIAL_ADDRESS + i] = text[2 * i] << 8 | text[2 * i + 1]
+
+    # -- clock --
+    def now(self):
+        return self.clock() + self.clock_offset
+
+    def _store_rtc(self):
+        t = self.now()
+        self.tables["holding"][RTC_ADDRESS:RTC_ADDRESS + 7] = array(
+            "H", [t.year, t.month, t.day, t.hour, t.minute, t.second, t.isoweekday() % 7])
+
+    def _set_rtc(self, values):
+        if len(values) < 6 or values[0] >= 100:
+            return False
+        try:
+            target = datetime.datetime(2000 + values[0], *values[1:6],
+                                       tzinfo=datetime.timezone.utc)
+        except ValueError:
+            return False
+        self.clock_offset = target - self.clock()
+        return True
+
+    # -- replay and evolution --
+    def replay(self, snapshots, interval=10.0):
+        """Serve the snapshots in turn, one per interval seconds, looping (evolution
+        stops). Recorded serial numbers are ignored; the unit keeps its own."""
+        self.snapshots = [{k: v for k, v in snapshot.items() if k != "serialNumber"}
+                          for snapshot in snapshots]
+        self.replay_interval = float(interval)
+        self.evolve = False
+        self._started = None
+
+    def tick(self, now=None):
+        """Advance the simulation to now (a UTC datetime, default the inverter clock)."""
+        now = now or self.now()
+        if self._started is None:
+            self._started = self._last = now
+            if self.snapshots:
+                self.update(self.snapshots[0])
+            return
+        if self.snapshots:
+            step = int((now - self._started).total_seconds() // self.replay_interval)
+            self.update(self.snapshots[step % len(self.snapshots)])
+        elif self.evolve:
+            seconds = (now - self._last).total_seconds()
+            if seconds > 0:
+                self._evolve(now, seconds)
+        self._last = now
+
+    def _evolve(self, now, seconds):
+        """A day in the life: PV follows the sun, the battery soaks up the difference
+        with the load, and the energy counters integrate it all."""
+        rnd = self._random
+        hour = now.hour + now.minute / 60 + now.second / 3600
+        sun = max(0.0, math.sin(math.pi * (hour - 6) / 12))
+        pv1 = self.peak_pv_watts / 2 * sun * rnd.uniform(0.95, 1.0)
+        pv2 = self.peak_pv_watts / 2 * sun * rnd.uniform(0.9, 1.0)
+        load = 350 + rnd.uniform(0, 150)
+        if self._soc is None:
+            self._soc = float(self.value("battSOC"))
+        surplus = pv1 + pv2 - load
+        if surplus >= 0:
+            charge = min(surplus, 3000) if self._soc < 100 else 0
+            discharge, export, imported = 0, surplus - charge, 0
+        else:
+            discharge = min(-surplus, 3000) if self._soc > 10 else 0
+            charge, export, imported = 0, 0, -surplus - discharge
+        self._soc = min(100.0, max(0.0, self._soc + (charge - discharge) * seconds / 36
+                                   / self.battery_wh))
+        v1 = 300 + rnd.uniform(-5, 5) if sun else 0
+        v2 = 305 + rnd.uniform(-5, 5) if sun else 0
+        self.update({
+            "inverterStatus": 1 if sun else 6,
+            "pv1Power": pv1, "pv2Power": pv2, "pvPowerTotal": pv1 + pv2,
+            "pv1Voltage": v1, "pv2Voltage": v2,
+            "pv1Current": pv1 / v1 if v1 else 0, "pv2Current": pv2 / v2 if v2 else 0,
+            "pvOutputWattsVA": pv1 + pv2, "pvOutputCurrent": (pv1 + pv2) / 240,
+            "gridFreq": 50 + rnd.uniform(-0.05, 0.05), "gridVolt": 240 + rnd.uniform(-3, 3),
+            "chargePower": charge, "dischargePower": discharge,
+            "gridExportPowerTotal": export, "gridImportPowerTotal": imported,
+            "pLocalLoadTotal": load, "battSOC": round(self._soc), "bmsSOC": round(self._soc),
+            "battVoltage": 48 + 0.08 * self._soc,
+        })
+        hours = seconds / 3600
+        for counters, watts in ((("eacToday", "eacTotal", "epvTotal"), pv1 + pv2),
+                                (("epv1Today", "epv1Total"), pv1),
+                                (("epv2Today", "epv2Total"), pv2),
+                                (("eToUserToday", "eToUserTotal"), imported),
+                                (("eToGridToday", "eToGridTotal"), export),
+                                (("eChargeToday", "eChargeTotal"), charge),
+                                (("eDischargeToday", "eDischargeTotal"), discharge),
+                                (("eLocalLoadToday", "eLocalLoadTotal"), load)):
+            for name in counters:
+                total = self._energy.get(name, self.value(name)) + watts * hours / 1000
+                self._energy[name] = total
+                self.set_value(name, total)
+        self.set_value("operatingHours", self.value("operatingHours") + hours)
+        if now.date() != self._last.date():
+            for name in list(self._energy):
+                if name.endswith("Today"):
+                    self._energy[name] = 0.0
+                    self.set_value(name, 0)
@@ -0,0 +1,228 @@
+"""An asyncio Modbus server for simulated inverters, with latency and fault injection.
+
+Speaks the two framings the poller does (``growatt.config.device_framer``): Modbus
+TCP / MBAP, as an EW11 presents, and raw Modbus RTU over TCP (CRC16, no header), as a
+reflashed ShineWiFi-X dongle does. Function codes 3, 4, 6 and 16 are served; a read
+that strays outside the inverter's read windows gets an IllegalAddress exception, as
+the real SPH does.
+
+``Faults`` makes the link misbehave on purpose, each independently per response:
+added latency (fixed plus uniform jitter), short frames (truncated), garbled frames
+(a corrupted byte), and dropped connections (closed without answering). The counters
+in ``SimServer.stats`` say how many of each were injected, so retry behaviour can be
+measured against them.
+"""
+
+import struct
+import random
+import asyncio
+import logging
+import threading
+
+from .model import Inverter
+
+log = logging.getLogger("growatt_sim")
+
+READ_HOLDING, READ_INPUT, WRITE_SINGLE, WRITE_MULTIPLE = 3, 4, 6, 16
+ILLEGAL_FUNCTION, ILLEGAL_ADDRESS, ILLEGAL_VALUE = 1, 2, 3
+
+_TABLES = {READ_HOLDING: "holding", READ_INPUT: "input"}
+_MBAP = struct.Struct(">HHHB")
+
+
+def crc16(data):
+    """The Modbus RTU CRC (poly 0xA001, init 0xFFFF), as the little-endian trailer bytes."""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = crc >> 1 ^ 0xA001 if crc & 1 else crc >> 1
+    return struct.pack("<H", crc)
+
+
+class Faults:
+    """Per-response fault probabilities and the added latency, in seconds."""
+
+    def __init__(self, latency=0.0, jitter=0.0, short=0.0, garble=0.0, drop=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.short = short
+        self.garble = garble
+        self.drop = drop
+        self._random = random.Random(seed)
+
+    def delay(self):
+        return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def pick(self):
+        """The fault to inject into the next response: "drop", "short", "garble" or None."""
+        roll = self._random.random()
+        for kind in ("drop", "short", "garble"):
+            chance = getattr(self, kind)
+            if roll < chance:
+                return kind
+            roll -= chance
+        return None
+
+    def truncate(self, frame):
+        return frame[:self._random.randrange(1, len(frame))]
+
+    def corrupt(self, frame, first=0, last=None):
+        """Flip bits in one byte of frame[first:last] (RTU: the CRC catches it; MBAP has
+        no checksum, so callers aim at the length, unit, function code and byte count,
+        which the client does check)."""
+        data = bytearray(frame)
+        index = self._random.randrange(first, min(len(data), last or len(data)))
+        data[index] ^= self._random.randrange(1, 256)
+        return bytes(data)
+
+
+def execute(inverter, pdu):
+    """Answer one request PDU (function code + data) with a response PDU."""
+    code = pdu[0]
+    try:
+        if code in _TABLES:
+            start, count = struct.unpack(">HH", pdu[1:5])
+            if not 1 <= count <= 125:
+                return bytes((code | 0x80, ILLEGAL_VALUE))
+            if not inverter.readable(_TABLES[code], start, count):
+                return bytes((code | 0x80, ILLEGAL_ADDRESS))
+            registers = inverter.read(_TABLES[code], start, count)
+            return struct.pack(">BB%dH" % count, code, 2 * count, *registers)
+        if code == WRITE_SINGLE:
+            start, value = struct.unpack(">HH", pdu[1:5])
+            values = [value]
+        elif code == WRITE_MULTIPLE:
+            start, count, size = struct.unpack(">HHB", pdu[1:6])
+            if not 1 <= count <= 123 or size != 2 * count:
+                return bytes((code | 0x80, ILLEGAL_VALUE))
+            values = list(struct.unpack(">%dH" % count, pdu[6:6 + size]))
+        else:
+            return bytes((code | 0x80, ILLEGAL_FUNCTION))
+    except struct.error:
+        return bytes((code | 0x80, ILLEGAL_VALUE))
+    if not inverter.readable("holding", start, len(values)):
+        return bytes((code | 0x80, ILLEGAL_ADDRESS))
+    if not inverter.write(start, values):
+        return bytes((code | 0x80, ILLEGAL_VALUE))
+    if code == WRITE_SINGLE:
+        return pdu[:5]
+    return struct.pack(">BHH", code, start, len(values))
+
+
+class SimServer:
+    """Serve inverters keyed by Modbus unit id on one TCP port, in MBAP or RTU framing."""
+
+    def __init__(self, units=None, framer="socket", faults=None):
+        self.units = units or {1: Inverter()}
+        self.framer = framer
+        self.faults = faults or Faults()
+        self.stats = {"requests": 0, "drop": 0, "short": 0, "garble": 0, "crcErrors": 0}
+        self.port = None
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._writers = set()
+
+    # -- framing --
+    async def _read_mbap(self, reader):
+        header = await reader.readexactly(_MBAP.size)
+        transaction, _protocol, length, unit = _MBAP.unpack(header)
+        pdu = await reader.readexactly(length - 1)
+        return unit, pdu, transaction
+
+    async def _read_rtu(self, reader):
+        head = await reader.readexactly(2)
+        code = head[1]
+        if code in (READ_HOLDING, READ_INPUT, WRITE_SINGLE):
+            body = await reader.readexactly(6)
+        elif code == WRITE_MULTIPLE:
+            body = await reader.readexactly(5)
+            body += await reader.readexactly(body[4] + 2)
+        else:
+            # Unknown length: take what has arrived and let the CRC decide.
+            body = await reader.read(256)
+        frame = head + body
+        if crc16(frame[:-2]) != frame[-2:]:
+            self.stats["crcErrors"] += 1
+            return head[0], None, None
+        return head[0], frame[1:-2], None
+
+    def _frame(self, unit, pdu, transaction):
+        if self.framer == "rtu":
+            frame = bytes((unit,)) + pdu
+            return frame + crc16(frame)
+        return _MBAP.pack(transaction, 0, len(pdu) + 1, unit) + pdu
+
+    # -- connection loop --
+    async def _handle(self, reader, writer):
+        read = self._read_rtu if self.framer == "rtu" else self._read_mbap
+        self._writers.add(writer)
+        try:
+            while True:
+                unit, pdu, transaction = await read(reader)
+                inverter = self.units.get(unit)
+                if pdu is None or inverter is None:
+                    continue  # a real RS485 slave stays silent
+                self.stats["requests"] += 1
+                response = self._frame(unit, execute(inverter, pdu), transaction)
+                delay = self.faults.delay()
+                if delay:
+                    await asyncio.sleep(delay)
+                fault = self.faults.pick()
+                if fault:
+                    self.stats[fault] += 1
+                if fault == "drop":
+                    break
+                if fault == "short":
+                    response = self.faults.truncate(response)
+                elif fault == "garble":
+                    response = (self.faults.corrupt(response) if self.framer == "rtu"
+                                else self.faults.corrupt(response, 4, _MBAP.size + 2))
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=502):
+        """Start listening (port 0 picks a free one, stored in self.port)."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log.info("Simulating %d inverter(s) on %s:%d (%s framing)",
+                 len(self.units), host, self.port, self.framer)
+        return self._server
+
+    # -- background thread, for benchmarks and tests that drive a blocking client --
+    def start(self, host="127.0.0.1", port=0):
+        """Serve from a daemon thread with its own event loop; returns the bound port."""
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.serve(host, port))
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="growatt-sim", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = None
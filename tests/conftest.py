@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import growatt and growatt_modbus from the checkout without installing it.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+import pytest
+
+from growatt import adaptive
+from growatt.adaptive import LinkHealth, make_link_health
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(adaptive.random, "uniform", lambda low, high: high)
+
+
+def healthy(latency=0.05, **kwargs):
+    health = LinkHealth(**kwargs)
+    for _ in range(20):
+        health.observe("read", 0, latency, True)
+    return health
+
+
+def test_timeout_is_the_ceiling_until_latency_is_known():
+    assert LinkHealth(timeout=5).timeout() == 5.0
+    assert healthy(adaptive=False).timeout() == 5.0
+
+
+def test_timeout_follows_latency_within_its_bounds():
+    assert healthy(0.05, min_timeout=0.5).timeout() == 0.5
+    assert healthy(0.4, min_timeout=0.1).timeout() == pytest.approx(0.8)
+    assert healthy(4.0).timeout() == 5.0
+
+
+def test_failed_requests_are_not_latency_samples():
+    health = healthy(0.4, min_timeout=0.1)
+    health.observe("read", 0, 4.9, False)
+    assert health.timeout() == pytest.approx(0.8)
+
+
+def test_failed_cycles_double_the_timeout_and_success_resets_it():
+    health = healthy(0.4, min_timeout=0.1)
+    health.record(False, now=0)
+    assert health.timeout() == pytest.approx(1.6)
+    health.record(False, now=0)
+    assert health.timeout() == pytest.approx(3.2)
+    health.record(True, now=0)
+    assert health.timeout() == pytest.approx(0.8)
+
+
+def test_backoff_starts_after_the_failure_streak_and_doubles():
+    health = LinkHealth(backoff_after_failures=3, backoff_base_seconds=10,
+                        backoff_max_seconds=35)
+    for _ in range(2):
+        health.record(False, now=100)
+    assert not health.probing() and not health.backing_off(100)
+
+    health.record(False, now=100)
+    assert health.probing()
+    assert health.backing_off(109) and not health.backing_off(110)
+
+    health.record(False, now=110)
+    assert health.backoff_seconds == 20
+    health.record(False, now=130)
+    assert health.backoff_seconds == 35  # capped at backoff_max_seconds
+
+    health.record(True, now=170)
+    assert not health.probing() and not health.backing_off(170)
+    assert health.stats(170)["consecutiveFailures"] == 0
+
+
+def test_no_backoff_without_adaptive():
+    health = LinkHealth(adaptive=False, backoff_after_failures=1)
+    health.record(False, now=0)
+    assert not health.backing_off(0) and not health.probing()
+
+
+def test_make_link_health_reads_the_modbus_section():
+    health = make_link_health({"modbus": {"timeout": 3, "min_timeout": 0.2,
+                                          "backoff_base_seconds": 7}})
+    assert (health.max_timeout, health.min_timeout, health.backoff_base_seconds) == (3.0, 0.2, 7.0)
@@ -0,0 +1,94 @@
+import asyncio
+import struct
+
+from growatt.aio import AsyncBridge
+
+
+class FakeBridge:
+    """A Modbus TCP server answering every holding-register read with zeros; push()
+    sends an unsolicited reply and hang_up() closes every connection."""
+
+    def __init__(self):
+        self.writers = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _serve(self, reader, writer):
+        self.writers.append(writer)
+        try:
+            while True:
+                head = await reader.readexactly(7)
+                tid, _, length, unit = struct.unpack(">HHHB", head)
+                pdu = await reader.readexactly(length - 1)
+                count = struct.unpack(">H", pdu[3:5])[0]
+                writer.write(self._reply(tid, unit, count))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    @staticmethod
+    def _reply(tid, unit, count):
+        pdu = bytes([3, 2 * count]) + bytes(2 * count)
+        return struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + pdu
+
+    def push(self):
+        for writer in self.writers:
+            writer.write(self._reply(0, 1, 1))
+
+    def hang_up(self):
+        for writer in self.writers:
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def _read(bridge):
+    async with bridge.session() as client:
+        result = await client.read_holding_registers(0, count=1, device_id=1)
+        assert not result.isError()
+
+
+def _run(exercise):
+    async def main():
+        fake = FakeBridge()
+        bridge = AsyncBridge("127.0.0.1", await fake.start(), timeout=1, retries=0)
+        try:
+            await _read(bridge)
+            await exercise(fake)
+            await _read(bridge)
+        finally:
+            bridge._discard()
+            await fake.stop()
+        return bridge
+
+    return asyncio.run(main())
+
+
+def test_idle_connection_is_reused():
+    async def nothing(fake):
+        await asyncio.sleep(0.1)
+
+    bridge = _run(nothing)
+    assert (bridge.connects, bridge.reuses) == (1, 1)
+
+
+def test_connection_with_stray_bytes_is_replaced():
+    async def stray(fake):
+        fake.push()
+        await asyncio.sleep(0.1)
+
+    bridge = _run(stray)
+    assert (bridge.connects, bridge.reuses) == (2, 0)
+
+
+def test_connection_closed_by_the_bridge_is_replaced():
+    async def eof(fake):
+        fake.hang_up()
+        await asyncio.sleep(0.1)
+
+    bridge = _run(eof)
+    assert (bridge.connects, bridge.reuses) == (2, 0)
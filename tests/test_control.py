@@ -0,0 +1,80 @@
+import logging
+
+from growatt.control import InverterControl, schedule_registers
+
+
+class FakeClient:
+    connected = True
+
+
+class FakeInverter(InverterControl):
+    """InverterControl over a dict of holding registers, logging each write."""
+
+    def __init__(self, registers=None):
+        super().__init__("fake", client=FakeClient())
+        self.registers = dict(registers or {})
+        self.reads = []
+        self.writes = []
+
+    def _read(self, address, count):
+        self.reads.append((address, count))
+        return [self.registers.get(a, 0) for a in range(address, address + count)]
+
+    def _write(self, address, values):
+        self.writes.append((address, list(values)))
+        self.registers.update(zip(range(address, address + len(values)), values))
+        return True
+
+
+def test_writes_go_out_in_want_order():
+    inv = FakeInverter()
+    plan = inv.plan((1020, 3), (1090, 3))
+    plan.want(1090, [100, 100, 1])
+    plan.want(1020, [1, 2, 1])
+    assert plan.execute()
+    assert inv.writes == [(1090, [100, 100, 1]), (1020, [1, 2, 1])]
+
+
+def test_consecutive_wants_merge_and_unchanged_registers_are_skipped():
+    inv = FakeInverter({1070: 50, 1071: 30, 1080: 0, 1081: 0, 1082: 1})
+    plan = inv.plan((1070, 2), (1080, 3))
+    plan.want(1070, [50])
+    plan.want(1071, [20])
+    plan.want(1080, [1, 0])
+    plan.want(1082, [1])
+    assert plan.execute()
+    # 1070 and 1081/1082 already hold their values: one write from the first to the
+    # last change of each run.
+    assert inv.writes == [(1071, [20]), (1080, [1])]
+    assert plan.unchanged == 3
+
+
+def test_a_plan_with_nothing_to_change_writes_nothing():
+    inv = FakeInverter({1090: 100, 1091: 100, 1092: 1})
+    plan = inv.plan((1090, 3))
+    plan.want(1090, [100, 100, 1])
+    assert plan.execute()
+    assert inv.writes == []
+    assert plan.report()["unchanged"] == 3
+
+
+def test_unreadable_registers_are_written_blind(caplog):
+    inv = FakeInverter()
+    inv._read = lambda address, count: None
+    plan = inv.plan((1090, 3))
+    plan.want(1090, [100, 100, 1])
+    with caplog.at_level(logging.WARNING, logger="growatt"):
+        assert plan.execute()
+    assert inv.writes == [(1090, [100, 100, 1])]
+    assert "writing blind" in caplog.text
+
+
+def test_schedule_settings_are_written_before_the_slots():
+    inv = FakeInverter()
+    inv.apply_schedule(schedule_registers(
+        [{"start": "01:00", "end": "02:00", "slot": 5}],
+        [{"start": "05:00", "end": "06:00", "slot": 4}],
+        rate_percent=50, stop_soc=20))
+    addresses = [address for address, _values in inv.writes]
+    assert addresses[:2] == [1070, 1090]
+    assert addresses[2:] == sorted(addresses[2:])
@@ -0,0 +1,87 @@
+import types
+
+import pytest
+
+from growatt import discovery as discovery_mod
+from growatt.config import DEFAULT_CONFIG
+from growatt.discovery import Discovery, discovery_payloads
+
+MQTT = DEFAULT_CONFIG["mqtt"]
+
+
+class FakeBroker:
+    """A paho-like client: remembers retained messages and replays them on subscribe."""
+
+    def __init__(self, retained=None, rc=0):
+        self.retained = dict(retained or {})
+        self.rc = rc
+        self.callback = None
+        self.sent = []
+
+    def message_callback_add(self, _pattern, callback):
+        self.callback = callback
+
+    def subscribe(self, topics):
+        for topic, _qos in topics:
+            if topic in self.retained:
+                message = types.SimpleNamespace(topic=topic, payload=self.retained[topic],
+                                                retain=True)
+                self.callback(self, None, message)
+        return 0, 1
+
+    def unsubscribe(self, _topics):
+        pass
+
+    def publish(self, topic, payload, retain=False):
+        self.sent.append(topic)
+        if self.rc == 0:
+            self.retained[topic] = payload
+        return types.SimpleNamespace(rc=self.rc)
+
+
+@pytest.fixture(autouse=True)
+def no_settle(monkeypatch):
+    monkeypatch.setattr(discovery_mod, "_SETTLE_SECONDS", 0)
+
+
+def publish(discovery, broker, serial="S1"):
+    """Run cycles until the serial's publish has happened; return what it sent."""
+    broker.sent = []
+    while discovery.publish(broker, serial, "inv") == 0 and not discovery._serials[serial].done:
+        pass
+    return broker.sent
+
+
+def test_only_configs_that_differ_from_the_retained_copy_are_sent():
+    payloads = discovery_payloads(MQTT, "S1", "inv")
+    retained = dict(payloads)
+    changed = sorted(payloads)[:2]
+    for topic in changed:
+        retained[topic] = b"{}"
+    broker = FakeBroker(retained)
+    assert sorted(publish(Discovery(MQTT, broker), broker)) == changed
+
+
+def test_no_retained_copy_sends_everything_once():
+    broker = FakeBroker()
+    discovery = Discovery(MQTT, broker)
+    assert len(publish(discovery, broker)) == len(discovery_payloads(MQTT, "S1", "inv"))
+    assert discovery.publish(broker, "S1", "inv") == 0
+
+
+def test_refresh_republishes_everything():
+    broker = FakeBroker()
+    discovery = Discovery(MQTT, broker)
+    publish(discovery, broker)
+    assert discovery.refresh() == ["S1"]
+    assert len(publish(discovery, broker)) == len(discovery_payloads(MQTT, "S1", "inv"))
+
+
+def test_a_config_that_was_not_sent_is_retried():
+    broker = FakeBroker(rc=4)  # paho's MQTT_ERR_NO_CONN
+    discovery = Discovery(MQTT)
+    total = len(discovery_payloads(MQTT, "S1", "inv"))
+    assert discovery.publish(broker, "S1", "inv") == total
+    broker.rc = 0
+    assert discovery.publish(broker, "S1", "inv") == total
+    assert discovery.publish(broker, "S1", "inv") == 0
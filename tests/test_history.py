@@ -0,0 +1,49 @@
+from growatt.config import DEFAULT_CONFIG
+from growatt.history import NUMERIC_FIELDS, History, device_history
+
+
+def test_round_trip_in_order_with_missing_fields_as_none():
+    history = History(4)
+    history.append(100.0, {"battSOC": 50, "pv1Power": 123.4})
+    history.append(110.0, {"battSOC": 51})
+    result = history.query(["battSOC", "pv1Power"])
+    assert result == {"t": [100.0, 110.0], "battSOC": [50, 51], "pv1Power": [123.4, None]}
+
+
+def test_ring_keeps_the_newest_samples():
+    history = History(3)
+    for k in range(5):
+        history.append(100.0 + k, {"battSOC": k})
+    assert history.query(["battSOC"]) == {"t": [102.0, 103.0, 104.0], "battSOC": [2, 3, 4]}
+    assert history.query(["battSOC"], since=102.5)["battSOC"] == [3, 4]
+
+
+def test_two_register_values_above_2_24_keep_every_digit():
+    big = 2 ** 24 + 1
+    history = History(2)
+    history.append(100.0, {"eacTotal": big + 0.1, "operatingHours": big})
+    result = history.query(["eacTotal", "operatingHours"])
+    assert result["eacTotal"] == [big + 0.1]
+    assert result["operatingHours"] == [big]
+
+
+def test_raw_bitmasks_are_not_kept():
+    assert "FaultBitCode" not in NUMERIC_FIELDS
+    assert "WarningBitCode" not in NUMERIC_FIELDS
+    assert "battSOC" in NUMERIC_FIELDS
+
+
+def test_downsample_means_per_bucket():
+    history = History(10)
+    for t, soc in ((100.0, 10), (105.0, 20), (110.0, 30), (119.0, None)):
+        history.append(t, {"battSOC": soc})
+    assert history.query(["battSOC"], step=10) == {"t": [100.0, 110.0], "battSOC": [15, 30]}
+
+
+def test_off_by_default_and_sized_from_config_when_on():
+    dev = {"host": "h"}
+    assert device_history({}, DEFAULT_CONFIG, dev) is None
+    config = {**DEFAULT_CONFIG, "history": {"enabled": True, "hours": 1}}
+    st = {}
+    history = device_history(st, config, dev)
+    assert history.capacity == 360 and st["history"] is history
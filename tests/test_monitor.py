@@ -0,0 +1,39 @@
+from growatt import monitor
+from growatt.registers import POLL_TIERS
+
+
+def blocks_for(plan, base):
+    """Distinct register values per block and offset, shifted by base per cycle."""
+    return [[(base + 31 * index + offset) % 65536 for offset in range(block.count)]
+            for index, block in enumerate(plan)]
+
+
+def test_merge_state_matches_the_dict_decoders_and_keeps_unread_tiers():
+    everything = monitor.read_set(POLL_TIERS)
+    fast = monitor.read_set(["fast"])
+    cache = monitor.value_cache()
+
+    first = monitor.merge_state(cache, everything, blocks_for(everything.plan, 1), "SN1")
+    decoded = monitor.compile_decoder(monitor._layout(
+        [f for f in monitor.HOLDING_FIELDS + monitor.INPUT_FIELDS if f.tier in everything.tiers],
+        everything.plan), "decode_check")(blocks_for(everything.plan, 1))
+    assert first == dict(decoded, serialNumber="SN1")
+    assert tuple(first) == monitor.STATE_KEYS
+
+    second = monitor.merge_state(cache, fast, blocks_for(fast.plan, 7), "SN1")
+    assert tuple(second) == monitor.STATE_KEYS
+    fast_names = {f.name for f in monitor.HOLDING_FIELDS + monitor.INPUT_FIELDS
+                  if f.tier == "fast"}
+    assert any(second[name] != first[name] for name in fast_names)
+    assert all(second[name] == first[name] for name in monitor.STATE_KEYS
+               if name not in fast_names)
+
+
+def test_merge_state_returns_a_state_the_next_cycle_does_not_change():
+    fast = monitor.read_set(["fast"])
+    everything = monitor.read_set(POLL_TIERS)
+    cache = monitor.value_cache()
+    first = monitor.merge_state(cache, everything, blocks_for(everything.plan, 1), "SN1")
+    kept = dict(first)
+    monitor.merge_state(cache, fast, blocks_for(fast.plan, 7), "SN1")
+    assert first == kept
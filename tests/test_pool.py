@@ -0,0 +1,45 @@
+import socket
+import threading
+import time
+
+import pytest
+from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ModbusIOException
+
+from growatt.pool import apply_timeout
+
+
+@pytest.fixture
+def silent_server():
+    """A TCP server that accepts connections and never answers."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    accepted = []
+
+    def accept():
+        try:
+            while True:
+                accepted.append(listener.accept()[0])
+        except OSError:
+            pass
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield listener.getsockname()[1]
+    listener.close()
+    for conn in accepted:
+        conn.close()
+
+
+def test_apply_timeout_bounds_a_read_on_the_sync_client(silent_server):
+    client = ModbusTcpClient("127.0.0.1", port=silent_server, timeout=4, retries=0)
+    assert client.connect()
+    try:
+        apply_timeout(client, 0.3, 0)
+        started = time.monotonic()
+        with pytest.raises(ModbusIOException):
+            client.read_holding_registers(0, count=1)
+        # The constructor's 4 s would apply if only the manager's copy were changed.
+        assert time.monotonic() - started < 1.5
+    finally:
+        client.close()
@@ -0,0 +1,49 @@
+import pytest
+
+from growatt.schedule import Scheduler
+
+
+def make(devices=None, interval=10, now=100.0):
+    devices = devices or [{"host": "a"}, {"host": "b"}]
+    return devices, Scheduler(devices, interval, now)
+
+
+def test_devices_are_staggered_across_the_interval():
+    _, scheduler = make()
+    assert [slot.deadline for slot in scheduler.slots] == [100.0, 105.0]
+
+
+def test_per_device_interval():
+    _, scheduler = make([{"host": "a", "poll_interval": 30}, {"host": "b"}])
+    assert [slot.interval for slot in scheduler.slots] == [30.0, 10.0]
+
+
+def test_due_and_next_wait():
+    _, scheduler = make()
+    assert [slot.dev["host"] for slot in scheduler.due(100.0)] == ["a"]
+    assert [slot.dev["host"] for slot in scheduler.due(105.0)] == ["a", "b"]
+    assert scheduler.next_wait(97.0) == pytest.approx(3.0)
+    assert scheduler.next_wait(101.0) == 0.0
+
+
+def test_done_keeps_the_grid_without_drift():
+    _, scheduler = make()
+    slot = scheduler.slots[0]
+    # A cycle that took 2 s does not push the next deadline back by 2 s.
+    assert scheduler.done(slot, 102.0) == 0
+    assert slot.deadline == 110.0
+
+
+def test_done_skips_and_counts_missed_deadlines():
+    _, scheduler = make()
+    slot = scheduler.slots[0]
+    assert scheduler.done(slot, 125.0) == 2
+    assert slot.deadline == 130.0
+
+
+def test_busy_slots_are_neither_due_nor_waited_for():
+    _, scheduler = make()
+    busy = lambda slot: slot.dev["host"] == "a"
+    assert [slot.dev["host"] for slot in scheduler.due(106.0, busy)] == ["b"]
+    assert scheduler.next_wait(101.0, busy) == pytest.approx(4.0)
+    assert scheduler.next_wait(101.0, lambda slot: True) is None